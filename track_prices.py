@@ -1,13 +1,17 @@
 import time
-import re
 import os
 import sys
 import random
+import queue
+import threading
 import tempfile
 import django
-from decimal import Decimal
 from datetime import datetime
 
+from tracker.extraction import SPECS, clean_price, extract_from_html, extract_from_driver
+from tracker.drivers import DriverPool, setup_driver
+from tracker import http_cache, readiness
+
 def init_django():
     """Explicitly initialize Django settings and apps."""
     if not os.getenv('DJANGO_SETTINGS_MODULE'):
@@ -24,316 +28,422 @@ if __name__ == "__main__":
         # Avoid redirecting stdout if we are in a web environment
         pass
 
-def setup_driver():
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-    from fake_useragent import UserAgent
-    from selenium_stealth import stealth
-    
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    
-    ua = UserAgent()
-    user_agent = ua.random
-    options.add_argument(f"user-agent={user_agent}")
-    
-    # Use TOR Proxy if running on GitHub Actions (CI)
-    if os.getenv('CI'):
-        # Socks5 proxy on localhost:9050 (default TOR port)
-        options.add_argument('--proxy-server=socks5://127.0.0.1:9050')
-        print("Using TOR Proxy: socks5://127.0.0.1:9050")
-    
-    # Use Selenium Manager which is built-in to modern Selenium
-    driver = webdriver.Chrome(options=options)
-    
-    stealth(driver,
-        languages=["en-US", "en"],
-        vendor="Google Inc.",
-        platform="Win32",
-        webgl_vendor="Intel Inc.",
-        renderer="Intel Iris OpenGL Engine",
-        fix_hairline=True,
-    )
-    return driver
-
-def scrape_amazon(driver, url):
+def scrape_with_spec(driver, url, spec):
+    """Loads `url` and extracts (name, raw_price), retrying with a backoff that depends on why the
+    attempt failed. Bot-check pages bail out at once; every attempt's time goes into readiness.latency."""
     from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    
+
     product_name, price = None, None
     attempts = 2
     for attempt in range(attempts):
+        started = time.perf_counter()
+        outcome = readiness.ERROR
         try:
             driver.get(url)
-            # Wait for either the product title OR the common "Continue" button OR CAPTCHA
-            WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "#productTitle, .a-button-text, .a-price, body"))
-            )
-            
-            # Handle intermediate "Continue shopping" page if it exists
-            continue_buttons = driver.find_elements(By.XPATH, "//a[contains(text(), 'Continue')] | //button[contains(text(), 'Continue')]")
-            if continue_buttons:
-                continue_buttons[0].click()
-                WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, "productTitle")))
-
-            # Name
-            name_selectors = [ 
-                (By.ID, 'productTitle'), 
-                (By.CSS_SELECTOR, '.product-title-word-break'),
-                (By.CSS_SELECTOR, '#title')
-            ]
-            for s_type, s in name_selectors:
-                elements = driver.find_elements(s_type, s)
-                if elements and elements[0].text.strip():
-                    product_name = elements[0].text.strip()
-                    break
-            
-            # Price
-            price_selectors = [ 
-                # User specifically requested ONLY whole price to avoid 211.65 -> 21165 error
-                (By.CSS_SELECTOR, '.a-price.aok-align-center.reinventPricePriceToPayMargin.priceToPay .a-price-whole'),
-                (By.CSS_SELECTOR, '.priceToPay .a-price-whole'),
-                (By.CSS_SELECTOR, '.a-price .a-price-whole'),
-                
-                # Fallback to standard full price blocks if whole price not found
-                (By.CSS_SELECTOR, '#corePrice_feature_div .a-price .a-offscreen'), 
-                (By.CSS_SELECTOR, 'div[data-brand-sourced-offer-display] .a-price .a-offscreen'), 
-                (By.CSS_SELECTOR, '.a-price.a-text-price:not(.a-size-small) .a-offscreen'),
-            ]
-            found_prices = []
-            for s_type, s in price_selectors:
-                elements = driver.find_elements(s_type, s)
-                for el in elements:
-                    # If we are targeting the whole price directly, we don't need innerHTML parsing
-                    if "a-price-whole" in s:
-                        p_text = el.text.strip()
-                        if p_text:
-                            # Remove any lingering decimals or dots just in case
-                            p_text = p_text.replace(".", "")
-                            found_prices.append(p_text)
-                            continue
-
-                    # Standard parsing for other selectors
-                    p_text = el.get_attribute('innerHTML').strip()
-                    if not p_text or "class" in p_text: 
-                         p_text = el.text.strip()
-                    
-                    if not p_text: continue
-
-                    # Safety check: Avoid "Unit Price"
-                    try:
-                        parent = el.find_element(By.XPATH, "./..")
-                        p_class = parent.get_attribute("class")
-                        if "a-size-small" in p_class or "a-color-secondary" in p_class:
-                           continue
-                    except: pass
-                    
-                    found_prices.append(p_text)
-            
-            if found_prices:
-                # Pick the first valid price
-                cleaned_prices = []
-                for tp in found_prices:
-                    cp = clean_price(tp)
-                    if cp is not None:
-                        cleaned_prices.append(cp)
-                
-                if cleaned_prices:
-                    price = f"₹{cleaned_prices[0]}"
-            
-            if not price: # Fallback Regex
-                body_text = driver.find_element(By.TAG_NAME, 'body').text
-                # regex modified to prefer looking for comma separated integers without decimals first if possible
-                matches = re.findall(r'₹\s?[\d,]+', body_text)
-                if matches: price = matches[0]
-
-            # Fallback to driver.title if name not found
-            if not product_name:
-                title = driver.title
-                if title and "Robot Check" not in title and "Amazon.in" != title:
-                    if "|" in title:
-                        product_name = title.split("|")[0].strip()
-                    elif "-" in title:
-                        product_name = title.split("-")[0].strip()
-                    else:
-                        product_name = title
-
-            if product_name:
-                break # Success
+            outcome = readiness.wait_for_page(driver, spec)
+
+            # Intermediate "Continue shopping" page: click through and wait for the real one
+            if outcome == readiness.INTERSTITIAL:
+                driver.find_elements(By.XPATH, spec.continue_xpath)[0].click()
+                outcome = readiness.wait_for_page(driver, spec)
+
+            if outcome == readiness.READY:
+                product_name, price = extract_from_driver(spec, driver)
+                outcome = readiness.READY if product_name else readiness.NOT_FOUND
         except Exception as e:
-            if attempt == attempts - 1:
-                print(f"Amazon Error after {attempts} attempts: {e}")
-            time.sleep(2) # Wait a bit before retry
+            print(f"{spec.platform} attempt {attempt + 1} failed: {e}")
+        readiness.latency.record(spec.platform, outcome, time.perf_counter() - started, url)
+
+        if outcome == readiness.READY:
+            break
+        delay = readiness.retry_delay(outcome, attempt)
+        if delay is None or attempt == attempts - 1:
+            print(f"{spec.platform} gave up on {url}: {outcome}")
+            break
+        time.sleep(delay)
 
     return product_name, price
 
+def scrape_amazon(driver, url):
+    return scrape_with_spec(driver, url, SPECS["Amazon"])
+
 def scrape_flipkart(driver, url):
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
+    return scrape_with_spec(driver, url, SPECS["Flipkart"])
 
-    product_name, price = None, None
-    attempts = 2
-    for attempt in range(attempts):
-        try:
-            driver.get(url)
-            # Wait for any common Flipkart title or price element to confirm page load
-            WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "h1, .B_NuCI, .Nx9W0j, ._30jeq3, body"))
-            )
-            
-            # Name
-            name_selectors = [ 
-                (By.CSS_SELECTOR, 'h1.CEn5rD'), 
-                (By.CSS_SELECTOR, 'h1.VU-Z7G'),
-                (By.CSS_SELECTOR, '.B_NuCI'), 
-                (By.CSS_SELECTOR, 'h1'),
-                (By.CSS_SELECTOR, 'span.B_NuCI'),
-                (By.CSS_SELECTOR, 'span.yhB1nd'),
-                (By.CSS_SELECTOR, 'span.LMizgS')
-            ]
-            for s_type, s in name_selectors:
-                elements = driver.find_elements(s_type, s)
-                if elements and elements[0].text.strip():
-                    product_name = elements[0].text.strip()
-                    break
-            
-            # Fallback to driver.title if still None
-            if not product_name:
-                title = driver.title
-                if title:
-                    if "|" in title:
-                        product_name = title.split("|")[0].strip()
-                    elif "-" in title:
-                        product_name = title.split("-")[0].strip()
-                    else:
-                        product_name = title
-            
-            # Price
-            price_selectors = [ 
-                # User provided specific structure for Flipkart
-                (By.CSS_SELECTOR, 'div.hZ3P6w.bnqy13'), 
-                (By.CSS_SELECTOR, '.hZ3P6w'),
-                
-               
-                (By.CSS_SELECTOR, '._30jeq3._16Jk6d'), 
-                (By.CSS_SELECTOR, '._30jeq3'),
-            
-                (By.XPATH, "//div[contains(@class, '_30jeq3')]")
-            ]
-            found_prices = []
-            for s_type, s in price_selectors:
-                elements = driver.find_elements(s_type, s)
-                for el in elements:
-                    p_text = el.text.strip()
-                    if p_text:
-                        # Try to clean it immediately
-                        cp = clean_price(p_text)
-                        if cp:
-                            price = f"₹{cp}"
-                            break # Break element loop
-                if price:
-                    break # Break selector loop (Prioritize top selectors)
-            
-            if not price: # Fallback Regex for Flipkart
-                body_text = driver.find_element(By.TAG_NAME, 'body').text
-                matches = re.findall(r'₹\s?[\d,]+', body_text)
-                if matches: price = matches[0]
-            
-            if product_name:
-                break # Success
-        except Exception as e:
-            if attempt == attempts - 1:
-                print(f"Flipkart Error after {attempts} attempts: {e}")
-            time.sleep(2)
-    return product_name, price
+# --- Lite tier: plain HTTP fetch + HTML parse, no browser ---
+
+def parse_lite_result(result, platform, entry=None):
+    """Turns a fetcher.FetchResult into (name, raw_price, status).
+
+    status is 'ok', 'unchanged', 'no_price', 'bot_check' or 'error'. 'unchanged' means the page
+    answered 304, so the cached `entry`'s name and price are returned without parsing, or the
+    extracted name and price are the same as the cached ones.
+    """
+    if result.error:
+        print(f"Lite fetch failed: {result.error}")
+        return None, None, "error"
+    spec = SPECS[platform]
+    cache = http_cache.get_cache()
+    if result.status == 304 and entry:
+        cache.count("not_modified")
+        cache.touch(entry)
+        return entry.name, entry.price, "unchanged"
+    if result.status == 304:
+        # The entry the validators came from was evicted since: ask again without them
+        from tracker import fetcher
+        result = fetcher.fetch(result.url)
+        if result.error:
+            print(f"Lite fetch failed: {result.error}")
+            return None, None, "error"
+    if result.status in (403, 429, 503, 529) or spec.is_bot_check(result.text):
+        return None, None, "bot_check"
+    if result.status != 200:
+        return None, None, "error"
+
+    name, price = extract_from_html(spec, result.text)
+    found = clean_price(price)
+    if not found:
+        if cache:
+            cache.count("miss")
+        return name, price, "no_price"
+    if cache:
+        # Refreshes the validators and fetched_at even when nothing changed
+        cache.put(result.url, result.headers, name, price)
+    if entry and name == entry.name and found == clean_price(entry.price):
+        cache.count("unchanged")
+        return name, price, "unchanged"
+    if cache:
+        cache.count("miss")
+    return name, price, "ok"
+
+def cached_entry(url):
+    cache = http_cache.get_cache()
+    return cache.get(url) if cache else None
+
+def scrape_lite_tier(url, platform):
+    from tracker import fetcher
+    entry = cached_entry(url)
+    headers = http_cache.get_cache().conditional_headers(entry) if entry else None
+    return parse_lite_result(fetcher.fetch(url, headers), platform, entry)
+
+def prefetch_lite(products, throttle):
+    """Batch refresh: fetch the lite tier for every eligible product up front.
+
+    Returns {product.pk: FetchResult}. Every request takes a slot from the PlatformThrottle, so a
+    platform still sees one request per 5-10s; only different platforms and slow responses overlap.
+    Concurrency per host is further capped by FETCHER_PER_HOST.
+    """
+    from tracker import fetcher
+    targets = [p for p in products if should_try_lite(p)]
+    if not targets:
+        return {}
+    cache = http_cache.get_cache()
+    headers = [cache.conditional_headers(cache.get(p.url)) for p in targets] if cache else None
+    delays = [throttle.reserve(p.platform) for p in targets]
+    start = time.monotonic()
+    results = fetcher.fetch_many([p.url for p in targets], headers, delays)
+    print(f"Prefetched {len(targets)} pages in {time.monotonic() - start:.1f}s.")
+    return {p.pk: r for p, r in zip(targets, results)}
+
+# Skip the lite tier once it keeps failing for a product, but re-probe it now and then
+LITE_SKIP_AFTER = int(os.getenv('SCRAPER_LITE_SKIP_AFTER', 3))
+LITE_REPROBE_EVERY = int(os.getenv('SCRAPER_LITE_REPROBE_EVERY', 10))
+
+def should_try_lite(product):
+    if product.lite_misses < LITE_SKIP_AFTER:
+        return True
+    return product.lite_misses % LITE_REPROBE_EVERY == 0
+
+def scrape_product(drivers, product, throttle, prefetched=None):
+    """Tiered fetch: lite HTTP first, Selenium only when lite gives no price or hits a bot check.
+
+    Updates product.scrape_tier / product.lite_misses in memory and returns (name, raw_price, unchanged),
+    where unchanged means the lite tier matched the HTTP cache and the page wasn't parsed.
+    """
+    name, raw_price, status = None, None, None
+    if prefetched is not None:
+        name, raw_price, status = parse_lite_result(prefetched, product.platform, cached_entry(product.url))
+    elif should_try_lite(product):
+        throttle.wait(product.platform)
+        name, raw_price, status = scrape_lite_tier(product.url, product.platform)
+
+    if status in ("ok", "unchanged"):
+        product.scrape_tier = "lite"
+        product.lite_misses = 0
+        return name, raw_price, status == "unchanged"
+    if status:
+        print(f"Lite tier {status} for {product.name}, escalating to browser.")
+    product.lite_misses += 1
+
+    throttle.wait(product.platform)
+    with drivers.driver() as driver:
+        browser_name, raw_price = scrape_with_spec(driver, product.url, SPECS[product.platform])
+    if clean_price(raw_price):
+        product.scrape_tier = "browser"
+    return browser_name or name, raw_price, False
+
+class PlatformThrottle:
+    """Keeps the 5-10s politeness gap per platform, so parallel workers don't raise the request rate.
+
+    This also caps useful parallelism at one worker per platform: a second worker on the same
+    platform just sleeps until the first one's slot has passed (see max_useful_workers).
+    """
+    def __init__(self, min_delay=5, max_delay=10):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def reserve(self, platform):
+        """Reserves the next free slot for this platform and returns the seconds until it starts."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(platform, now))
+            self.next_slot[platform] = slot + random.uniform(self.min_delay, self.max_delay)
+        return max(0.0, slot - time.monotonic())
+
+    def wait(self, platform):
+        # Sleep outside the lock
+        delay = self.reserve(platform)
+        if delay > 0:
+            time.sleep(delay)
+
+def process_product(drivers, product, throttle, writer, prefetched=None):
+    """Scrapes one product and queues its writes on the shared PriceWriter."""
+    from tracker.scheduler import SCHEDULE_FIELDS, reschedule
+    print(f"Scraping details for: {product.name}...")
+
+    try:
+        new_name, raw_price, unchanged = scrape_product(drivers, product, throttle, prefetched)
+    except Exception:
+        # Push the product back like a scrape that found no price, otherwise it stays due and the
+        # daemon retries it every round
+        interval = reschedule(product, None, product.last_price)
+        writer.update_product(product, ["scrape_tier", "lite_misses"] + SCHEDULE_FIELDS)
+        print(f"Scrape of {product.name} failed, next attempt in {interval}.")
+        raise
+    update_fields = ["scrape_tier", "lite_misses"]
+
+    # Sync Name (Fix placeholders from Vercel)
+    if new_name and (product.name == f"{product.platform} Product" or len(new_name) > len(product.name)):
+        print(f"Updating name: {product.name} -> {new_name}")
+        product.name = new_name
+        update_fields.append("name")
+    writer.update_product(product, update_fields)
+
+    current_price = clean_price(raw_price)
+    # Last raw price comes from the product's snapshot, no history query
+    last_price = product.last_price
+    interval = reschedule(product, current_price, last_price)
+    print(f"Next scrape of {product.name} in {interval}.")
+    writer.update_product(product, SCHEDULE_FIELDS)
+
+    if unchanged and current_price == last_price:
+        # Same page as last time: no new price row, no snapshot or rollup writes
+        print(f"{product.name} unchanged since the last fetch.")
+        return
+    if current_price:
+
+        # Save new price (also rolls the snapshot forward)
+        writer.add_price(product, current_price)
+
+        # Alert rules run over the whole batch when the writer flushes
+        if not last_price:
+            print(f"Initial price record for {product.name} saved.")
+
+def scrape_worker(work_queue, throttle, writer, drivers, prefetched=None, stop=None):
+    """Pulls products off the shared queue until it is empty, or until `stop` is set in daemon mode.
+
+    Chrome comes from the shared DriverPool, so it is only started the first time a product needs
+    the browser tier and then kept warm for the rest of the pass (or the life of the daemon).
+    """
+    from django.db import connection, close_old_connections
 
-def clean_price(price_str):
-    if not price_str: return None
-    clean_str = re.sub(r'[^0-9.]', '', price_str.replace(",", ""))
     try:
-        return Decimal(clean_str)
-    except:
-        return None
-
-def send_telegram_alert(product, current_price, last_price):
-    token = os.getenv('TELEGRAM_BOT_TOKEN')
-    chat_id = os.getenv('TELEGRAM_CHAT_ID')
-    if not token or not chat_id: return
-
-    import requests
-    # Use emoji for impact
-    message = f"🎁 *PRICE DROP DETECTED!*\n\n"
-    message += f"📦 *{product.name}*\n\n"
-    
-    if last_price:
-        savings = last_price - current_price
-        drop_percent = (savings / last_price) * 100
-        message += f"💰 *Current Price:* ₹{current_price}\n"
-        message += f"📉 *Was:* ₹{last_price}\n"
-        message += f"✨ *Savings:* ₹{savings} ({drop_percent:.1f}% OFF)\n\n"
+        while not (stop and stop.is_set()):
+            try:
+                product = work_queue.get(timeout=1) if stop else work_queue.get_nowait()
+            except queue.Empty:
+                if stop:
+                    continue
+                return
+            try:
+                # Drops the connection if the server closed it while the worker sat idle
+                close_old_connections()
+                process_product(drivers, product, throttle, writer, (prefetched or {}).get(product.pk))
+            except Exception as e:
+                print(f"Error scraping {product.name}: {e}")
+            finally:
+                work_queue.task_done()
+    finally:
+        # Each thread gets its own DB connection, close it before the thread exits
+        connection.close()
+
+def make_throttle():
+    return PlatformThrottle(
+        float(os.getenv('SCRAPER_MIN_DELAY', 5)),
+        float(os.getenv('SCRAPER_MAX_DELAY', 10)),
+    )
+
+def dedupe_products(products):
+    """Keeps one product per product key, so a pass fetches each item once.
+
+    Rows that are the same item are merged into the lowest id (canonical.merge_products), which
+    stays at the position of the group's first row. Left alone they would stay due every pass.
+    """
+    from tracker.canonical import product_key, merge_products
+    groups = {}
+    for product in products:
+        key, canonical_url = product_key(product.url)
+        groups.setdefault(product.product_key or key or f"url:{canonical_url}", []).append(product)
+    unique = []
+    for key, group in groups.items():
+        keeper = min(group, key=lambda p: p.pk)
+        duplicates = [p for p in group if p is not keeper]
+        if duplicates:
+            merge_products(keeper, duplicates)
+            if not keeper.product_key:
+                keeper.product_key = key
+                keeper.save(update_fields=['product_key'])
+        unique.append(keeper)
+    return unique
+
+def max_useful_workers(products=None):
+    """One worker per platform in the pass (every platform for the daemon), since the
+    PlatformThrottle serializes requests within a platform."""
+    if products is None:
+        return len(SPECS)
+    return max(1, len({p.platform for p in products}))
+
+def resolve_workers(workers, limit):
+    """SCRAPER_WORKERS, defaulting to and capped at `limit`."""
+    if workers is None:
+        workers = int(os.getenv('SCRAPER_WORKERS') or 0) or limit
+    if workers > limit:
+        print(f"Using {limit} worker(s) instead of {workers}: requests to a platform are throttled one at a time.")
+    return max(1, min(workers, limit))
+
+def run_scraper(workers=None, batch=None, scrape_all=None):
+    from tracker.models import TrackedProduct
+    from tracker.price_writer import PriceWriter
+    from tracker.scheduler import due_products
+    if scrape_all is None:
+        scrape_all = os.getenv('SCRAPER_ALL') == '1'
+    if scrape_all:
+        products = list(TrackedProduct.objects.all())
     else:
-        message += f"💰 *Initial Price:* ₹{current_price}\n\n"
-
-    message += f"🚀 [Buy Now on {product.platform}]({product.url})"
-
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {
-        "chat_id": chat_id, 
-        "text": message, 
-        "parse_mode": "Markdown",
-        "disable_web_page_preview": False
-    }
-    requests.post(url, json=payload)
-
-def run_scraper():
-    from tracker.models import TrackedProduct, ProductPrice
-    products = TrackedProduct.objects.all()
+        # Only products whose adaptive schedule says they are due, most urgent first
+        limit = int(os.getenv('SCRAPER_MAX_PER_RUN', 0)) or None
+        products = due_products(limit)
+        print(f"{len(products)} of {TrackedProduct.objects.count()} products are due.")
+    products = dedupe_products(products)
     if not products:
         print("No products to track.")
         return
 
-    driver = setup_driver()
+    workers = resolve_workers(workers, max_useful_workers(products))
+    if batch is None:
+        batch = os.getenv('SCRAPER_LITE_BATCH') == '1'
+
+    throttle = make_throttle()
+    # Batch refresh mode fetches all lite pages before the workers start, paced by the throttle
+    prefetched = prefetch_lite(products, throttle) if batch else None
+
+    work_queue = queue.Queue()
+    for product in products:
+        work_queue.put(product)
+
+    writer = PriceWriter()
+    drivers = DriverPool(workers)
+    print(f"Scraping {len(products)} products with {workers} worker(s).")
+    threads = [
+        threading.Thread(target=scrape_worker, args=(work_queue, throttle, writer, drivers, prefetched), name=f"scraper-{i}")
+        for i in range(workers)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            t.join()
+    finally:
+        drivers.close()
+        writer.flush()
+        readiness.latency.report()
+        from tracker.alerts import dispatch_pending
+        dispatch_pending()
+        cache = http_cache.get_cache()
+        if cache:
+            cache.report()
+            cache.evict()
+
+def run_daemon(workers=None, poll=None):
+    """Keeps workers, the Chrome pool and DB connections warm and scrapes products as they
+    fall due, until SIGTERM / SIGINT. In-flight products finish and pending writes are flushed first."""
+    import signal
+    from django.db import close_old_connections
+    from tracker.alerts import dispatch_pending
+    from tracker.price_writer import PriceWriter
+    from tracker.scheduler import due_products
+
+    workers = resolve_workers(workers, max_useful_workers())
+    poll = poll or float(os.getenv('DAEMON_POLL_SECONDS', 60))
+    limit = int(os.getenv('SCRAPER_MAX_PER_RUN', 0)) or None
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, finishing in-flight products...")
+        stop.set()
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    work_queue = queue.Queue()
+    writer = PriceWriter()
+    throttle = make_throttle()
+    drivers = DriverPool(workers)
+    threads = [
+        threading.Thread(target=scrape_worker, args=(work_queue, throttle, writer, drivers, None, stop), name=f"scraper-{i}")
+        for i in range(workers)
+    ]
+    if os.getenv('DAEMON_PROCESS_UPDATES', '1') == '1':
+        # Bot updates queued by the webhook are handled here too, on their own thread
+        from tracker import update_queue
+        threads.append(threading.Thread(target=update_queue.run_worker, args=(stop,), name="updates"))
+    for t in threads:
+        t.start()
+    print(f"Scrape daemon started with {workers} worker(s), polling every {poll:.0f}s.")
+
     try:
-        for product in products:
-            print(f"Scraping details for: {product.name}...")
-            
-            if product.platform == "Amazon":
-                new_name, raw_price = scrape_amazon(driver, product.url)
-            else:
-                new_name, raw_price = scrape_flipkart(driver, product.url)
-            
-            # Sync Name (Fix placeholders from Vercel)
-            if new_name and (product.name == f"{product.platform} Product" or len(new_name) > len(product.name)):
-                print(f"Updating name: {product.name} -> {new_name}")
-                product.name = new_name
-                product.save()
-            
-            current_price = clean_price(raw_price)
-            if current_price:
-                # Get last recorded price (raw only)
-                last_entry = ProductPrice.objects.filter(product=product, is_summary=False).order_by("-scraped_at").first()
-                last_price = last_entry.price if last_entry else None
-                
-                # Save new price
-                ProductPrice.objects.create(product=product, price=current_price)
-                
-                # Alert logic
-                if last_price and current_price < last_price:
-                    send_telegram_alert(product, current_price, last_price)
-                elif not last_price:
-                    print(f"Initial price record for {product.name} saved.")
-            
-            # Stealth sleep between products
-            time.sleep(random.uniform(5, 10))
-            
+        while not stop.is_set():
+            close_old_connections()
+            products = dedupe_products(due_products(limit))
+            if not products:
+                stop.wait(poll)
+                continue
+            print(f"{len(products)} products due.")
+            for product in products:
+                work_queue.put(product)
+            # Wait for this round to drain so the flushed next_scrape_at values keep the products
+            # out of the next due_products() query
+            while work_queue.unfinished_tasks and not stop.is_set():
+                time.sleep(0.5)
+            writer.flush()
+            dispatch_pending()
+            if http_cache.get_cache():
+                http_cache.get_cache().evict()
     finally:
-        driver.quit()
+        stop.set()
+        for t in threads:
+            t.join()
+        drivers.close()
+        writer.flush()
+        dispatch_pending()
+        readiness.latency.report()
+        if http_cache.get_cache():
+            http_cache.get_cache().report()
+        print("Scrape daemon stopped.")
 
 if __name__ == "__main__":
-    run_scraper()
+    if "--daemon" in sys.argv[1:]:
+        run_daemon()
+        sys.exit(0)
+    run_scraper(batch="--batch" in sys.argv[1:] or None, scrape_all="--all" in sys.argv[1:] or None)
@@ -0,0 +1,221 @@
+"""Alert outbox dispatcher: sends pending Alert rows to Telegram over one pooled session.
+
+Alerts are queued during a scrape pass (tracker/rules.py, run by PriceWriter) and sent afterwards. A chat with more
+than ALERT_DIGEST_THRESHOLD pending drops gets them as digest messages instead of one message each.
+Sending respects Telegram's limits (about 30 messages/s overall, 1/s per chat) and honours the
+retry_after of a 429 up to ALERT_MAX_RETRY_AFTER seconds; longer flood waits leave the chat's
+alerts pending for the next run. TELEGRAM_API_BASE points the dispatcher at another Bot API server, e.g. a local fake.
+"""
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.utils import timezone
+
+from tracker.models import Alert
+from tracker.rules import LOW_DAYS
+
+DIGEST_THRESHOLD = int(os.getenv('ALERT_DIGEST_THRESHOLD', 3))
+MAX_ATTEMPTS = int(os.getenv('ALERT_MAX_ATTEMPTS', 5))
+GLOBAL_RATE = float(os.getenv('ALERT_GLOBAL_RATE', 30))
+# A little over Telegram's 1 message/s per chat, so network jitter doesn't earn a 429
+CHAT_INTERVAL = float(os.getenv('ALERT_CHAT_INTERVAL', 1.1))
+# 429s tolerated per message, and the longest retry_after waited out within a pass; past either the
+# chat is left for the next run with its alerts still pending
+RATE_LIMIT_RETRIES = int(os.getenv('ALERT_RATE_LIMIT_RETRIES', 3))
+MAX_RETRY_AFTER = float(os.getenv('ALERT_MAX_RETRY_AFTER', 60))
+MESSAGE_LIMIT = 4096
+
+def api_base():
+    return os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+
+RULE_HEADLINES = {
+    'target': "🎯 *TARGET PRICE REACHED!*",
+    'percent_drop': "🎁 *PRICE DROP DETECTED!*",
+    'all_time_low': "🏆 *LOWEST PRICE EVER!*",
+    'n_day_low': f"📉 *LOWEST PRICE IN {LOW_DAYS} DAYS!*",
+}
+
+def format_alert(product, price, previous_price, rule='percent_drop'):
+    # Use emoji for impact
+    message = f"{RULE_HEADLINES.get(rule, RULE_HEADLINES['percent_drop'])}\n\n"
+    message += f"📦 *{product.name}*\n\n"
+
+    if previous_price:
+        savings = previous_price - price
+        drop_percent = (savings / previous_price) * 100
+        message += f"💰 *Current Price:* ₹{price}\n"
+        message += f"📉 *Was:* ₹{previous_price}\n"
+        message += f"✨ *Savings:* ₹{savings} ({drop_percent:.1f}% OFF)\n\n"
+    else:
+        message += f"💰 *Initial Price:* ₹{price}\n\n"
+
+    message += f"🚀 [Buy Now on {product.platform}]({product.url})"
+    return message
+
+RULE_BADGES = {'target': "🎯", 'all_time_low': "🏆", 'n_day_low': "📉"}
+
+def digest_line(alert):
+    line = f"{RULE_BADGES.get(alert.rule, '📦')} *{alert.product.name}*: ₹{alert.price}"
+    if alert.previous_price:
+        line += f" (was ₹{alert.previous_price}, {(alert.previous_price - alert.price) / alert.previous_price * 100:.1f}% OFF)"
+    return line + f" [Buy]({alert.product.url})"
+
+def format_digest(alerts):
+    """[(text, alerts_in_text)], each text under Telegram's 4096-character limit."""
+    chunks, lines, covered = [], [], []
+    header = f"🎁 *{len(alerts)} PRICE DROPS DETECTED!*\n\n"
+    for alert in alerts:
+        line = digest_line(alert)
+        if lines and len(header) + sum(len(l) + 2 for l in lines) + len(line) > MESSAGE_LIMIT:
+            chunks.append((header + "\n\n".join(lines), covered))
+            lines, covered = [], []
+        lines.append(line)
+        covered.append(alert)
+    if lines:
+        chunks.append((header + "\n\n".join(lines), covered))
+    return chunks
+
+class RateLimiter:
+    """Spaces sends to `global_rate` per second overall and one per `chat_interval` seconds per chat."""
+
+    def __init__(self, global_rate=None, chat_interval=None):
+        self.global_gap = 1 / (global_rate or GLOBAL_RATE)
+        self.chat_interval = chat_interval if chat_interval is not None else CHAT_INTERVAL
+        self.next_global = 0
+        self.next_chat = {}
+
+    def wait(self, chat_id):
+        now = time.monotonic()
+        slot = max(now, self.next_global, self.next_chat.get(chat_id, now))
+        if slot > now:
+            time.sleep(slot - now)
+        self.next_global = slot + self.global_gap
+        self.next_chat[chat_id] = slot + self.chat_interval
+
+    def defer(self, chat_id, seconds):
+        self.next_chat[chat_id] = max(self.next_chat.get(chat_id, 0), time.monotonic() + seconds)
+
+class AlertDispatcher:
+    def __init__(self, token=None, base=None, limiter=None, timeout=(5, 15)):
+        self.url = f"{base or api_base()}/bot{token or os.getenv('TELEGRAM_BOT_TOKEN')}/sendMessage"
+        self.limiter = limiter or RateLimiter()
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.stats = {'alerts': 0, 'messages': 0, 'digests': 0, 'rate_limited': 0, 'failed': 0}
+        # Chats Telegram asked to back off for longer than MAX_RETRY_AFTER, skipped for the rest of the pass
+        self.backed_off = set()
+
+    def send_message(self, chat_id, text, retries=3):
+        """Returns (sent, permanent_failure, error)."""
+        error = ''
+        attempt = rate_limited = 0
+        while attempt <= retries:
+            self.limiter.wait(chat_id)
+            try:
+                resp = self.session.post(self.url, timeout=self.timeout, json={
+                    "chat_id": chat_id,
+                    "text": text,
+                    "parse_mode": "Markdown",
+                    "disable_web_page_preview": False,
+                })
+            except requests.RequestException as e:
+                error = str(e)
+                attempt += 1
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            try:
+                data = resp.json()
+            except ValueError:
+                data = {}
+            if resp.status_code == 200 and data.get('ok'):
+                self.stats['messages'] += 1
+                return True, False, ''
+            error = data.get('description') or f"HTTP {resp.status_code}"
+            if resp.status_code == 429:
+                # Telegram says exactly how long to back off; this doesn't count as a failed attempt,
+                # but a flood wait or a chat that keeps answering 429 is left for the next run
+                self.stats['rate_limited'] += 1
+                rate_limited += 1
+                retry_after = (data.get('parameters') or {}).get('retry_after', 1)
+                if retry_after > MAX_RETRY_AFTER or rate_limited > RATE_LIMIT_RETRIES:
+                    self.backed_off.add(chat_id)
+                    return False, False, error
+                self.limiter.defer(chat_id, retry_after)
+                continue
+            if resp.status_code >= 500:
+                attempt += 1
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            # 400 / 403: bad chat, bot blocked, malformed message; retrying won't help
+            return False, True, error
+        return False, False, error
+
+    def dispatch(self, limit=None):
+        """Sends pending alerts, grouped per chat. Returns the number of alerts delivered."""
+        pending = list(Alert.objects.filter(status='pending').select_related('product').order_by('chat_id', 'id')[:limit])
+        by_chat = {}
+        for alert in pending:
+            by_chat.setdefault(alert.chat_id, []).append(alert)
+
+        queues = {}
+        for chat_id, alerts in by_chat.items():
+            if len(alerts) > DIGEST_THRESHOLD:
+                queues[chat_id] = format_digest(alerts)
+                self.stats['digests'] += len(queues[chat_id])
+            else:
+                queues[chat_id] = [(format_alert(a.product, a.price, a.previous_price, a.rule), [a]) for a in alerts]
+
+        # Round-robin over chats, so one chat's 1 msg/s limit doesn't hold up the others
+        rounds = max((len(q) for q in queues.values()), default=0)
+        delivered = 0
+        for index in range(rounds):
+            for chat_id, messages in queues.items():
+                if index >= len(messages):
+                    continue
+                if chat_id in self.backed_off:
+                    continue
+                text, covered = messages[index]
+                sent, permanent, error = self.send_message(chat_id, text)
+                if chat_id in self.backed_off:
+                    # Rate limited, not failed: stays pending without using up an attempt
+                    for alert in covered:
+                        alert.error = error
+                    Alert.objects.bulk_update(covered, ['error'])
+                    continue
+                now = timezone.now()
+                for alert in covered:
+                    alert.attempts += 1
+                    if sent:
+                        alert.status, alert.sent_at, alert.error = 'sent', now, ''
+                    else:
+                        alert.error = error
+                        if permanent or alert.attempts >= MAX_ATTEMPTS:
+                            alert.status = 'failed'
+                            self.stats['failed'] += 1
+                if sent:
+                    delivered += len(covered)
+                Alert.objects.bulk_update(covered, ['status', 'sent_at', 'attempts', 'error'])
+        self.stats['alerts'] += delivered
+        return delivered
+
+    def close(self):
+        self.session.close()
+
+def dispatch_pending(limit=None, base=None):
+    """Sends everything in the outbox with a fresh dispatcher and prints a summary."""
+    if not os.getenv('TELEGRAM_BOT_TOKEN'):
+        return 0
+    dispatcher = AlertDispatcher(base=base)
+    try:
+        delivered = dispatcher.dispatch(limit)
+    finally:
+        dispatcher.close()
+    stats = dispatcher.stats
+    if stats['messages'] or stats['failed']:
+        print(f"Sent {delivered} alerts in {stats['messages']} messages ({stats['digests']} digests, "
+              f"{stats['rate_limited']} rate-limit waits, {stats['failed']} failed).")
+    return delivered
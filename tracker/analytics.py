@@ -0,0 +1,217 @@
+"""Price history statistics on NumPy arrays instead of per-row Decimal objects.
+
+History is loaded with one query into flat int64 arrays (product id, unix seconds, paise), sorted
+by product and then time. Each product's rows are a contiguous segment, so per-product statistics
+are segment reductions (np.*.reduceat) over the whole catalogue at once.
+"""
+import os
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection
+from django.utils import timezone
+
+from tracker.models import TrackedProduct, ProductPrice, PriceRollup
+from tracker.rollups import bucket_start
+
+DAY = 86400
+PERCENTILES = (10, 50, 90)
+# Above this share of all products, load_histories scans the table and filters in NumPy
+SCAN_FRACTION = 0.5
+# aggregate_prices prunes raw rows older than this; longer windows are read from the daily rollups
+RAW_RETENTION_DAYS = int(os.getenv('PRICE_RAW_RETENTION_DAYS', 30))
+
+class Histories:
+    """Price history of many products. Rows of one product are contiguous and in time order.
+
+    Rows read from rollups also carry each bucket's `low` / `high`, which stats() uses for the
+    extremes; otherwise those are None and every row is a single price.
+    """
+
+    def __init__(self, product, ts, paise, low=None, high=None):
+        self.product, self.ts, self.paise = product, ts, paise
+        self.low, self.high = low, high
+        if len(product):
+            self.starts = np.flatnonzero(np.r_[True, product[1:] != product[:-1]])
+        else:
+            self.starts = np.empty(0, dtype=np.int64)
+        self.ids = product[self.starts]
+        self.counts = np.diff(np.r_[self.starts, len(product)])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def since(self, cutoff):
+        """The rows at or after unix time `cutoff`."""
+        mask = self.ts >= cutoff
+        low, high = (None, None) if self.low is None else (self.low[mask], self.high[mask])
+        return Histories(self.product[mask], self.ts[mask], self.paise[mask], low, high)
+
+    def get(self, product_id):
+        """(ts, paise) of one product; empty arrays if it has no rows."""
+        i = np.searchsorted(self.ids, product_id)
+        if i == len(self.ids) or self.ids[i] != product_id:
+            return self.ts[:0], self.paise[:0]
+        start, end = self.starts[i], self.starts[i] + self.counts[i]
+        return self.ts[start:end], self.paise[start:end]
+
+def load_histories(product_ids=None, since=None, chunk_size=100000):
+    """Loads raw price history into a Histories, optionally limited to some products / a start time.
+
+    Paise and epoch seconds are computed in SQL, so rows arrive as plain integers and are copied
+    into arrays chunk by chunk without building Decimal or datetime objects. Rows are sorted by
+    product and time in NumPy (stable, so equal timestamps keep insertion order).
+    """
+    table = connection.ops.quote_name(ProductPrice._meta.db_table)
+    if connection.vendor == 'postgresql':
+        columns = "product_id, EXTRACT(EPOCH FROM scraped_at)::bigint, ROUND(price * 100)::bigint"
+    else:
+        columns = "product_id, CAST(strftime('%%s', scraped_at) AS INTEGER), CAST(ROUND(price * 100) AS INTEGER)"
+    where, params = [], []
+    wanted = None
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return Histories(*np.empty((3, 0), dtype=np.int64))
+        if len(product_ids) > SCAN_FRACTION * TrackedProduct.objects.count():
+            # Most of the catalogue: a sequential scan beats one index lookup per product
+            wanted = np.array(product_ids, dtype=np.int64)
+        else:
+            where.append(f"product_id IN ({', '.join(['%s'] * len(product_ids))})")
+            params.extend(product_ids)
+    if since is not None:
+        where.append("scraped_at >= %s")
+        params.append(since)
+    sql = f"SELECT {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64))
+    data = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.int64)
+    if wanted is not None:
+        data = data[np.isin(data[:, 0], wanted)]
+    # Sorting here is several times cheaper than ORDER BY on a multi-million row table
+    data = data[np.lexsort((data[:, 1], data[:, 0]))]
+    return Histories(data[:, 0].copy(), data[:, 1].copy(), data[:, 2].copy())
+
+def load_daily_closes(product_ids=None, since=None):
+    """Daily closes, with each day's low and high, from the day rollups as a Histories, for windows
+    that reach past the raw retention."""
+    rows = PriceRollup.objects.filter(resolution='day')
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=list(product_ids))
+    if since is not None:
+        rows = rows.filter(bucket_start__gte=bucket_start(since, 'day'))
+    data = np.array([(pid, int(start.timestamp()), round(close * 100), round(low * 100), round(high * 100))
+                     for pid, start, close, low, high
+                     in rows.values_list('product_id', 'bucket_start', 'close', 'low', 'high').iterator()],
+                    dtype=np.int64).reshape(-1, 5)
+    data = data[np.lexsort((data[:, 1], data[:, 0]))]
+    return Histories(*(data[:, i].copy() for i in range(5)))
+
+def load_window(product_ids, days, now=None):
+    """(Histories, daily) for the last `days` days: raw prices inside the retention window, daily
+    closes from the rollups (daily=True) beyond it, where the raw rows are partly pruned."""
+    since = (now or timezone.now()) - timedelta(days=days)
+    if days > RAW_RETENTION_DAYS:
+        return load_daily_closes(product_ids, since), True
+    return load_histories(product_ids, since=since), False
+
+def _segment_percentile(histories, q):
+    # Sorting by (product, price) keeps the segments in place, so percentiles are index lookups
+    ordered = histories.paise[np.lexsort((histories.paise, histories.product))]
+    pos = histories.starts + (histories.counts - 1) * (q / 100)
+    lo, hi = np.floor(pos).astype(np.int64), np.ceil(pos).astype(np.int64)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+def stats(histories, percentiles=PERCENTILES):
+    """Per-product statistics of a Histories as {name: array}, aligned with histories.ids.
+
+    Prices are in paise. volatility is the standard deviation of the relative change between
+    consecutive prices, drawdown how far the last price sits below the high (0.1 = 10%), change the
+    last price relative to the first, max_drop the biggest single drop.
+    """
+    h = histories
+    if not len(h):
+        empty = {name: np.empty(0) for name in ('product_id', 'count', 'first', 'last', 'low', 'high', 'mean',
+                                                 'volatility', 'drops', 'max_drop', 'drawdown', 'change')}
+        empty.update({f"p{q}": np.empty(0) for q in percentiles})
+        return empty
+    ends = h.starts + h.counts - 1
+    # Rollup rows: true extremes from the buckets, the rest of the statistics from the closes
+    low = np.minimum.reduceat(h.paise if h.low is None else h.low, h.starts)
+    high = np.maximum.reduceat(h.paise if h.high is None else h.high, h.starts)
+    first, last = h.paise[h.starts], h.paise[ends]
+
+    # Consecutive moves, zeroed where the previous row belongs to another product
+    same = np.r_[False, h.product[1:] == h.product[:-1]]
+    moves = np.zeros(len(h.paise), dtype=np.int64)
+    moves[1:] = np.diff(h.paise)
+    moves[~same] = 0
+    relative = np.zeros(len(h.paise))
+    relative[1:] = moves[1:] / np.maximum(h.paise[:-1], 1)
+    steps = np.maximum(h.counts - 1, 1)
+    mean_move = np.add.reduceat(relative, h.starts) / steps
+    variance = np.add.reduceat(relative ** 2, h.starts) / steps - mean_move ** 2
+
+    result = {
+        'product_id': h.ids,
+        'count': h.counts,
+        'first': first,
+        'last': last,
+        'low': low,
+        'high': high,
+        'mean': np.add.reduceat(h.paise, h.starts) / h.counts,
+        'volatility': np.sqrt(np.maximum(variance, 0)),
+        'drops': np.add.reduceat(moves < 0, h.starts),
+        'max_drop': np.maximum(-np.minimum.reduceat(moves, h.starts), 0),
+        'drawdown': (high - last) / np.maximum(high, 1),
+        'change': last / np.maximum(first, 1) - 1,
+    }
+    for q in percentiles:
+        result[f"p{q}"] = _segment_percentile(h, q)
+    return result
+
+def daily_closes(ts, paise):
+    """(day start unix seconds, close in paise) for every day from the first to the last price,
+    carrying the last close over days without prices."""
+    if not len(ts):
+        return ts[:0], paise[:0]
+    day = ts // DAY
+    last_of_day = np.flatnonzero(np.r_[day[1:] != day[:-1], True])
+    days, closes = day[last_of_day], paise[last_of_day]
+    every_day = np.arange(days[0], days[-1] + 1)
+    return every_day * DAY, closes[np.searchsorted(days, every_day, side='right') - 1]
+
+def rolling(ts, paise, days, stat='min'):
+    """Rolling `stat` (min / max / mean / median / pNN) over `days`-day windows of daily closes.
+
+    Returns (window end day, value) arrays; the first days - 1 days have no full window and are skipped.
+    """
+    day_ts, closes = daily_closes(ts, paise)
+    if len(closes) < days:
+        return day_ts[:0], closes[:0].astype(float)
+    windows = np.lib.stride_tricks.sliding_window_view(closes, days)
+    if stat.startswith('p') and stat[1:].isdigit():
+        values = np.percentile(windows, int(stat[1:]), axis=1)
+    else:
+        values = getattr(np, stat)(windows, axis=1)
+    return day_ts[days - 1:], values
+
+def product_stats(product_ids, days=30, now=None):
+    """{product_id: {stat: value}} over the last `days` days, prices converted to rupees.
+    Beyond RAW_RETENTION_DAYS the statistics are of daily closes."""
+    result = stats(load_window(product_ids, days, now)[0])
+    rupees = {'first', 'last', 'low', 'high', 'mean', 'max_drop'} | {f"p{q}" for q in PERCENTILES}
+    return {
+        int(pid): {name: (float(values[i]) / 100 if name in rupees else values[i].item())
+                   for name, values in result.items() if name != 'product_id'}
+        for i, pid in enumerate(result['product_id'])
+    }
@@ -1,43 +1,48 @@
 import os
 import re
 import telebot
-import requests
 from telebot import types
 
 token = os.getenv('TELEGRAM_BOT_TOKEN')
 bot = telebot.TeleBot(token, threaded=False)
 
 def scrape_lite(url):
-    """A fast scraper that doesn't need Chrome. Useful for Vercel/Serverless."""
+    """A fast scraper that doesn't need Chrome. Useful for Vercel/Serverless.
+
+    Returns (name, raw_price), parsed with the same platform spec as the Selenium scraper.
+    """
+    from tracker import fetcher
+    from tracker.extraction import spec_for_url, extract_from_html
+    spec = spec_for_url(url)
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-            "Accept-Language": "en-US,en;q=0.9",
-        }
-        # Use allow_redirects=True (default) and a session for better redirect handling
-        session = requests.Session()
-        response = session.get(url, headers=headers, timeout=15)
-        
-        if response.status_code == 200:
-            # Simple regex to get title
-            title_match = re.search(r'<title>(.*?)</title>', response.text, re.IGNORECASE)
-            if title_match:
-                title = title_match.group(1).strip()
-                # Clean up Amazon/Flipkart specific title suffixes
-                title = title.replace("Amazon.in: Buy ", "").replace(" : Amazon.in", "")
-                title = title.replace(" - Buy Products Online at Best Price in India - Flipkart.com", "")
-                title = re.split(r' \| | - ', title)[0].strip()
-                if title and len(title) > 3:
-                    return title
+        # Pooled per-host client, so repeated adds reuse the TCP/TLS connection
+        result = fetcher.fetch(url)
+        if result.error:
+            print(f"Lite scrape failed: {result.error}")
+        elif result.status == 200 and spec and not spec.is_bot_check(result.text):
+            name, price = extract_from_html(spec, result.text)
+            if name and len(name) > 3:
+                return name, price
     except Exception as e:
         print(f"Lite scrape failed: {e}")
-    return None
+    return None, None
 
 def extract_url(text):
     url_pattern = r'https?://[^\s]+'
     match = re.search(url_pattern, text)
     return match.group(0) if match else None
 
+BARE_TARGET_RE = re.compile(r'(?:₹|rs\.?)?\s*(\d[\d,]*(?:\.\d{1,2})?)', re.IGNORECASE)
+# Shared product links carry titles full of numbers, so inside other text only a marked price counts
+MARKED_TARGET_RE = re.compile(r'(?:target|below|under|₹|rs\.?)\s*:?\s*₹?\s*(\d[\d,]*(?:\.\d{1,2})?)', re.IGNORECASE)
+
+def extract_target(text, url):
+    """Optional target price next to the link: "<link> 1499", "<link> ₹1,499", "... target 1499"."""
+    from tracker.extraction import clean_price
+    rest = text.replace(url, ' ').strip()
+    match = BARE_TARGET_RE.fullmatch(rest) or MARKED_TARGET_RE.search(rest)
+    return clean_price(match.group(1)) if match else None
+
 @bot.message_handler(func=lambda message: message.text.strip().lower() in ['/start', 'start', '/help', 'help'])
 def send_welcome(message):
     print(f"DEBUG: Welcome command received from {message.chat.id}")
@@ -46,9 +51,12 @@ def send_welcome(message):
         "Commands:\n"
         "/list - Show all tracked products\n"
         "/remove - Delete a product from tracking\n"
+        "/stats - 30-day low, median and high of your products (`/stats 90` for 90 days)\n"
+        "/chart - Price chart of a product (`/chart 7d`, `30d`, `90d` or `1y`)\n"
         "/ping - Check if bot is alive\n"
         "/help - Show this help message\n\n"
-        "To start tracking a new product, simply Paste/Share the link here directly from Flipkart or Amazon."
+        "To start tracking a new product, simply Paste/Share the link here directly from Flipkart or Amazon.\n"
+        "Add a price after the link (e.g. `<link> 1499`) to only get alerts at or below that price."
     )
     bot.reply_to(message, help_text, parse_mode='Markdown')
 
@@ -57,28 +65,96 @@ def send_ping(message):
     print(f"DEBUG: Ping command received from {message.chat.id}")
     bot.reply_to(message, "🏓 Pong! Bot is alive and connected to Vercel.")
 
+LIST_PAGE_SIZE = 10
+# Telegram rejects messages over 4096 characters, leave room for the header
+LIST_MAX_CHARS = 3800
+
+def list_queryset(chat_id):
+    """The chat's subscribed products with their current price and the chat's target, in one query.
+
+    Uses the snapshot column and only falls back to a latest-row subquery for products whose
+    snapshot hasn't been filled yet.
+    """
+    from django.db.models import F, OuterRef, Subquery
+    from django.db.models.functions import Coalesce
+    from tracker.models import TrackedProduct, ProductPrice
+    latest = ProductPrice.objects.filter(product=OuterRef('pk')).order_by('-scraped_at').values('price')[:1]
+    return (TrackedProduct.objects.filter(subscriptions__chat_id=str(chat_id))
+            .annotate(current_price=Coalesce('last_price', Subquery(latest)),
+                      chat_target=F('subscriptions__target_price')))
+
+def build_list_page(chat_id, after_id=None, before_id=None):
+    """Returns (text, markup) for one page of the chat's /list, using the product id as the cursor."""
+    qs = list_queryset(chat_id)
+    if before_id is not None:
+        rows = list(qs.filter(id__lt=before_id).order_by('-id')[:LIST_PAGE_SIZE + 1])
+        has_prev = len(rows) > LIST_PAGE_SIZE
+        rows = rows[:LIST_PAGE_SIZE][::-1]
+        has_next = True
+    else:
+        if after_id is not None:
+            qs = qs.filter(id__gt=after_id)
+        rows = list(qs.order_by('id')[:LIST_PAGE_SIZE + 1])
+        has_next = len(rows) > LIST_PAGE_SIZE
+        rows = rows[:LIST_PAGE_SIZE]
+        has_prev = after_id is not None
+
+    if not rows:
+        return None, None
+
+    response = "*Currently Tracked Products:*\n\n"
+    shown = []
+    for p in rows:
+        price_str = f"₹{p.current_price}" if p.current_price is not None else "No price yet"
+        target_str = f" (target ₹{p.chat_target})" if p.chat_target is not None else ""
+        entry = f"• *{p.name[:50]}...*\n   Price: {price_str}{target_str}\n   [Link]({p.url})\n\n"
+        if shown and len(response) + len(entry) > LIST_MAX_CHARS:
+            # Long URLs: cut the page short, the rest moves to the next page
+            has_next = True
+            break
+        response += entry
+        shown.append(p)
+
+    markup = types.InlineKeyboardMarkup()
+    buttons = []
+    if has_prev:
+        buttons.append(types.InlineKeyboardButton(text="⬅️ Prev", callback_data=f"list_prev_{shown[0].id}"))
+    if has_next:
+        buttons.append(types.InlineKeyboardButton(text="Next ➡️", callback_data=f"list_next_{shown[-1].id}"))
+    if buttons:
+        markup.row(*buttons)
+    return response, markup
+
 @bot.message_handler(commands=['list'])
 @bot.message_handler(func=lambda message: message.text.strip().lower() == 'list')
 def list_products(message):
-    from tracker.models import TrackedProduct, ProductPrice
-    products = TrackedProduct.objects.all()
-    if not products:
+    response, markup = build_list_page(message.chat.id)
+    if not response:
         bot.reply_to(message, "You are not tracking any products yet.")
         return
     
-    response = "*Currently Tracked Products:*\n\n"
-    for i, p in enumerate(products, 1):
-        latest_price = ProductPrice.objects.filter(product=p).order_by('-scraped_at').first()
-        price_str = f"₹{latest_price.price}" if latest_price else "No price yet"
-        response += f"{i}. *{p.name[:50]}...*\n   Price: {price_str}\n   [Link]({p.url})\n\n"
-    
-    bot.send_message(message.chat.id, response, parse_mode='Markdown', disable_web_page_preview=True)
+    bot.send_message(message.chat.id, response, parse_mode='Markdown', disable_web_page_preview=True, reply_markup=markup)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('list_'))
+def handle_list_page_callback(call):
+    _, direction, cursor = call.data.split('_')
+    if direction == 'next':
+        response, markup = build_list_page(call.message.chat.id, after_id=int(cursor))
+    else:
+        response, markup = build_list_page(call.message.chat.id, before_id=int(cursor))
+    bot.answer_callback_query(call.id)
+    if not response:
+        bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                              text="No more products.")
+        return
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id, text=response,
+                          parse_mode='Markdown', disable_web_page_preview=True, reply_markup=markup)
 
 @bot.message_handler(commands=['remove', 'delete'])
 @bot.message_handler(func=lambda message: message.text.strip().lower() in ['remove', 'delete'])
 def remove_product_list(message):
     from tracker.models import TrackedProduct
-    products = TrackedProduct.objects.all()
+    products = TrackedProduct.objects.filter(subscriptions__chat_id=str(message.chat.id)).order_by('id')
     if not products:
         bot.reply_to(message, "No products to remove.")
         return
@@ -93,19 +169,103 @@ def remove_product_list(message):
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('del_'))
 def handle_delete_callback(call):
-    from tracker.models import TrackedProduct
+    from tracker.models import Subscription
     product_id = int(call.data.split('_')[1])
-    try:
-        product = TrackedProduct.objects.get(id=product_id)
-        name = product.name
-        product.delete()
-        bot.answer_callback_query(call.id, f"Removed {name}")
-        bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id, 
-                              text=f"Removed from tracker: *{name}*", parse_mode='Markdown')
-    except TrackedProduct.DoesNotExist:
+    subscription = (Subscription.objects.select_related('product')
+                    .filter(chat_id=str(call.message.chat.id), product_id=product_id).first())
+    if subscription is None:
         bot.answer_callback_query(call.id, "Error: Product already removed.")
         bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id, 
                               text="Product not found or already deleted.")
+        return
+
+    product = subscription.product
+    name = product.name
+    subscription.delete()
+    # Nobody else follows it: stop scraping it altogether
+    if not product.subscriptions.exists():
+        product.delete()
+    else:
+        product.sync_target_price()
+    bot.answer_callback_query(call.id, f"Removed {name}")
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id, 
+                          text=f"Removed from tracker: *{name}*", parse_mode='Markdown')
+
+def build_stats(chat_id, days=30):
+    """/stats text for the chat's products, all computed from one history load."""
+    from tracker.analytics import product_stats, RAW_RETENTION_DAYS
+    from tracker.models import TrackedProduct
+    products = list(TrackedProduct.objects.filter(subscriptions__chat_id=str(chat_id)).order_by('id'))
+    if not products:
+        return None
+    summary = product_stats([p.id for p in products], days=days)
+    if days > RAW_RETENTION_DAYS:
+        # Only the daily rollups go back that far
+        response = f"*Last {days} days (daily closing prices):*\n\n"
+    else:
+        response = f"*Last {days} days:*\n\n"
+    for p in products:
+        s = summary.get(p.id)
+        if s is None:
+            entry = f"• *{p.name[:50]}...*\n   No prices in this period\n\n"
+        else:
+            entry = (f"• *{p.name[:50]}...*\n"
+                     f"   Now ₹{s['last']:.2f} · Low ₹{s['low']:.2f} · Median ₹{s['p50']:.2f} · High ₹{s['high']:.2f}\n"
+                     f"   {s['drops']} drops, {s['drawdown']:.0%} below the high\n\n")
+        if len(response) + len(entry) > LIST_MAX_CHARS:
+            response += "_...more products not shown_"
+            break
+        response += entry
+    return response
+
+@bot.message_handler(commands=['stats'])
+def send_stats(message):
+    parts = message.text.split()
+    days = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 30
+    response = build_stats(message.chat.id, max(1, min(days, 365)))
+    if not response:
+        bot.reply_to(message, "You are not tracking any products yet.")
+        return
+    bot.send_message(message.chat.id, response, parse_mode='Markdown', disable_web_page_preview=True)
+
+@bot.message_handler(commands=['chart'])
+def chart_product_list(message):
+    from tracker.charts import RANGES, DEFAULT_RANGE
+    from tracker.models import TrackedProduct
+    parts = message.text.split()
+    chart_range = parts[1].lower() if len(parts) > 1 and parts[1].lower() in RANGES else DEFAULT_RANGE
+    products = TrackedProduct.objects.filter(subscriptions__chat_id=str(message.chat.id)).order_by('id')
+    if not products:
+        bot.reply_to(message, "You are not tracking any products yet.")
+        return
+
+    markup = types.InlineKeyboardMarkup()
+    for p in products:
+        markup.add(types.InlineKeyboardButton(text=f"Chart: {p.name[:30]}...", callback_data=f"chart_{p.id}_{chart_range}"))
+    bot.send_message(message.chat.id, f"Select a product to chart ({chart_range}):", reply_markup=markup)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('chart_'))
+def handle_chart_callback(call):
+    import io
+    from tracker.charts import get_chart, chart_url
+    from tracker.models import TrackedProduct
+    _, product_id, chart_range = call.data.split('_')
+    product = TrackedProduct.objects.filter(subscriptions__chat_id=str(call.message.chat.id), pk=int(product_id)).first()
+    if product is None:
+        bot.answer_callback_query(call.id, "Error: Product no longer tracked.")
+        return
+    bot.answer_callback_query(call.id)
+    photo = io.BytesIO(get_chart(product, chart_range, 'png'))
+    photo.name = 'chart.png'
+    caption = f"{product.name[:200]} ({chart_range})"
+    if product.last_price is not None:
+        caption += f"\nNow ₹{product.last_price}"
+        if product.lowest_price is not None:
+            caption += f" · Lowest ever ₹{product.lowest_price}"
+    if os.getenv('PUBLIC_BASE_URL'):
+        # Signed link to the full-size SVG, valid for this product only
+        caption += f"\n{os.getenv('PUBLIC_BASE_URL').rstrip('/')}{chart_url(product.pk, chart_range)}"
+    bot.send_photo(call.message.chat.id, photo, caption=caption)
 
 @bot.message_handler(func=lambda message: True)
 def handle_message(message):
@@ -117,29 +277,55 @@ def handle_message(message):
             bot.reply_to(message, "I didn't find a link in your message. Please share a Flipkart or Amazon product link to start tracking!")
         return
 
-    if "amazon" not in url.lower() and "flipkart" not in url.lower() and "amzn.in" not in url.lower() and "dl.flipkart.com" not in url.lower():
+    from tracker.extraction import spec_for_url
+    spec = spec_for_url(url)
+    if not spec:
         bot.reply_to(message, "Sorry, I only support Amazon and Flipkart links.")
         return
 
-    from tracker.models import TrackedProduct, ProductPrice
-    product, created = TrackedProduct.objects.get_or_create(url=url)
-    
+    from tracker.canonical import get_or_create_product
+    from tracker.models import Subscription
+    target = extract_target(text, url)
+    # Short links, ?ref= variants and tracking parameters all map to one product key
+    product, created = get_or_create_product(url)
+    url = product.url
+    subscription, subscribed = Subscription.objects.get_or_create(
+        chat_id=str(message.chat.id), product=product, defaults={'target_price': target},
+    )
+    if not subscribed and target is not None and target != subscription.target_price:
+        subscription.target_price = target
+        subscription.save(update_fields=['target_price'])
+    if target is not None:
+        product.sync_target_price()
+    target_line = f"\nTarget Price: ₹{target}" if target is not None else ""
+
     if not created:
-        bot.reply_to(message, f"Already Tracking!\n\nProduct: {product.name}\nPlatform: {product.platform}")
+        if subscribed:
+            # Someone else already tracks it: nothing to scrape, just subscribe this chat
+            price_line = f"\nCurrent Price: ₹{product.last_price}" if product.last_price is not None else ""
+            bot.reply_to(message, f"Now Tracking!\n\nProduct: {product.name}{price_line}{target_line}\nPlatform: {product.platform}")
+        elif target is not None:
+            bot.reply_to(message, f"Target Updated!\n\nProduct: {product.name}{target_line}")
+        else:
+            bot.reply_to(message, f"Already Tracking!\n\nProduct: {product.name}\nPlatform: {product.platform}")
         return
 
     try:
-        platform = "Amazon" if ("amazon" in url.lower() or "amzn.in" in url.lower()) else "Flipkart"
+        platform = spec.platform
         product.platform = platform
         
         # Try Lite Scrape first (Fast, works on Vercel)
-        lite_name = scrape_lite(url)
+        lite_name, lite_price = scrape_lite(url)
         if lite_name:
-            from tracker.models import ProductPrice
-            from track_prices import clean_price
+            from tracker.extraction import clean_price
             product.name = lite_name
             product.save()
-            bot.reply_to(message, f"Added to Tracker! (Lite Mode)\n\nProduct: {lite_name}\nPlatform: {platform}\n\n*Note: Price will be updated automatically in our next hourly scan (GitHub).*")
+            price_val = clean_price(lite_price)
+            if price_val:
+                product.record_price(price_val)
+                bot.reply_to(message, f"Added to Tracker! (Lite Mode)\n\nProduct: {lite_name}\nInitial Price: {lite_price}{target_line}\nPlatform: {platform}")
+            else:
+                bot.reply_to(message, f"Added to Tracker! (Lite Mode)\n\nProduct: {lite_name}\nPlatform: {platform}\n\n*Note: Price will be updated automatically in our next hourly scan (GitHub).*")
             return
 
         # Fallback to Selenium (Only works locally/GitHub)
@@ -150,31 +336,27 @@ def handle_message(message):
             bot.reply_to(message, f"✅ Added to Tracker!\n\nProduct: {product.name}\nPlatform: {platform}\n\n⚠️ *Note: I couldn't fetch the exact name right now. Our hourly scan (GitHub) will update the details automatically.*")
             return
 
-        from track_prices import setup_driver, scrape_amazon, scrape_flipkart, clean_price
+        from track_prices import scrape_with_spec, clean_price
+        from tracker.drivers import shared_pool
         bot.reply_to(message, f"Checking {platform} with browser... Please wait.")
         
-        driver = setup_driver()
-        try:
-            if platform == "Amazon":
-                name, price = scrape_amazon(driver, url)
-            else:
-                name, price = scrape_flipkart(driver, url)
+        # Warm browser from the listener's pool instead of a cold Chrome per product
+        with shared_pool().driver() as driver:
+            name, price = scrape_with_spec(driver, url, spec)
+
+        if name:
+            product.name = name
+            product.save()
             
-            if name:
-                product.name = name
-                product.save()
-                
-                price_val = clean_price(price)
-                if price_val:
-                    ProductPrice.objects.create(product=product, price=price_val)
-                
-                response = f"Added to Tracker!\n\nProduct: {name}\nInitial Price: {price if price else 'N/A'}\nPlatform: {platform}"
-                bot.reply_to(message, response)
-            else:
-                product.delete()
-                bot.reply_to(message, "Could not retrieve product name. Is the link valid?")
-        finally:
-            driver.quit()
+            price_val = clean_price(price)
+            if price_val:
+                product.record_price(price_val)
+            
+            response = f"Added to Tracker!\n\nProduct: {name}\nInitial Price: {price if price else 'N/A'}{target_line}\nPlatform: {platform}"
+            bot.reply_to(message, response)
+        else:
+            product.delete()
+            bot.reply_to(message, "Could not retrieve product name. Is the link valid?")
             
     except Exception as e:
         if product.pk: product.delete()
@@ -0,0 +1,132 @@
+"""Product identity from a pasted link: short links resolved once (and cached in ResolvedLink),
+then the ASIN / Flipkart PID pulled out as a normalized product key.
+
+    canonicalize("https://amzn.in/d/abc")  ->  ("amazon:B0C1234567", "https://www.amazon.in/dp/B0C1234567")
+"""
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Hosts whose links are only redirects to a product page
+SHORT_LINK_HOSTS = {"amzn.in", "amzn.to", "amzn.eu", "a.co", "dl.flipkart.com", "fkrt.it", "fkrt.cc", "fkrt.co"}
+
+ASIN_RE = re.compile(r"/(?:dp|gp/product|gp/aw/d|d|product)/([A-Z0-9]{10})(?:[/?]|$)", re.IGNORECASE)
+FLIPKART_ITEM_RE = re.compile(r"/p/(itm[0-9a-z]+)", re.IGNORECASE)
+# Query parameters that only track where a click came from
+TRACKING_PARAM_RE = re.compile(r"^(utm_.*|ref.*|tag|linkCode|psc|smid|th|pf_rd_.*|pd_rd_.*|qid|sr|sprefix|crid|dib.*|content-id|affid|affExtParam\d|otracker.*|cmpid|lid|marketplace|store|srno|fm|iid|ppt|ppn|ssid|spm)$", re.IGNORECASE)
+
+def host(url):
+    return (urlsplit(url).hostname or "").lower()
+
+def strip_tracking(url):
+    """The URL without #fragment and tracking query parameters, host lower-cased."""
+    parts = urlsplit(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAM_RE.match(k)]
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+def product_key(url):
+    """("amazon:<ASIN>" | "flipkart:<PID or item id>" | None, canonical_url) without any network access."""
+    url = url.strip()
+    hostname = host(url)
+    if "amazon." in hostname:
+        match = ASIN_RE.search(urlsplit(url).path + "/")
+        if match:
+            asin = match.group(1).upper()
+            return f"amazon:{asin}", f"https://{hostname}/dp/{asin}"
+    elif "flipkart.com" in hostname and hostname != "dl.flipkart.com":
+        parts = urlsplit(url)
+        pid = dict(parse_qsl(parts.query)).get("pid")
+        item = FLIPKART_ITEM_RE.search(parts.path)
+        if pid or item:
+            # The PID pins the exact variant, the itm id only the listing
+            key = f"flipkart:{pid.upper()}" if pid else f"flipkart:{item.group(1).lower()}"
+            query = urlencode([("pid", pid)]) if pid else ""
+            return key, urlunsplit(("https", "www.flipkart.com", parts.path, query, ""))
+    return None, strip_tracking(url)
+
+def resolve(url):
+    """Final product URL behind a short link. Each short link is fetched once, then read from ResolvedLink."""
+    from tracker.models import ResolvedLink
+    if host(url) not in SHORT_LINK_HOSTS:
+        return url
+    link = ResolvedLink.objects.filter(short_url=url).first()
+    if link:
+        return link.target_url
+    from tracker import fetcher
+    result = fetcher.fetch(url)
+    if result.error or not result.final_url or host(result.final_url) in SHORT_LINK_HOSTS:
+        print(f"Could not resolve {url}: {result.error or result.status}")
+        return url
+    ResolvedLink.objects.update_or_create(short_url=url, defaults={"target_url": result.final_url})
+    return result.final_url
+
+def canonicalize(url):
+    """(product_key, canonical_url) for a pasted link; links without an ASIN / PID are keyed by their cleaned URL."""
+    key, canonical_url = product_key(resolve(url.strip()))
+    return key or f"url:{canonical_url}", canonical_url
+
+def merge_products(keeper, duplicates):
+    """Folds duplicate rows of one product into `keeper`: prices, alerts and subscriptions move over
+    (a chat subscribed to both keeps one subscription), then the snapshot and rollups are rebuilt."""
+    from django.db import transaction
+    from django.db.models import Max
+    from tracker.models import TrackedProduct, ProductPrice, Alert, Subscription
+    from tracker.price_writer import rebuild_snapshots
+    from tracker.rollups import rebuild_rollups
+    ids = [p.pk for p in duplicates]
+    with transaction.atomic():
+        # The same lock fold_new_prices takes, so no fold runs against rows being moved
+        list(TrackedProduct.objects.select_for_update().filter(pk__in=ids + [keeper.pk]).order_by('pk').values_list('pk'))
+        kept = dict(keeper.subscriptions.values_list('chat_id', 'target_price'))
+        for subscription in Subscription.objects.filter(product_id__in=ids).order_by('product_id'):
+            if subscription.chat_id not in kept:
+                kept[subscription.chat_id] = subscription.target_price
+                subscription.product = keeper
+                subscription.save(update_fields=['product'])
+            elif kept[subscription.chat_id] is None and subscription.target_price is not None:
+                kept[subscription.chat_id] = subscription.target_price
+                keeper.subscriptions.filter(chat_id=subscription.chat_id).update(target_price=subscription.target_price)
+        ProductPrice.objects.filter(product_id__in=ids).update(product=keeper)
+        Alert.objects.filter(product_id__in=ids).update(product=keeper)
+        due = [p.next_scrape_at for p in [keeper] + list(duplicates) if p.next_scrape_at is not None]
+        TrackedProduct.objects.filter(pk__in=ids).delete()
+
+        rebuild_rollups([keeper.pk])
+        rebuild_snapshots([keeper.pk])
+        keeper.refresh_from_db()
+        keeper.rollup_watermark = keeper.prices.aggregate(last=Max('id'))['last'] or 0
+        keeper.next_scrape_at = min(due) if due else None
+        keeper.save(update_fields=['rollup_watermark', 'next_scrape_at'])
+        keeper.sync_target_price()
+    print(f"Merged products {', '.join(map(str, ids))} into {keeper.pk} ({keeper.product_key})")
+    return keeper
+
+def get_or_create_product(url):
+    """(product, created) for a pasted link.
+
+    A row still keyed by its cleaned URL (a short link stored before it could be resolved) is
+    upgraded to the real key instead of getting a twin; if both rows already exist they are merged.
+    """
+    from django.db import transaction
+    from tracker.models import TrackedProduct
+    key, canonical_url = canonicalize(url)
+    with transaction.atomic():
+        if key.startswith("url:"):
+            legacy = []
+        else:
+            url_keys = {f"url:{strip_tracking(url)}", f"url:{canonical_url}"}
+            legacy = list(TrackedProduct.objects.filter(product_key__in=url_keys).order_by('pk'))
+        if legacy:
+            current = TrackedProduct.objects.filter(product_key=key).first()
+            group = sorted(legacy + ([current] if current else []), key=lambda p: p.pk)
+            keeper, duplicates = group[0], group[1:]
+            # Keys and URLs are unique: free them before the keeper takes them over
+            TrackedProduct.objects.filter(pk__in=[p.pk for p in duplicates]).update(product_key=None)
+            keeper.product_key = key
+            keeper.save(update_fields=['product_key'])
+            if duplicates:
+                merge_products(keeper, duplicates)
+            if not TrackedProduct.objects.filter(url=canonical_url).exclude(pk=keeper.pk).exists():
+                keeper.url = canonical_url
+                keeper.save(update_fields=['url'])
+            return keeper, False
+        return TrackedProduct.objects.get_or_create(product_key=key, defaults={'url': canonical_url})
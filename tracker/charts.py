@@ -0,0 +1,203 @@
+"""Price history charts (SVG or PNG) drawn from the rollups, with an in-process LRU cache.
+
+Charts never touch raw ProductPrice rows: each range maps to a rollup resolution, so a chart is
+at most a few hundred buckets. Rendered images are cached under (product, range, last_scraped_at,
+format); a new scrape changes last_scraped_at, so only that product's charts are re-rendered.
+
+The /chart/<id>/ view only serves a product to URLs carrying chart_token(id), which is signed with
+CHART_URL_SECRET (or the bot token), so links can only come from the bot.
+"""
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from html import escape
+
+import numpy as np
+from django.core import signing
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.http import urlencode
+
+from tracker.rollups import series
+
+# range -> (days of history, rollup resolution)
+RANGES = {
+    '7d': (7, 'hour'),
+    '30d': (30, 'day'),
+    '90d': (90, 'day'),
+    '1y': (365, 'week'),
+}
+DEFAULT_RANGE = '30d'
+FORMATS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+WIDTH, HEIGHT = 640, 320
+MARGIN_X, MARGIN_Y = 16, 24
+
+LINE = (37, 99, 235)
+BAND = (219, 234, 254)
+GRID = (226, 232, 240)
+BACKGROUND = (255, 255, 255)
+
+class ChartCache:
+    """LRU of rendered charts capped at `max_bytes`. Thread-safe."""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or int(os.getenv('CHART_CACHE_BYTES', 8 * 1024 * 1024))
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        product_id, chart_range, _, fmt = key
+        with self.lock:
+            # Older renders of the same chart can never be hit again once the product was re-scraped
+            for stale in [k for k in self.entries
+                          if k[0] == product_id and k[1] == chart_range and k[3] == fmt and k != key]:
+                self.size -= len(self.entries.pop(stale))
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+cache = ChartCache()
+
+def chart_points(product_id, chart_range=DEFAULT_RANGE, now=None):
+    """(bucket start unix seconds, low, high, close) arrays for a range, prices in paise."""
+    days, resolution = RANGES[chart_range]
+    rollups = series(product_id, (now or timezone.now()) - timedelta(days=days), resolution)
+    ts = np.array([r.bucket_start.timestamp() for r in rollups], dtype=np.int64)
+    prices = (np.array([(r.low, r.high, r.close) for r in rollups], dtype=float).reshape(-1, 3) * 100).round()
+    low, high, close = prices.astype(np.int64).T
+    return ts, low, high, close
+
+def _scale(ts, low, high):
+    """Pixel coordinates for the timestamps and a price -> y function, with 5% headroom."""
+    bottom, top = low.min(), high.max()
+    pad = max((top - bottom) * 0.05, 100)
+    bottom, top = bottom - pad, top + pad
+    span = max(ts[-1] - ts[0], 1)
+    xs = MARGIN_X + (ts - ts[0]) / span * (WIDTH - 2 * MARGIN_X)
+
+    def y(paise):
+        return MARGIN_Y + (top - paise) / (top - bottom) * (HEIGHT - 2 * MARGIN_Y)
+    return xs, y
+
+def render_svg(title, ts, low, high, close):
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+             f'viewBox="0 0 {WIDTH} {HEIGHT}" font-family="sans-serif" font-size="11">',
+             f'<rect width="{WIDTH}" height="{HEIGHT}" fill="rgb{BACKGROUND}"/>',
+             f'<text x="{MARGIN_X}" y="15" font-size="12" fill="#0f172a">{escape(title[:80])}</text>']
+    if not len(ts):
+        parts.append(f'<text x="{WIDTH // 2}" y="{HEIGHT // 2}" text-anchor="middle" fill="#64748b">No prices yet</text>')
+        return ('\n'.join(parts) + '\n</svg>').encode()
+
+    xs, y = _scale(ts, low, high)
+    band = [f"{x:.1f},{y(h):.1f}" for x, h in zip(xs, high)] + \
+           [f"{x:.1f},{y(lo):.1f}" for x, lo in zip(xs[::-1], low[::-1])]
+    parts.append(f'<polygon points="{" ".join(band)}" fill="rgb{BAND}"/>')
+    line = " ".join(f"{x:.1f},{y(c):.1f}" for x, c in zip(xs, close))
+    parts.append(f'<polyline points="{line}" fill="none" stroke="rgb{LINE}" stroke-width="2"/>')
+    for label, paise in (('High', high.max()), ('Low', low.min())):
+        parts.append(f'<text x="{WIDTH - MARGIN_X}" y="{y(paise) - 3:.1f}" text-anchor="end" fill="#475569">'
+                     f'{label} ₹{paise / 100:.2f}</text>')
+    start, end = (datetime.fromtimestamp(int(t), dt_timezone.utc) for t in (ts[0], ts[-1]))
+    parts.append(f'<text x="{MARGIN_X}" y="{HEIGHT - 6}" fill="#64748b">{start:%d %b %Y}</text>')
+    parts.append(f'<text x="{WIDTH - MARGIN_X}" y="{HEIGHT - 6}" text-anchor="end" fill="#64748b">{end:%d %b %Y}</text>')
+    return ('\n'.join(parts) + '\n</svg>').encode()
+
+def _png(pixels):
+    """Encodes an (height, width, 3) uint8 array as a PNG."""
+    height, width, _ = pixels.shape
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), pixels.reshape(height, width * 3)]).tobytes()
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b'')
+
+def render_png(ts, low, high, close):
+    """Low/high band, close line and grid, no text; the bot puts the numbers in the caption."""
+    pixels = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    pixels[:] = BACKGROUND
+    for row in np.linspace(MARGIN_Y, HEIGHT - MARGIN_Y, 5).astype(int):
+        pixels[row, MARGIN_X:WIDTH - MARGIN_X] = GRID
+    if not len(ts):
+        return _png(pixels)
+
+    xs, y = _scale(ts, low, high)
+    columns = np.arange(MARGIN_X, WIDTH - MARGIN_X)
+    if len(ts) > 1:
+        inside = (columns >= xs[0]) & (columns <= xs[-1])
+        top = np.interp(columns, xs, y(high))
+        bottom = np.interp(columns, xs, y(low))
+        rows = np.arange(HEIGHT)[:, None]
+        band = (rows >= np.floor(top)) & (rows <= np.ceil(bottom)) & inside
+        pixels[:, MARGIN_X:WIDTH - MARGIN_X][band] = BAND
+
+    # Close line: sample each segment densely and stamp a 2x2 dot per sample
+    ys = y(close)
+    if len(ts) == 1:
+        px, py = xs, ys
+    else:
+        steps = np.maximum(np.ceil(np.hypot(np.diff(xs), np.diff(ys)) * 2).astype(int), 1)
+        t = np.concatenate([np.arange(n) / n for n in steps] + [[1.0]])
+        segment = np.concatenate([np.full(n, i) for i, n in enumerate(steps)] + [[len(steps) - 1]])
+        px = xs[segment] + (xs[segment + 1] - xs[segment]) * t
+        py = ys[segment] + (ys[segment + 1] - ys[segment]) * t
+    px, py = np.round(px).astype(int), np.round(py).astype(int)
+    for dx in (0, 1):
+        for dy in (0, 1):
+            pixels[np.clip(py + dy, 0, HEIGHT - 1), np.clip(px + dx, 0, WIDTH - 1)] = LINE
+    return _png(pixels)
+
+def _signer():
+    return signing.Signer(key=os.getenv('CHART_URL_SECRET') or os.getenv('TELEGRAM_BOT_TOKEN'), salt='tracker.charts')
+
+def chart_token(product_id):
+    return _signer().signature(str(product_id))
+
+def valid_token(product_id, token):
+    return bool(token) and constant_time_compare(token, chart_token(product_id))
+
+def chart_url(product_id, chart_range=DEFAULT_RANGE, fmt='svg'):
+    """Path of a product's chart, signed for that product."""
+    query = urlencode({'range': chart_range, 'format': fmt, 'token': chart_token(product_id)})
+    return f"{reverse('chart', args=[product_id])}?{query}"
+
+def validate(chart_range, fmt):
+    if chart_range not in RANGES:
+        raise ValueError(f"Unknown chart range {chart_range!r}, choose from {', '.join(RANGES)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown chart format {fmt!r}, choose from {', '.join(FORMATS)}")
+
+def get_chart(product, chart_range=DEFAULT_RANGE, fmt='png'):
+    """Rendered chart bytes for a TrackedProduct, from the cache when the product hasn't been scraped since."""
+    validate(chart_range, fmt)
+    key = (product.pk, chart_range, product.last_scraped_at, fmt)
+    data = cache.get(key)
+    if data is None:
+        points = chart_points(product.pk, chart_range)
+        data = render_svg(product.name, *points) if fmt == 'svg' else render_png(*points)
+        cache.put(key, data)
+    return data
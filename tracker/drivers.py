@@ -0,0 +1,274 @@
+"""Chrome lifecycle: a pool of warm drivers with a ping health check, recycling and a per-page deadline."""
+import atexit
+import os
+import queue
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+# Nothing the scraper reads lives in these: images, fonts, media, and ad / analytics hosts
+BLOCKED_URL_PATTERNS = [
+    # Trailing * so query strings (image.jpeg?q=70) still match
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*",
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    "*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*",
+    "*amazon-adsystem.com*", "*doubleclick.net*", "*googlesyndication.com*", "*google-analytics.com*",
+    "*googletagmanager.com*", "*facebook.net*", "*facebook.com/tr*", "*criteo.com*", "*scorecardresearch.com*",
+    "*fls-eu.amazon.*", "*unagi.amazon.*", "*unagi-na.amazon.*", "*rukminim*.flixcart.com*",
+]
+
+def blocked_url_patterns():
+    """BLOCKED_URL_PATTERNS plus DRIVER_BLOCK_EXTRA, minus anything listed in DRIVER_BLOCK_ALLOW (comma-separated)."""
+    extra = [p.strip() for p in os.getenv('DRIVER_BLOCK_EXTRA', '').split(',') if p.strip()]
+    allow = {p.strip() for p in os.getenv('DRIVER_BLOCK_ALLOW', '').split(',') if p.strip()}
+    return [p for p in BLOCKED_URL_PATTERNS + extra if p not in allow]
+
+def setup_driver(lean=None, perf_log=False):
+    """Stealth headless Chrome. The lean profile (default, DRIVER_LEAN=0 to turn off) stops at
+    DOMContentLoaded and never downloads images, fonts, media or ad/analytics scripts.
+
+    perf_log enables Chrome's performance log so callers can total the bytes a page transferred.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from fake_useragent import UserAgent
+    from selenium_stealth import stealth
+    
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    if lean is None:
+        lean = os.getenv('DRIVER_LEAN', '1') != '0'
+    if lean:
+        # Return from driver.get() at DOMContentLoaded, the price and title are in the HTML
+        options.page_load_strategy = 'eager'
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+        options.add_argument("--blink-settings=imagesEnabled=false")
+    if perf_log:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    
+    ua = UserAgent()
+    user_agent = ua.random
+    options.add_argument(f"user-agent={user_agent}")
+    
+    # Use TOR Proxy if running on GitHub Actions (CI)
+    if os.getenv('CI'):
+        # Socks5 proxy on localhost:9050 (default TOR port)
+        options.add_argument('--proxy-server=socks5://127.0.0.1:9050')
+        print("Using TOR Proxy: socks5://127.0.0.1:9050")
+    
+    # Use Selenium Manager which is built-in to modern Selenium
+    driver = webdriver.Chrome(options=options)
+    
+    stealth(driver,
+        languages=["en-US", "en"],
+        vendor="Google Inc.",
+        platform="Win32",
+        webgl_vendor="Intel Inc.",
+        renderer="Intel Iris OpenGL Engine",
+        fix_hairline=True,
+    )
+    if lean:
+        # Chrome's prefs cover images; fonts, media and third-party scripts are cut at the network layer
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_url_patterns()})
+    return driver
+
+def transferred_bytes(driver):
+    """Bytes received since the last call, from the performance log of a perf_log=True driver."""
+    import json
+    total = 0
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFinished":
+            total += message["params"].get("encodedDataLength", 0)
+    return total
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and all its descendants, read from /proc. None where /proc is missing."""
+    total = 0
+    try:
+        for current in process_tree(pid):
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+    except (OSError, ValueError):
+        if total == 0:
+            return None
+    return total / 1024
+
+def process_tree(pid):
+    """pid followed by all its descendants, from /proc/<pid>/task/*/children."""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return pids
+
+class ManagedDriver:
+    """One Chrome instance plus the bookkeeping the pool needs to decide when to replace it."""
+
+    def __init__(self, factory, page_deadline):
+        self.driver = factory()
+        self.page_deadline = page_deadline
+        self.pages = 0
+        self.killed = False
+        # Lets a hung driver.get() fail on its own before the watchdog has to step in
+        self.driver.set_page_load_timeout(page_deadline)
+
+    @property
+    def pid(self):
+        process = getattr(getattr(self.driver, "service", None), "process", None)
+        return process.pid if process else None
+
+    def rss_mb(self):
+        return process_tree_rss_mb(self.pid) if self.pid else None
+
+    def kill(self):
+        """Hard-kills chromedriver and its Chrome processes; any Selenium call in flight then errors out."""
+        self.killed = True
+        if not self.pid:
+            return
+        for pid in reversed(process_tree(self.pid)):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    @contextmanager
+    def deadline(self, seconds):
+        """Kills the driver if the wrapped block runs longer than `seconds`."""
+        watchdog = threading.Timer(seconds, self.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            yield
+        finally:
+            watchdog.cancel()
+
+    def ping(self, timeout=10):
+        """Cheap round-trip through chromedriver into the page; False if the driver is dead or wedged."""
+        if self.killed:
+            return False
+        try:
+            with self.deadline(timeout):
+                return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        if self.killed:
+            return
+        try:
+            with self.deadline(15):
+                self.driver.quit()
+        except Exception as e:
+            print(f"Error closing Chrome: {e}")
+            self.kill()
+
+class DriverPool:
+    """Hands out warm Chrome drivers, at most `size` at a time.
+
+    Drivers start lazily, are checked with ping() before reuse, and are replaced after `max_pages`
+    page loads, once their process tree exceeds `max_rss_mb`, or when a page overruns `page_deadline`
+    seconds (the watchdog kills the wedged driver so the caller's Selenium call fails fast).
+    """
+
+    def __init__(self, size=1, factory=setup_driver, max_pages=None, max_rss_mb=None, page_deadline=None):
+        self.factory = factory
+        self.max_pages = max_pages or int(os.getenv('DRIVER_MAX_PAGES', 50))
+        self.max_rss_mb = max_rss_mb or float(os.getenv('DRIVER_MAX_RSS_MB', 1500))
+        self.page_deadline = page_deadline or float(os.getenv('DRIVER_PAGE_DEADLINE', 90))
+        self.slots = threading.BoundedSemaphore(size)
+        # LIFO so the most recently used (warmest) driver goes out first
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.recycled = 0
+        self.closed = False
+
+    def recycle_reason(self, managed):
+        if managed.killed:
+            return "page deadline exceeded"
+        if managed.pages >= self.max_pages:
+            return f"{managed.pages} pages"
+        rss = managed.rss_mb()
+        if rss is not None and rss > self.max_rss_mb:
+            return f"{rss:.0f} MB RSS"
+        if not managed.ping():
+            return "failed health check"
+        return None
+
+    def checkout(self):
+        while True:
+            try:
+                managed = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            reason = self.recycle_reason(managed)
+            if not reason:
+                return managed
+            print(f"Recycling Chrome after {reason}.")
+            managed.quit()
+            with self.lock:
+                self.recycled += 1
+        managed = ManagedDriver(self.factory, self.page_deadline)
+        with self.lock:
+            self.started += 1
+        return managed
+
+    @contextmanager
+    def driver(self):
+        """`with pool.driver() as driver:` loads one page (or a retry sequence) under the deadline."""
+        self.slots.acquire()
+        managed = None
+        try:
+            managed = self.checkout()
+            managed.pages += 1
+            with managed.deadline(self.page_deadline):
+                yield managed.driver
+        finally:
+            if managed is not None:
+                if managed.killed or self.closed:
+                    if managed.killed:
+                        print(f"Killed Chrome after a page ran past {self.page_deadline:.0f}s.")
+                    managed.quit()
+                else:
+                    self.idle.put(managed)
+            self.slots.release()
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().quit()
+            except queue.Empty:
+                break
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+def shared_pool():
+    """Process-wide pool for callers outside a scrape pass, e.g. the bot's add-product fallback."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = DriverPool(int(os.getenv('DRIVER_POOL_SIZE', 1)))
+            atexit.register(_shared_pool.close)
+        return _shared_pool
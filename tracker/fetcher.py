@@ -0,0 +1,124 @@
+import os
+import atexit
+import asyncio
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# headers: the response validators (ETag / Last-Modified) the HTTP cache needs, when present
+FetchResult = namedtuple('FetchResult', ['url', 'status', 'text', 'final_url', 'error', 'headers'], defaults=(None,))
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+class AsyncFetcher:
+    """Asyncio HTTP client that keeps one pooled session per host and caps concurrency per host."""
+
+    def __init__(self, per_host_limit=2, timeout=15, max_bytes=2_000_000, headers=None):
+        self.per_host_limit = per_host_limit
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=min(timeout, 10))
+        self.max_bytes = max_bytes
+        self.headers = headers or DEFAULT_HEADERS
+        self.sessions = {}
+        self.semaphores = {}
+
+    def _session(self, host):
+        session = self.sessions.get(host)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.per_host_limit, ttl_dns_cache=300)
+            session = aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=self.timeout)
+            self.sessions[host] = session
+        return session
+
+    def _semaphore(self, host):
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self.semaphores[host]
+
+    async def fetch(self, url, headers=None):
+        host = urlsplit(url).hostname or ''
+        async with self._semaphore(host):
+            try:
+                async with self._session(host).get(url, headers=headers, allow_redirects=True) as resp:
+                    # Stream the body and stop at max_bytes, product pages don't need more than that
+                    chunks, size = [], 0
+                    async for chunk in resp.content.iter_chunked(64 * 1024):
+                        chunks.append(chunk)
+                        size += len(chunk)
+                        if size >= self.max_bytes:
+                            break
+                    body = b''.join(chunks)
+                    try:
+                        text = body.decode(resp.charset or 'utf-8', errors='replace')
+                    except LookupError:
+                        # Unknown charset in Content-Type (e.g. "charset=utf8mb4")
+                        text = body.decode('utf-8', errors='replace')
+                    validators = {h: resp.headers[h] for h in VALIDATOR_HEADERS if h in resp.headers}
+                    return FetchResult(url, resp.status, text, str(resp.url), None, validators)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return FetchResult(url, None, '', url, str(e) or type(e).__name__)
+
+    async def fetch_many(self, urls, headers=None, delays=None):
+        """Fetches urls concurrently; `headers` is an optional list of per-URL extra headers and
+        `delays` an optional list of seconds to wait before starting each fetch."""
+        headers = headers or [None] * len(urls)
+        delays = delays or [0] * len(urls)
+        return await asyncio.gather(*(self._fetch_after(url, h, d) for url, h, d in zip(urls, headers, delays)))
+
+    async def _fetch_after(self, url, headers, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return await self.fetch(url, headers)
+
+    async def close(self):
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+
+# Sync callers (the bot, the scraper threads) share one fetcher running on a background loop,
+# so its pooled connections survive between calls.
+_loop = None
+_fetcher = None
+_lock = threading.Lock()
+
+def get_fetcher():
+    global _loop, _fetcher
+    with _lock:
+        if _fetcher is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="fetcher-loop", daemon=True).start()
+            _fetcher = AsyncFetcher(
+                per_host_limit=int(os.getenv('FETCHER_PER_HOST', 2)),
+                timeout=float(os.getenv('FETCHER_TIMEOUT', 15)),
+            )
+            atexit.register(shutdown)
+    return _fetcher
+
+def _run(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+def fetch(url, headers=None):
+    """Blocking wrapper around AsyncFetcher.fetch."""
+    fetcher = get_fetcher()
+    return _run(fetcher.fetch(url, headers=headers))
+
+def fetch_many(urls, headers=None, delays=None):
+    """Blocking wrapper that fetches all urls concurrently and returns results in order."""
+    fetcher = get_fetcher()
+    return _run(fetcher.fetch_many(urls, headers, delays))
+
+def shutdown():
+    global _loop, _fetcher
+    with _lock:
+        if _fetcher is None:
+            return
+        try:
+            _run(_fetcher.close())
+        finally:
+            _loop.call_soon_threadsafe(_loop.stop)
+            _loop, _fetcher = None, None
@@ -0,0 +1,114 @@
+"""On-disk cache of lite-tier responses, so unchanged product pages are not re-written.
+
+One SQLite file keyed by URL holds each page's ETag / Last-Modified and the name / price extracted
+last time. The scraper sends conditional requests from it: a 304 reuses the cached result without
+parsing, and a 200 whose extracted name and price match it counts as unchanged. Entries are keyed by
+the canonical product URL (tracker.canonical), so ?ref= / tag= variants of a link share one entry.
+
+An entry stays usable until evict() drops it: after HTTP_CACHE_TTL_HOURS without a 200 or 304
+confirming it, or when it is among the least recently used beyond HTTP_CACHE_MAX_ENTRIES.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from tracker.canonical import product_key
+
+CacheEntry = namedtuple('CacheEntry', ['url', 'etag', 'last_modified', 'name', 'price', 'fetched_at'])
+
+def cache_key(url):
+    """Canonical URL of the product page: /dp/<ASIN>, ?pid= only, or the URL without tracking parameters."""
+    return product_key(url)[1]
+
+class HttpCache:
+    """Thread-safe SQLite cache with a TTL and an LRU cap on the number of entries."""
+
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = path or os.getenv('HTTP_CACHE_PATH') or os.path.join(tempfile.gettempdir(), 'deal_alert_http_cache.sqlite3')
+        self.ttl = ttl or float(os.getenv('HTTP_CACHE_TTL_HOURS', 24)) * 3600
+        self.max_entries = max_entries or int(os.getenv('HTTP_CACHE_MAX_ENTRIES', 5000))
+        self.lock = threading.Lock()
+        self.counters = {'not_modified': 0, 'unchanged': 0, 'miss': 0}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                name TEXT, price TEXT, fetched_at REAL NOT NULL, used_at REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at)")
+
+    def get(self, url):
+        """The entry for url, or None. Validators are worth sending however old the entry is, the
+        server decides whether it still matches; only evict() retires entries."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT url, etag, last_modified, name, price, fetched_at FROM pages WHERE url = ?", (cache_key(url),),
+            ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def conditional_headers(self, entry):
+        if entry is None:
+            return None
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers or None
+
+    def put(self, url, validators, name, price):
+        now = time.time()
+        validators = validators or {}
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(url), validators.get('ETag'), validators.get('Last-Modified'), name, price, now, now),
+            )
+
+    def touch(self, entry):
+        """Marks an entry the server just confirmed with a 304 as fresh and recently used."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("UPDATE pages SET fetched_at = ?, used_at = ? WHERE url = ?", (now, now, entry.url))
+
+    def count(self, outcome):
+        with self.lock:
+            self.counters[outcome] += 1
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones beyond max_entries."""
+        with self.lock:
+            expired = self.db.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
+            overflow = self.db.execute(
+                "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        return expired + overflow
+
+    def report(self):
+        hits = self.counters['not_modified'] + self.counters['unchanged']
+        total = hits + self.counters['miss']
+        if total:
+            print(f"HTTP cache: {hits}/{total} hits ({self.counters['not_modified']} not modified, "
+                  f"{self.counters['unchanged']} same name and price), {self.counters['miss']} misses.")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide cache, or None when HTTP_CACHE=0."""
+    global _cache
+    if os.getenv('HTTP_CACHE', '1') == '0':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
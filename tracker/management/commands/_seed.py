@@ -0,0 +1,70 @@
+"""Synthetic price history shared by the benchmark commands. Never point these at the production database."""
+import time
+
+from django.db import connection
+
+from tracker.models import TrackedProduct, ProductPrice, PriceRollup, Alert
+
+BENCH_URL_PREFIX = "https://bench.invalid/"
+
+def is_local_database():
+    host = connection.settings_dict.get('HOST') or ''
+    return connection.vendor == 'sqlite' or host in ('localhost', '127.0.0.1', '::1')
+
+def seed_history(product_count, rows_per_product, stdout=None):
+    """Creates `product_count` bench products with `rows_per_product` raw prices each, two hours apart.
+
+    Rows are generated inside the database (generate_series / recursive CTE) so millions of rows
+    take seconds instead of a Python loop.
+    """
+    clear_seeded()
+    TrackedProduct.objects.bulk_create([
+        TrackedProduct(name=f"bench-{i}", url=f"{BENCH_URL_PREFIX}{i}", platform='Amazon')
+        for i in range(product_count)
+    ], batch_size=1000)
+
+    prices = ProductPrice._meta.db_table
+    products = TrackedProduct._meta.db_table
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"""
+                INSERT INTO {prices} (product_id, price, scraped_at, is_summary)
+                SELECT p.id, 1000 + ((g * 7 + p.id * 13) %% 500), now() - g * interval '2 hours', false
+                FROM {products} p CROSS JOIN generate_series(1, %s) AS g
+                WHERE p.url LIKE %s
+            """, [rows_per_product, BENCH_URL_PREFIX + '%'])
+            cursor.execute(f"ANALYZE {prices}")
+        else:
+            cursor.execute(f"""
+                INSERT INTO {prices} (product_id, price, scraped_at, is_summary)
+                WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < %s)
+                SELECT p.id, 1000 + ((g.n * 7 + p.id * 13) %% 500),
+                       strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now', '-' || (g.n * 2) || ' hours'), 0
+                FROM {products} p, g
+                WHERE p.url LIKE %s
+            """, [rows_per_product, BENCH_URL_PREFIX + '%'])
+    if stdout:
+        stdout.write(f"Seeded {product_count * rows_per_product:,} rows in {time.perf_counter() - start:.1f}s")
+    return list(TrackedProduct.objects.filter(url__startswith=BENCH_URL_PREFIX).values_list('id', flat=True))
+
+def clear_seeded():
+    # Raw SQL: the ORM's cascade would load every price row id into memory first
+    prices = ProductPrice._meta.db_table
+    products = TrackedProduct._meta.db_table
+    with connection.cursor() as cursor:
+        for table in (prices, PriceRollup._meta.db_table, Alert._meta.db_table):
+            cursor.execute(
+                f"DELETE FROM {table} WHERE product_id IN (SELECT id FROM {products} WHERE url LIKE %s)",
+                [BENCH_URL_PREFIX + '%'],
+            )
+        cursor.execute(f"DELETE FROM {products} WHERE url LIKE %s", [BENCH_URL_PREFIX + '%'])
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
@@ -1,68 +1,97 @@
-from django.core.management.base import BaseCommand
-from tracker.models import TrackedProduct, ProductPrice
-from django.db.models import Avg, Max
-from django.db import transaction
 import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+
+from tracker.models import TrackedProduct, ProductPrice
+from tracker.rollups import fold_new_prices, rewind_rollups
 
 class Command(BaseCommand):
-    help = 'Aggregates old price records into summary rows'
+    help = 'Folds price rows past each product\'s watermark into PriceRollup, then prunes folded rows older than the raw retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int,
+                            help='Raw rows to keep, in days (default: PRICE_RAW_RETENTION_DAYS or 30)')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows folded per transaction; an interrupted run resumes from the last committed chunk')
+        parser.add_argument('--since', help='Rebuild rollups from this date/time onwards (ISO format) instead of '
+                                            'only folding new rows; rows already pruned cannot be recovered')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be pruned, then roll back')
 
     def handle(self, *args, **options):
-        # Default to 250, but allow env var override
-        batch_size = int(os.getenv('PRICE_AGG_BATCH_SIZE', 250))
-        self.stdout.write(f"Starting aggregation with batch size: {batch_size}")
-        
-        products = TrackedProduct.objects.all()
-        total_aggregated_rows = 0
-        
-        for product in products:
-            # Fetch all raw row IDs ordered by time (oldest first)
-            all_ids = list(
-                ProductPrice.objects.filter(product=product, is_summary=False)
-                .order_by('scraped_at')
-                .values_list('id', flat=True)
-            )
-            
-            total_count = len(all_ids)
-            
-            # We must preserve at least the most recent raw row for alerts.
-            if total_count <= 1:
-                continue
-                
-            # Exclude the very last ID (newest) from being aggregated
-            ids_to_process = all_ids[:-1]
-            
-            # Process in chunks
-            for i in range(0, len(ids_to_process), batch_size):
-                chunk_ids = ids_to_process[i : i + batch_size]
-                
-                # Only aggregate full batches
-                if len(chunk_ids) < batch_size:
-                    continue
-                
+        retention_days = options['retention_days'] or int(os.getenv('PRICE_RAW_RETENTION_DAYS', 30))
+        dry_run = options['dry_run']
+
+        if options['since']:
+            since = self.parse_since(options['since'])
+            if not dry_run:
                 with transaction.atomic():
-                    batch_qs = ProductPrice.objects.filter(id__in=chunk_ids)
-                    if not batch_qs.exists():
-                        continue
+                    start = rewind_rollups(since)
+                self.stdout.write(f"Rebuilt rollups from {start:%Y-%m-%d %H:%M} UTC")
+
+        if not dry_run:
+            self.fold(options['chunk_size'])
+        self.prune(retention_days, dry_run)
+
+    def parse_since(self, value):
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f"Cannot parse --since {value!r}, use YYYY-MM-DD or an ISO datetime")
+            since = timezone.datetime(day.year, day.month, day.day)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def fold(self, chunk_size):
+        # Each chunk commits its rollups and watermarks together, so the work is never redone
+        started = time.perf_counter()
+        total = 0
+        while True:
+            with transaction.atomic():
+                folded = fold_new_prices(limit=chunk_size)
+            if not folded:
+                break
+            total += folded
+            self.stdout.write(f"  Folded {total} rows ({time.perf_counter() - started:.2f}s)")
+        self.stdout.write(f"Rollups up to date, {total} new rows folded in {time.perf_counter() - started:.2f}s")
+
+    def prune(self, retention_days, dry_run):
+        cutoff = timezone.now() - timedelta(days=retention_days)
+        self.stdout.write(f"Pruning price rows older than {retention_days} days ({cutoff:%Y-%m-%d %H:%M}){' (dry run)' if dry_run else ''}")
+
+        prices = connection.ops.quote_name(ProductPrice._meta.db_table)
+        products = connection.ops.quote_name(TrackedProduct._meta.db_table)
+        # Only rows at or below the watermark are in the rollups. The newest raw row of each product
+        # is always kept, alerts and snapshots rely on it.
+        where = f"""
+            {prices}.scraped_at < %s AND {prices}.id <= (
+                SELECT folded.rollup_watermark FROM {products} folded WHERE folded.id = {prices}.product_id
+            ) AND (
+                {prices}.is_summary = %s OR {prices}.scraped_at < (
+                    SELECT MAX(latest.scraped_at) FROM {prices} latest
+                    WHERE latest.product_id = {prices}.product_id AND latest.is_summary = %s
+                )
+            )
+        """
+        params = [cutoff, True, False]
+
+        started = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*), COUNT(DISTINCT product_id) FROM {prices} WHERE {where}", params)
+            row_count, product_count = cursor.fetchone()
+            self.stdout.write(f"  {row_count} rows across {product_count} products past retention "
+                              f"({time.perf_counter() - started:.2f}s)")
+            if dry_run or not row_count:
+                self.stdout.write("Done. Nothing pruned." if not dry_run else f"Done. Would prune {row_count} rows.")
+                return
+
+            cursor.execute(f"DELETE FROM {prices} WHERE {where}", params)
+            deleted = cursor.rowcount
 
-                    stats = batch_qs.aggregate(p=Avg('price'), d=Max('scraped_at'))
-                    avg_price = stats['p']
-                    max_date = stats['d']
-                    
-                    if avg_price is None:
-                        continue
-                        
-                    # Create summary row
-                    ProductPrice.objects.create(
-                        product=product,
-                        price=avg_price,
-                        scraped_at=max_date,
-                        is_summary=True
-                    )
-                    
-                    # Delete raw rows
-                    count = batch_qs.delete()[0]
-                    total_aggregated_rows += count
-                    self.stdout.write(f"  {product.name}: Aggregated {count} rows into 1 summary.")
-        
-        self.stdout.write(f"Done. Total rows aggregated/deleted: {total_aggregated_rows}")
+        self.stdout.write(f"Done. Total rows pruned: {deleted} in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from decimal import Decimal
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from django.core.management.base import BaseCommand
+
+from tracker.alerts import AlertDispatcher, format_alert
+from tracker.models import Alert, TrackedProduct
+from ._seed import BENCH_URL_PREFIX, clear_seeded
+
+def start_fake_bot_api(chat_interval=1.0, latency=0.02, retry_after=1):
+    """Local Bot API stand-in: records sendMessage calls and answers 429 with `retry_after` when
+    a chat gets more than one message per `chat_interval` seconds, like Telegram does."""
+    state = {'messages': [], 'rejected': 0, 'last': {}, 'lock': threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            time.sleep(latency)
+            chat_id, now = body.get("chat_id"), time.monotonic()
+            with state['lock']:
+                last = state['last'].get(chat_id)
+                if last is not None and now - last < chat_interval:
+                    state['rejected'] += 1
+                    status, reply = 429, {"ok": False, "error_code": 429,
+                                          "description": f"Too Many Requests: retry after {retry_after}",
+                                          "parameters": {"retry_after": retry_after}}
+                else:
+                    state['last'][chat_id] = now
+                    state['messages'].append(body)
+                    status, reply = 200, {"ok": True, "result": {"message_id": len(state['messages'])}}
+            data = json.dumps(reply).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class Command(BaseCommand):
+    help = 'Sends synthetic alerts to a local fake Bot API: one post per alert vs the outbox dispatcher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=40)
+        parser.add_argument('--chats', type=int, default=4)
+
+    def handle(self, *args, **options):
+        clear_seeded()
+        products = TrackedProduct.objects.bulk_create([
+            TrackedProduct(name=f"bench-{i}", url=f"{BENCH_URL_PREFIX}{i}", platform='Amazon')
+            for i in range(options['alerts'])
+        ])
+        chats = [str(9000 + c) for c in range(options['chats'])]
+        try:
+            # Today's path: one fresh requests.post per drop, 429s silently lost
+            server = start_fake_bot_api()
+            base = f"http://127.0.0.1:{server.server_address[1]}/botTOKEN/sendMessage"
+            start = time.perf_counter()
+            for i, product in enumerate(products):
+                requests.post(base, json={"chat_id": chats[i % len(chats)],
+                                          "text": format_alert(product, Decimal(900), Decimal(1000))}, timeout=15)
+            naive = (time.perf_counter() - start, len(server.state['messages']), server.state['rejected'])
+            server.shutdown()
+
+            server = start_fake_bot_api()
+            Alert.objects.bulk_create([
+                Alert(product=product, chat_id=chats[i % len(chats)], price=Decimal(900), previous_price=Decimal(1000))
+                for i, product in enumerate(products)
+            ])
+            dispatcher = AlertDispatcher(token="TOKEN", base=f"http://127.0.0.1:{server.server_address[1]}")
+            start = time.perf_counter()
+            delivered = dispatcher.dispatch()
+            outbox = (time.perf_counter() - start, len(server.state['messages']), server.state['rejected'])
+            dispatcher.close()
+            server.shutdown()
+        finally:
+            clear_seeded()
+
+        n = options['alerts']
+        self.stdout.write(f"{n} alerts across {len(chats)} chats")
+        self.stdout.write(f"{'':<12}{'seconds':>9}{'messages':>10}{'429s':>6}{'alerts delivered':>18}")
+        self.stdout.write(f"{'one-by-one':<12}{naive[0]:>9.2f}{naive[1]:>10}{naive[2]:>6}{naive[1]:>18}")
+        self.stdout.write(f"{'outbox':<12}{outbox[0]:>9.2f}{outbox[1]:>10}{outbox[2]:>6}{delivered:>18}")
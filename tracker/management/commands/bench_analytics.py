@@ -0,0 +1,83 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from tracker import analytics
+from tracker.models import ProductPrice
+from ._seed import is_local_database, seed_history, clear_seeded
+
+def orm_stats(product_ids, since=None):
+    """The pre-NumPy way: one query per product and Decimal arithmetic in Python."""
+    result = {}
+    for pid in product_ids:
+        rows = ProductPrice.objects.filter(product_id=pid)
+        if since is not None:
+            rows = rows.filter(scraped_at__gte=since)
+        prices = list(rows.order_by('scraped_at', 'id').values_list('price', flat=True))
+        if not prices:
+            continue
+        moves = [(b - a) / a for a, b in zip(prices, prices[1:]) if a]
+        result[pid] = {
+            'low': min(prices),
+            'high': max(prices),
+            'mean': sum(prices) / len(prices),
+            'p50': statistics.median(prices),
+            'volatility': statistics.pstdev(moves) if moves else 0,
+            'drops': sum(1 for a, b in zip(prices, prices[1:]) if b < a),
+        }
+    return result
+
+class Command(BaseCommand):
+    help = 'Seeds a local database with synthetic price history and times per-product stats: ORM loop vs tracker.analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--rows-per-product', type=int, default=2000)
+        parser.add_argument('--days', type=int, help='Only the last N days of history (default: all of it)')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows afterwards')
+        parser.add_argument('--allow-remote', action='store_true', help='Run even if the database is not local')
+
+    def handle(self, *args, **options):
+        if not is_local_database() and not options['allow_remote']:
+            raise CommandError("Refusing to seed millions of rows into a non-local database (use --allow-remote).")
+
+        product_ids = seed_history(options['products'], options['rows_per_product'], self.stdout)
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        try:
+            start = time.perf_counter()
+            slow = orm_stats(product_ids, since)
+            orm_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            histories = analytics.load_histories(product_ids, since=since)
+            load_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            fast = analytics.stats(histories)
+            compute_seconds = time.perf_counter() - start
+
+            mismatches = 0
+            for i, pid in enumerate(fast['product_id'].tolist()):
+                expected = slow[pid]
+                if (fast['low'][i] != expected['low'] * 100 or fast['high'][i] != expected['high'] * 100
+                        or abs(fast['p50'][i] - float(expected['p50']) * 100) > 0.5
+                        or fast['drops'][i] != expected['drops']):
+                    mismatches += 1
+            if len(fast['product_id']) != len(slow):
+                mismatches += abs(len(fast['product_id']) - len(slow))
+
+            rows = len(histories.paise)
+            self.stdout.write(f"\n{rows:,} rows across {len(histories)} products ({connection.vendor})")
+            self.stdout.write(f"{'ORM loop + Decimal':<28}{orm_seconds:>10.2f}s")
+            self.stdout.write(f"{'NumPy load':<28}{load_seconds:>10.2f}s")
+            self.stdout.write(f"{'NumPy stats':<28}{compute_seconds:>10.2f}s")
+            total = load_seconds + compute_seconds
+            self.stdout.write(f"{'speedup':<28}{orm_seconds / max(total, 0.001):>10.1f}x")
+            self.stdout.write(f"Results {'match' if not mismatches else f'differ for {mismatches} products'}; "
+                              f"array memory {(histories.product.nbytes + histories.ts.nbytes + histories.paise.nbytes) / 2 ** 20:.1f} MB")
+        finally:
+            if not options['keep']:
+                clear_seeded()
@@ -0,0 +1,100 @@
+import json
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.extraction import SPECS, clean_price, extract_from_html
+
+BENCH_DIR = Path(__file__).resolve().parents[2] / 'bench'
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_case(case, html):
+    """Same steps the lite tier runs on a fetched page. Returns (name, raw_price, bot_check)."""
+    spec = SPECS[case['platform']]
+    if spec.is_bot_check(html):
+        return None, None, True
+    name, price = extract_from_html(spec, html)
+    return name, price, False
+
+class Command(BaseCommand):
+    help = 'Offline extraction benchmark and regression check over the saved product page corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Passes over the whole corpus')
+        parser.add_argument('--threshold', type=float, default=0.3,
+                            help='Fail if speed relative to a bare parse drops more than this fraction below the baseline')
+        parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline')
+
+    def handle(self, *args, **options):
+        cases = json.loads((BENCH_DIR / 'expected.json').read_text(encoding='utf-8'))
+        pages = {c['file']: (BENCH_DIR / 'pages' / c['file']).read_text(encoding='utf-8') for c in cases}
+
+        # Accuracy
+        failures = []
+        for case in cases:
+            name, price, bot_check = run_case(case, pages[case['file']])
+            expected_price = clean_price(case['price']) if case['price'] else None
+            if bot_check != case['bot_check'] or name != case['name'] or clean_price(price) != expected_price:
+                failures.append(f"{case['file']}: got ({name!r}, {price!r}, bot_check={bot_check})")
+        accuracy = (len(cases) - len(failures)) / len(cases)
+
+        # Throughput / latency. Each page is also parsed bare (no spec work) right after, so the
+        # regression check compares against a reference measured on this machine in this run
+        latencies, reference = [], 0.0
+        for _ in range(options['iterations']):
+            for case in cases:
+                html = pages[case['file']]
+                t0 = time.perf_counter()
+                run_case(case, html)
+                t1 = time.perf_counter()
+                BeautifulSoup(html, "html.parser")
+                reference += time.perf_counter() - t1
+                latencies.append(t1 - t0)
+        elapsed = sum(latencies)
+        latencies.sort()
+
+        result = {
+            'pages_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            # Extraction speed as a fraction of bare parsing speed, comparable across machines
+            'relative_speed': round(reference / elapsed, 3),
+            'accuracy': round(accuracy, 4),
+        }
+        self.stdout.write(f"Corpus: {len(cases)} pages x {options['iterations']} iterations")
+        self.stdout.write(f"Throughput: {result['pages_per_second']} pages/s "
+                          f"({result['relative_speed']:.2f}x of a bare parse)")
+        self.stdout.write(f"Latency: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+        self.stdout.write(f"Accuracy: {accuracy:.1%}")
+        for failure in failures:
+            self.stdout.write(f"  MISMATCH {failure}")
+
+        baseline_path = BENCH_DIR / 'baseline.json'
+        if options['update_baseline']:
+            baseline_path.write_text(json.dumps(result, indent=2) + "\n")
+            self.stdout.write(f"Baseline written to {baseline_path}")
+            return
+
+        if failures:
+            raise CommandError(f"{len(failures)} page(s) extracted incorrectly.")
+        if baseline_path.exists():
+            # Absolute pages/s depends on the machine, so only the relative speed is checked
+            baseline = json.loads(baseline_path.read_text())
+            if 'relative_speed' not in baseline:
+                self.stdout.write("Baseline has no relative_speed, re-run with --update-baseline to check throughput")
+                return
+            floor = baseline['relative_speed'] * (1 - options['threshold'])
+            self.stdout.write(f"Baseline: {baseline['relative_speed']:.2f}x of a bare parse "
+                              f"(floor {floor:.2f}x, {baseline['pages_per_second']} pages/s where it was recorded)")
+            if result['relative_speed'] < floor:
+                raise CommandError(
+                    f"Extraction throughput regressed: {result['relative_speed']:.2f}x of a bare parse "
+                    f"is below {floor:.2f}x ({options['threshold']:.0%} under baseline)."
+                )
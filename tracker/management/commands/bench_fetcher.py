@@ -0,0 +1,86 @@
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+from django.core.management.base import BaseCommand
+
+from tracker.fetcher import AsyncFetcher, DEFAULT_HEADERS
+
+STUB_PAGE = (
+    "<html><head><title>Stub Product : Amazon.in</title></head><body>"
+    "<span id='productTitle'>Stub Product</span>"
+    "<span class='a-price'><span class='a-price-whole'>1,299</span></span>"
+    + "<p>filler</p>" * 2000 +
+    "</body></html>"
+).encode()
+
+def start_stub_server(delay):
+    """Local keep-alive HTTP server that serves the same product page after `delay` seconds."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(STUB_PAGE)))
+            self.end_headers()
+            self.wfile.write(STUB_PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class Command(BaseCommand):
+    help = 'Measures lite fetch throughput: sequential fresh sessions vs the pooled async fetcher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--urls', type=int, default=200, help='Number of URLs to fetch')
+        parser.add_argument('--delay', type=float, default=0.05, help='Simulated server latency in seconds')
+        parser.add_argument('--per-host', type=int, default=8, help='Async fetcher per-host concurrency')
+        parser.add_argument('--url', help='Benchmark against this base URL instead of the local stub server')
+
+    def handle(self, *args, **options):
+        n = options['urls']
+        server = None
+        if options['url']:
+            base = options['url']
+        else:
+            server = start_stub_server(options['delay'])
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = [f"{base}/dp/B{i:09d}" for i in range(n)]
+
+        try:
+            # Today's scrape_lite: a new requests.Session per URL, one after another
+            start = time.perf_counter()
+            for url in urls:
+                session = requests.Session()
+                session.get(url, headers=DEFAULT_HEADERS, timeout=15)
+                session.close()
+            sequential = time.perf_counter() - start
+
+            async def run_async():
+                fetcher = AsyncFetcher(per_host_limit=options['per_host'])
+                try:
+                    start = time.perf_counter()
+                    results = await fetcher.fetch_many(urls)
+                    return time.perf_counter() - start, results
+                finally:
+                    await fetcher.close()
+
+            pooled, results = asyncio.run(run_async())
+            failures = sum(1 for r in results if r.error or r.status != 200)
+        finally:
+            if server:
+                server.shutdown()
+
+        self.stdout.write(f"URLs: {n}  server delay: {options['delay']}s  per-host limit: {options['per_host']}")
+        self.stdout.write(f"Sequential sessions: {sequential:.2f}s  ({n / sequential:.1f} URLs/s)")
+        self.stdout.write(f"Async pooled:        {pooled:.2f}s  ({n / pooled:.1f} URLs/s, {failures} failures)")
+        self.stdout.write(f"Speedup: {sequential / pooled:.1f}x")
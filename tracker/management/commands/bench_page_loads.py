@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.drivers import setup_driver, transferred_bytes
+from tracker.extraction import spec_for_url
+from tracker.models import TrackedProduct
+
+class Command(BaseCommand):
+    help = 'Loads product pages with the full and the lean Chrome profile and compares bytes transferred and page time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', help='Product URLs (default: a sample of tracked products)')
+        parser.add_argument('--limit', type=int, default=5, help='Tracked products to sample when no URLs are given')
+
+    def handle(self, *args, **options):
+        from track_prices import scrape_with_spec
+
+        urls = options['urls'] or list(
+            TrackedProduct.objects.order_by('?').values_list('url', flat=True)[:options['limit']]
+        )
+        pages = [(url, spec_for_url(url)) for url in urls]
+        pages = [(url, spec) for url, spec in pages if spec]
+        if not pages:
+            raise CommandError("No Amazon / Flipkart URLs to load.")
+
+        results = {}
+        for profile, lean in (('full', False), ('lean', True)):
+            driver = setup_driver(lean=lean, perf_log=True)
+            try:
+                # Warm-up page so Chrome start-up isn't billed to the first product
+                driver.get("about:blank")
+                transferred_bytes(driver)
+                results[profile] = []
+                for url, spec in pages:
+                    start = time.perf_counter()
+                    name, price = scrape_with_spec(driver, url, spec)
+                    elapsed = time.perf_counter() - start
+                    results[profile].append((transferred_bytes(driver), elapsed, bool(price)))
+                    self.stdout.write(f"  {profile:<5} {elapsed:6.2f}s {results[profile][-1][0] / 1024:9.0f} KB "
+                                      f"{'price' if price else 'NO PRICE':<9} {url}")
+            finally:
+                driver.quit()
+
+        self.stdout.write(f"\n{'profile':<8}{'KB/page':>10}{'s/page':>9}{'prices':>9}")
+        for profile, rows in results.items():
+            n = len(rows)
+            self.stdout.write(f"{profile:<8}{sum(r[0] for r in rows) / 1024 / n:>10.0f}"
+                              f"{sum(r[1] for r in rows) / n:>9.2f}{sum(r[2] for r in rows):>6}/{n}")
+        full_bytes = sum(r[0] for r in results['full']) or 1
+        full_s = sum(r[1] for r in results['full']) or 1
+        self.stdout.write(f"lean/full: {sum(r[0] for r in results['lean']) / full_bytes:.0%} of bytes, "
+                          f"{sum(r[1] for r in results['lean']) / full_s:.0%} of time")
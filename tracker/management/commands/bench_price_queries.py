@@ -0,0 +1,78 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+
+from tracker.models import ProductPrice
+from ._seed import is_local_database, seed_history, clear_seeded, median_ms
+
+class Command(BaseCommand):
+    help = 'Seeds a local database with synthetic price history and times the hot ProductPrice queries with and without the composite indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--rows-per-product', type=int, default=2000)
+        parser.add_argument('--sample', type=int, default=50, help='Products looked up per timed query')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows afterwards')
+
+    def handle(self, *args, **options):
+        # Drops and recreates the real ProductPrice indexes, never allowed against a shared database
+        if not is_local_database():
+            raise CommandError("Refusing to seed rows and drop indexes on a non-local database.")
+
+        product_ids = seed_history(options['products'], options['rows_per_product'], self.stdout)
+        sample = random.sample(product_ids, min(options['sample'], len(product_ids)))
+
+        def latest_raw():
+            for pid in sample:
+                list(ProductPrice.objects.filter(product_id=pid, is_summary=False)
+                     .order_by('-scraped_at').values_list('price', flat=True)[:1])
+
+        def latest_summary():
+            for pid in sample:
+                list(ProductPrice.objects.filter(product_id=pid, is_summary=True)
+                     .order_by('-scraped_at').values_list('price', flat=True)[:1])
+
+        def aggregation_scan():
+            for pid in sample[:5]:
+                list(ProductPrice.objects.filter(product_id=pid, is_summary=False)
+                     .order_by('scraped_at').values_list('id', flat=True))
+
+        queries = [
+            (f"latest raw price x{len(sample)}", latest_raw),
+            (f"latest summary x{len(sample)}", latest_summary),
+            ("aggregation id scan x5", aggregation_scan),
+        ]
+
+        indexes = ProductPrice._meta.indexes
+        fk_only = models.Index(fields=['product'], name='bench_price_fk_idx')
+        results = {}
+        try:
+            # "Before": only the plain FK index, like migrations 0001-0004 left it
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(ProductPrice, index)
+                editor.add_index(ProductPrice, fk_only)
+            self.analyze()
+            results['before'] = [median_ms(fn, options['repeat']) for _, fn in queries]
+        finally:
+            with connection.schema_editor() as editor:
+                editor.remove_index(ProductPrice, fk_only)
+                for index in indexes:
+                    editor.add_index(ProductPrice, index)
+        self.analyze()
+        results['after'] = [median_ms(fn, options['repeat']) for _, fn in queries]
+
+        rows = options['products'] * options['rows_per_product']
+        self.stdout.write(f"\n{rows:,} rows, median of {options['repeat']} runs ({connection.vendor})")
+        self.stdout.write(f"{'query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for (label, _), before, after in zip(queries, results['before'], results['after']):
+            self.stdout.write(f"{label:<28}{before:>12.2f}{after:>12.2f}{before / max(after, 0.001):>9.1f}x")
+
+        if not options['keep']:
+            clear_seeded()
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {ProductPrice._meta.db_table}")
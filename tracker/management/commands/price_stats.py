@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tracker import analytics
+from tracker.models import TrackedProduct
+
+COLUMNS = [('count', 'rows', '{:>7}'), ('low', 'low', '{:>11.2f}'), ('p50', 'median', '{:>11.2f}'),
+           ('high', 'high', '{:>11.2f}'), ('last', 'last', '{:>11.2f}'), ('volatility', 'vol %', '{:>8.2%}'),
+           ('drawdown', 'below hi', '{:>10.1%}'), ('drops', 'drops', '{:>7}')]
+
+class Command(BaseCommand):
+    help = 'Prints low / median / high / volatility of every product\'s recent price history, computed in bulk with NumPy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Window of history to summarise; past PRICE_RAW_RETENTION_DAYS it uses the daily rollups')
+        parser.add_argument('--product', type=int, action='append', help='Only this product id (repeatable)')
+        parser.add_argument('--sort', default='volatility', help='Column to sort by, descending')
+        parser.add_argument('--limit', type=int, default=50, help='Rows to print')
+        parser.add_argument('--rolling', type=int, help='Also print the rolling N-day low / median / high '
+                                                       'of daily closes (needs a single --product)')
+
+    def handle(self, *args, **options):
+        ids = options['product']
+        if options['rolling'] and (not ids or len(ids) != 1):
+            raise CommandError("--rolling needs exactly one --product")
+        now = timezone.now()
+        since = now - timedelta(days=options['days'])
+        histories, daily = analytics.load_window(ids, options['days'], now)
+        result = analytics.stats(histories)
+        if options['sort'] not in result:
+            raise CommandError(f"Unknown --sort {options['sort']!r}, choose from {', '.join(result)}")
+
+        names = dict(TrackedProduct.objects.filter(pk__in=histories.ids.tolist()).values_list('pk', 'name'))
+        order = result[options['sort']].argsort()[::-1][:options['limit']]
+        rupees = {'low', 'p50', 'high', 'last'}
+        if daily:
+            self.stdout.write(f"Raw prices are kept {analytics.RAW_RETENTION_DAYS} days, using daily closes from the rollups")
+        kind = 'daily closes' if daily else 'prices'
+        self.stdout.write(f"{len(histories)} products, {len(histories.paise):,} {kind} since {since:%Y-%m-%d %H:%M} UTC\n")
+        self.stdout.write(f"{'product':<32}" + ''.join(f"{label:>{len(fmt.format(0))}}" for _, label, fmt in COLUMNS))
+        for i in order:
+            pid = int(result['product_id'][i])
+            row = ''.join(fmt.format(result[key][i] / 100 if key in rupees else result[key][i]) for key, _, fmt in COLUMNS)
+            self.stdout.write(f"{(str(pid) + ' ' + names.get(pid, ''))[:31]:<32}{row}")
+
+        if options['rolling']:
+            ts, paise = histories.get(ids[0])
+            days = options['rolling']
+            ends, lows = analytics.rolling(ts, paise, days, 'min')
+            _, medians = analytics.rolling(ts, paise, days, 'median')
+            _, highs = analytics.rolling(ts, paise, days, 'max')
+            self.stdout.write(f"\nRolling {days}-day window of daily closes:")
+            self.stdout.write(f"{'day':<12}{'low':>11}{'median':>11}{'high':>11}")
+            for end, low, median, high in zip(ends, lows, medians, highs):
+                day = datetime.fromtimestamp(int(end), dt_timezone.utc)
+                self.stdout.write(f"{day:%Y-%m-%d}  {low / 100:>11.2f}{median / 100:>11.2f}{high / 100:>11.2f}")
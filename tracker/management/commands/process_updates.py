@@ -0,0 +1,35 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from tracker import update_queue
+
+class Command(BaseCommand):
+    help = 'Runs the bot handlers for Telegram updates queued by the webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--prune-days', type=int, default=7, help='Delete finished updates older than this')
+
+    def handle(self, *args, **options):
+        pruned = update_queue.prune(options['prune_days'])
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} finished updates.")
+
+        if options['once']:
+            handled = update_queue.drain()
+            self.stdout.write(f"Processed {handled} updates.")
+            return
+
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write(f"Received signal {signum}, stopping after the current update...")
+            stop.set()
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self.stdout.write("Processing queued updates. Press Ctrl+C to stop.")
+        update_queue.run_worker(stop)
+        self.stdout.write("Update worker stopped.")
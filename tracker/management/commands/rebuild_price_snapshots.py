@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from tracker.price_writer import rebuild_snapshots
+
+class Command(BaseCommand):
+    help = 'Rebuilds the latest/previous/lowest price snapshot on every TrackedProduct from its price history'
+
+    def handle(self, *args, **options):
+        count = rebuild_snapshots()
+        self.stdout.write(f"Rebuilt price snapshots for {count} products.")
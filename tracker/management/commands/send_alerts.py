@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from tracker.alerts import dispatch_pending
+from tracker.models import Alert
+
+class Command(BaseCommand):
+    help = 'Sends pending price-drop alerts from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Send at most this many alerts')
+        parser.add_argument('--api-base', help='Bot API server to use instead of TELEGRAM_API_BASE')
+
+    def handle(self, *args, **options):
+        delivered = dispatch_pending(options['limit'], options['api_base'])
+        pending = Alert.objects.filter(status='pending').count()
+        self.stdout.write(f"Delivered {delivered} alerts, {pending} still pending.")
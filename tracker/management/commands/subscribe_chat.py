@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tracker.models import Subscription, TrackedProduct
+
+class Command(BaseCommand):
+    help = 'Subscribes a chat to every tracked product that has no subscribers (backfill for the 0013 migration)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('chat_id')
+        parser.add_argument('--all', action='store_true', help='Subscribe to every product, not just the orphaned ones')
+
+    def handle(self, *args, **options):
+        products = TrackedProduct.objects.all()
+        if not options['all']:
+            products = products.filter(subscriptions__isnull=True)
+        subscriptions = [
+            Subscription(chat_id=options['chat_id'], product_id=pk, target_price=target)
+            for pk, target in products.values_list('pk', 'target_price')
+        ]
+        Subscription.objects.bulk_create(subscriptions, batch_size=500, ignore_conflicts=True)
+        self.stdout.write(f"Subscribed chat {options['chat_id']} to {len(subscriptions)} products.")
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_productprice_is_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='lite_misses',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='scrape_tier',
+            field=models.CharField(blank=True, choices=[('lite', 'Lite (HTTP)'), ('browser', 'Browser (Selenium)')], default='', max_length=10),
+        ),
+    ]
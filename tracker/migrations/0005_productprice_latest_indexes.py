@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_trackedproduct_scrape_tier'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productprice',
+            index=models.Index(fields=['product', 'is_summary', '-scraped_at'], name='price_product_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productprice',
+            index=models.Index(condition=models.Q(('is_summary', False)), fields=['product', '-scraped_at'], name='price_raw_latest_idx'),
+        ),
+        # Drop the plain FK index only once the composite index that covers it exists
+        migrations.AlterField(
+            model_name='productprice',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='tracker.trackedproduct'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:20
+
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def fill_snapshots(apps, schema_editor):
+    # Same steps as tracker.price_writer.rebuild_snapshots, kept here against the historical models
+    TrackedProduct = apps.get_model('tracker', 'TrackedProduct')
+    ProductPrice = apps.get_model('tracker', 'ProductPrice')
+    raw = ProductPrice.objects.filter(product=OuterRef('pk'), is_summary=False).order_by('-scraped_at')
+    products = list(TrackedProduct.objects.annotate(
+        snap_last=Subquery(raw.values('price')[:1]),
+        snap_previous=Subquery(raw.values('price')[1:2]),
+        snap_at=Subquery(raw.values('scraped_at')[:1]),
+        snap_low=Subquery(
+            ProductPrice.objects.filter(product=OuterRef('pk'))
+            .values('product').annotate(low=Min('price')).values('low')
+        ),
+    ))
+    for p in products:
+        p.last_price = p.snap_last
+        p.previous_price = p.snap_previous
+        p.last_scraped_at = p.snap_at
+        p.lowest_price = p.snap_low
+    TrackedProduct.objects.bulk_update(
+        products, ['last_price', 'previous_price', 'lowest_price', 'last_scraped_at'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_productprice_latest_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='last_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='last_scraped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='lowest_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='previous_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
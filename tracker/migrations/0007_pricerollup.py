@@ -0,0 +1,71 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:23
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def bucket_start(ts, resolution):
+    ts = ts.astimezone(dt_timezone.utc)
+    if resolution == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def backfill_rollups(apps, schema_editor):
+    # Same steps as tracker.rollups.rebuild_rollups, kept here against the historical models
+    TrackedProduct = apps.get_model('tracker', 'TrackedProduct')
+    ProductPrice = apps.get_model('tracker', 'ProductPrice')
+    PriceRollup = apps.get_model('tracker', 'PriceRollup')
+    for product_id in TrackedProduct.objects.values_list('id', flat=True):
+        buckets = {}
+        rows = (ProductPrice.objects.filter(product_id=product_id)
+                .order_by('scraped_at', 'id').values_list('price', 'scraped_at'))
+        for price, scraped_at in rows.iterator(chunk_size=5000):
+            for resolution in ('hour', 'day', 'week'):
+                start = bucket_start(scraped_at, resolution)
+                rollup = buckets.get((resolution, start))
+                if rollup is None:
+                    buckets[(resolution, start)] = PriceRollup(
+                        product_id=product_id, resolution=resolution, bucket_start=start,
+                        open=price, high=price, low=price, close=price, count=1,
+                    )
+                else:
+                    rollup.high = max(rollup.high, price)
+                    rollup.low = min(rollup.low, price)
+                    rollup.close = price
+                    rollup.count += 1
+        PriceRollup.objects.bulk_create(buckets.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_trackedproduct_price_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily'), ('week', 'Weekly')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='tracker.trackedproduct')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pricerollup',
+            constraint=models.UniqueConstraint(fields=('product', 'resolution', 'bucket_start'), name='rollup_bucket_unique'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
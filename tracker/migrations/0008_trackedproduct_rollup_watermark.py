@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:24
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def mark_folded(apps, schema_editor):
+    # 0007 already folded every existing row into the rollups: each watermark is the product's newest row id
+    TrackedProduct = apps.get_model('tracker', 'TrackedProduct')
+    ProductPrice = apps.get_model('tracker', 'ProductPrice')
+    rows = ProductPrice.objects.filter(product=OuterRef('pk'))
+    TrackedProduct.objects.update(rollup_watermark=Coalesce(
+        Subquery(rows.values('product').annotate(last=Max('id')).values('last')), 0,
+    ))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_pricerollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='rollup_watermark',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_folded, migrations.RunPython.noop),
+    ]
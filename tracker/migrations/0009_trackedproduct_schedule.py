@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_trackedproduct_rollup_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='next_scrape_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='scrape_interval',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='volatility',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:32
+
+import re
+from datetime import timedelta, timezone as dt_timezone
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+# Frozen copy of tracker.canonical.product_key (offline, no short-link resolution)
+ASIN_RE = re.compile(r"/(?:dp|gp/product|gp/aw/d|d|product)/([A-Z0-9]{10})(?:[/?]|$)", re.IGNORECASE)
+FLIPKART_ITEM_RE = re.compile(r"/p/(itm[0-9a-z]+)", re.IGNORECASE)
+TRACKING_PARAM_RE = re.compile(r"^(utm_.*|ref.*|tag|linkCode|psc|smid|th|pf_rd_.*|pd_rd_.*|qid|sr|sprefix|crid|dib.*|content-id|affid|affExtParam\d|otracker.*|cmpid|lid|marketplace|store|srno|fm|iid|ppt|ppn|ssid|spm)$", re.IGNORECASE)
+
+
+def product_key(url):
+    url = url.strip()
+    parts = urlsplit(url)
+    hostname = (parts.hostname or "").lower()
+    if "amazon." in hostname:
+        match = ASIN_RE.search(parts.path + "/")
+        if match:
+            return f"amazon:{match.group(1).upper()}"
+    elif "flipkart.com" in hostname and hostname != "dl.flipkart.com":
+        pid = dict(parse_qsl(parts.query)).get("pid")
+        item = FLIPKART_ITEM_RE.search(parts.path)
+        if pid or item:
+            return f"flipkart:{pid.upper()}" if pid else f"flipkart:{item.group(1).lower()}"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAM_RE.match(k)]
+    return "url:" + urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def bucket_start(ts, resolution):
+    ts = ts.astimezone(dt_timezone.utc)
+    if resolution == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def merge(apps, keeper, duplicates):
+    """Moves the duplicates' history onto keeper, rebuilds its snapshot and rollups, deletes them."""
+    TrackedProduct = apps.get_model('tracker', 'TrackedProduct')
+    ProductPrice = apps.get_model('tracker', 'ProductPrice')
+    PriceRollup = apps.get_model('tracker', 'PriceRollup')
+    ids = [p.id for p in duplicates]
+    ProductPrice.objects.filter(product_id__in=ids).update(product_id=keeper.id)
+    PriceRollup.objects.filter(product_id__in=ids + [keeper.id]).delete()
+
+    buckets = {}
+    rows = (ProductPrice.objects.filter(product_id=keeper.id)
+            .order_by('scraped_at', 'id').values_list('price', 'scraped_at'))
+    for price, scraped_at in rows.iterator(chunk_size=5000):
+        for resolution in ('hour', 'day', 'week'):
+            start = bucket_start(scraped_at, resolution)
+            rollup = buckets.get((resolution, start))
+            if rollup is None:
+                buckets[(resolution, start)] = PriceRollup(
+                    product_id=keeper.id, resolution=resolution, bucket_start=start,
+                    open=price, high=price, low=price, close=price, count=1,
+                )
+            else:
+                rollup.high = max(rollup.high, price)
+                rollup.low = min(rollup.low, price)
+                rollup.close = price
+                rollup.count += 1
+    PriceRollup.objects.bulk_create(buckets.values(), batch_size=1000)
+
+    raw = list(ProductPrice.objects.filter(product_id=keeper.id, is_summary=False)
+               .order_by('-scraped_at', '-id').values_list('price', 'scraped_at')[:2])
+    history = ProductPrice.objects.filter(product_id=keeper.id).aggregate(low=Min('price'), last=Max('id'))
+    keeper.last_price, keeper.last_scraped_at = raw[0] if raw else (None, None)
+    keeper.previous_price = raw[1][0] if len(raw) > 1 else None
+    keeper.lowest_price = history['low']
+    keeper.rollup_watermark = history['last'] or 0
+    group = [keeper] + duplicates
+    targets = [p.target_price for p in group if p.target_price is not None]
+    keeper.target_price = max(targets) if targets else None
+    due = [p.next_scrape_at for p in group if p.next_scrape_at is not None]
+    keeper.next_scrape_at = min(due) if due else None
+    keeper.name = keeper.name or next((p.name for p in duplicates if p.name), '')
+    TrackedProduct.objects.filter(id__in=ids).delete()
+    keeper.save()
+
+
+def fill_product_keys(apps, schema_editor):
+    # Offline only: short links keep a url: key until someone pastes them again, then
+    # canonical.get_or_create_product upgrades the row to the resolved key.
+    # Rows that share a key are merged into the oldest one.
+    TrackedProduct = apps.get_model('tracker', 'TrackedProduct')
+    groups = {}
+    for product in TrackedProduct.objects.order_by('id'):
+        groups.setdefault(product_key(product.url), []).append(product)
+    products = []
+    for key, (keeper, *duplicates) in groups.items():
+        keeper.product_key = key
+        if duplicates:
+            print(f"\n  Merging products {', '.join(str(p.id) for p in duplicates)} into {keeper.id} ({key})")
+            merge(apps, keeper, duplicates)
+        else:
+            products.append(keeper)
+    TrackedProduct.objects.bulk_update(products, ['product_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_trackedproduct_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResolvedLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('short_url', models.URLField(max_length=500, unique=True)),
+                ('target_url', models.URLField(max_length=1000)),
+                ('resolved_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trackedproduct',
+            name='product_key',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(fill_product_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def subscribe_default_chat(apps, schema_editor):
+    # Until now every product alerted the single TELEGRAM_CHAT_ID chat
+    import os
+    chat_id = os.getenv('TELEGRAM_CHAT_ID')
+    TrackedProduct = apps.get_model('tracker', 'TrackedProduct')
+    Subscription = apps.get_model('tracker', 'Subscription')
+    if not chat_id:
+        if TrackedProduct.objects.exists():
+            # Carrying on would leave every existing product with no one to alert
+            raise RuntimeError(
+                "TELEGRAM_CHAT_ID must be set to subscribe the existing products to their chat. "
+                "Set it and re-run migrate. Databases that already ran this migration without it "
+                "can be backfilled with 'manage.py subscribe_chat <chat_id>'."
+            )
+        return
+    Subscription.objects.bulk_create([
+        Subscription(chat_id=chat_id, product_id=pk, target_price=target)
+        for pk, target in TrackedProduct.objects.values_list('pk', 'target_price')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0012_alert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=64)),
+                ('target_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='tracker.trackedproduct')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'target_price'], name='subscription_fanout_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('chat_id', 'product'), name='subscription_chat_product_unique'),
+        ),
+        migrations.RunPython(subscribe_default_chat, migrations.RunPython.noop),
+    ]
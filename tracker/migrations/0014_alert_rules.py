@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_subscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='rule',
+            field=models.CharField(choices=[('target', 'Target price reached'), ('percent_drop', 'Percent drop'), ('all_time_low', 'All-time low'), ('n_day_low', 'N-day low')], default='percent_drop', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['product', '-created_at'], name='alert_product_recent_idx'),
+        ),
+        # The new index leads with product, so the plain FK index is redundant
+        migrations.AlterField(
+            model_name='alert',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='tracker.trackedproduct'),
+        ),
+    ]
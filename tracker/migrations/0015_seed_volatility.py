@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-18 14:05
+
+from django.db import migrations
+
+ALPHA = 0.3
+SEED_PRICES = 50
+
+
+def seed_volatility(apps, schema_editor):
+    # Same EWMA as tracker.scheduler.history_volatility, replayed over each product's recent raw
+    # prices, so volatile products don't all start on the slow backoff path at 0
+    TrackedProduct = apps.get_model('tracker', 'TrackedProduct')
+    ProductPrice = apps.get_model('tracker', 'ProductPrice')
+    products = []
+    for product in TrackedProduct.objects.filter(volatility=0):
+        prices = list(ProductPrice.objects.filter(product=product, is_summary=False)
+                      .order_by('-scraped_at', '-id').values_list('price', flat=True)[:SEED_PRICES])[::-1]
+        volatility = 0.0
+        for previous, price in zip(prices, prices[1:]):
+            if previous:
+                volatility = ALPHA * abs(float(price - previous)) / float(previous) + (1 - ALPHA) * volatility
+        if volatility:
+            product.volatility = volatility
+            products.append(product)
+    TrackedProduct.objects.bulk_update(products, ['volatility'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_alert_rules'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_volatility, migrations.RunPython.noop),
+    ]
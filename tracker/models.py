@@ -1,24 +1,196 @@
-from django.db import models
+from django.db import models, transaction
 
 class TrackedProduct(models.Model):
     PLATFORM_CHOICES = [
         ('Amazon', 'Amazon'),
         ('Flipkart', 'Flipkart'),
     ]
+    TIER_CHOICES = [
+        ('lite', 'Lite (HTTP)'),
+        ('browser', 'Browser (Selenium)'),
+    ]
     name = models.CharField(max_length=255)
     url = models.URLField(unique=True)
+    # "amazon:<ASIN>" / "flipkart:<PID>" (see tracker/canonical.py), so every variant of a link maps to one row
+    product_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
     platform = models.CharField(max_length=50, choices=PLATFORM_CHOICES)
     target_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Which fetch tier last produced a price, and how many runs in a row the lite tier missed
+    scrape_tier = models.CharField(max_length=10, choices=TIER_CHOICES, blank=True, default='')
+    lite_misses = models.PositiveIntegerField(default=0)
+    # Denormalized snapshot of the raw price history, kept in step with every ProductPrice write
+    last_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    previous_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    lowest_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_scraped_at = models.DateTimeField(null=True, blank=True)
+    # Highest ProductPrice id already folded into PriceRollup
+    rollup_watermark = models.BigIntegerField(default=0)
+    # Adaptive schedule (see tracker/scheduler.py): when the product is due, the interval that
+    # produced that time in seconds, and an EWMA of its relative price moves
+    next_scrape_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    scrape_interval = models.PositiveIntegerField(default=0)
+    volatility = models.FloatField(default=0)
+
+    SNAPSHOT_FIELDS = ['last_price', 'previous_price', 'lowest_price', 'last_scraped_at']
 
     def __str__(self):
         return f"{self.name} ({self.platform})"
 
+    def apply_price(self, price, scraped_at):
+        """Rolls the in-memory snapshot forward for a newly written price. Caller saves SNAPSHOT_FIELDS."""
+        self.previous_price = self.last_price
+        self.last_price = price
+        self.last_scraped_at = scraped_at
+        if self.lowest_price is None or price < self.lowest_price:
+            self.lowest_price = price
+
+    def sync_target_price(self):
+        """target_price mirrors the highest subscriber target, the first one a falling price reaches."""
+        self.target_price = self.subscriptions.aggregate(target=models.Max('target_price'))['target']
+        self.save(update_fields=['target_price'])
+
+    def record_price(self, price):
+        """Writes one raw ProductPrice row, the snapshot and the rollups in the same transaction."""
+        from tracker.rollups import fold_new_prices
+        with transaction.atomic():
+            row = ProductPrice.objects.create(product=self, price=price)
+            self.apply_price(price, row.scraped_at)
+            self.save(update_fields=self.SNAPSHOT_FIELDS)
+            fold_new_prices([self.pk])
+        return row
+
+class Subscription(models.Model):
+    """A chat tracking a product, optionally only for drops to target_price or below."""
+    chat_id = models.CharField(max_length=64)
+    product = models.ForeignKey(TrackedProduct, on_delete=models.CASCADE, related_name='subscriptions', db_index=False)
+    target_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the index behind /list and /remove for a chat
+            models.UniqueConstraint(fields=['chat_id', 'product'], name='subscription_chat_product_unique'),
+        ]
+        indexes = [
+            # Fan-out: subscribers of product X whose target is at or above the new price
+            models.Index(fields=['product', 'target_price'], name='subscription_fanout_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.chat_id} -> {self.product_id} (target {self.target_price})"
+
 class ProductPrice(models.Model):
-    product = models.ForeignKey(TrackedProduct, on_delete=models.CASCADE, related_name='prices')
+    # No separate FK index: price_product_latest_idx starts with product and covers it
+    product = models.ForeignKey(TrackedProduct, on_delete=models.CASCADE, related_name='prices', db_index=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     scraped_at = models.DateTimeField(auto_now_add=True)
     is_summary = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Latest price per product / aggregation scans: WHERE product AND is_summary ORDER BY scraped_at
+            models.Index(fields=['product', 'is_summary', '-scraped_at'], name='price_product_latest_idx'),
+            # Smaller index for the raw-only lookups the scraper runs every pass
+            models.Index(fields=['product', '-scraped_at'], name='price_raw_latest_idx',
+                         condition=models.Q(is_summary=False)),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - ₹{self.price} at {self.scraped_at} (Summary: {self.is_summary})"
+
+class PriceRollup(models.Model):
+    """Open/high/low/close of a product's prices per hour, day or week, maintained as prices are written."""
+    RESOLUTION_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+        ('week', 'Weekly'),
+    ]
+    product = models.ForeignKey(TrackedProduct, on_delete=models.CASCADE, related_name='rollups', db_index=False)
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for "product X, daily buckets since T" range reads
+            models.UniqueConstraint(fields=['product', 'resolution', 'bucket_start'], name='rollup_bucket_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.resolution} {self.bucket_start}: O{self.open} H{self.high} L{self.low} C{self.close}"
+
+class ResolvedLink(models.Model):
+    """Short or redirecting link (amzn.in, dl.flipkart.com, ...) and the product URL it resolved to."""
+    short_url = models.URLField(max_length=500, unique=True)
+    target_url = models.URLField(max_length=1000)
+    resolved_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.short_url} -> {self.target_url}"
+
+class WebhookUpdate(models.Model):
+    """Telegram update accepted by the webhook and waiting for a worker (see tracker/update_queue.py)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    # Unique so Telegram redeliveries of the same update are stored once
+    update_id = models.BigIntegerField(unique=True)
+    payload = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Workers only ever scan the pending head of the queue
+            models.Index(fields=['id'], name='webhook_pending_idx', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"Update {self.update_id} ({self.status})"
+
+class Alert(models.Model):
+    """Outbox of price-drop messages, written with the price that triggered them and sent by
+    tracker/alerts.py's dispatcher."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    RULE_CHOICES = [
+        ('target', 'Target price reached'),
+        ('percent_drop', 'Percent drop'),
+        ('all_time_low', 'All-time low'),
+        ('n_day_low', 'N-day low'),
+    ]
+    chat_id = models.CharField(max_length=64)
+    product = models.ForeignKey(TrackedProduct, on_delete=models.CASCADE, related_name='alerts', db_index=False)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    previous_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Which tracker/rules.py rule fired; repeats of the same rule are suppressed
+    rule = models.CharField(max_length=20, choices=RULE_CHOICES, default='percent_drop')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['chat_id', 'id'], name='alert_pending_idx', condition=models.Q(status='pending')),
+            # Repeat suppression: recent alerts of the products in a batch
+            models.Index(fields=['product', '-created_at'], name='alert_product_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Alert {self.product_id} -> {self.chat_id}: {self.price} ({self.status})"
@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+
+from django.db import transaction
+from django.db.models import Min, OuterRef, Subquery
+from django.utils import timezone
+
+from tracker.models import TrackedProduct, ProductPrice, Alert
+from tracker.rollups import fold_new_prices
+from tracker.rules import PriceEvent, evaluate
+
+SNAPSHOT_FIELDS = TrackedProduct.SNAPSHOT_FIELDS
+
+def rebuild_snapshots(product_ids=None, batch_size=500):
+    """Recomputes the price snapshot of every product (or only `product_ids`) from its history.
+
+    One annotated SELECT for all products plus one bulk UPDATE per batch.
+    """
+    raw = ProductPrice.objects.filter(product=OuterRef('pk'), is_summary=False).order_by('-scraped_at')
+    products = TrackedProduct.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    products = list(products.annotate(
+        snap_last=Subquery(raw.values('price')[:1]),
+        snap_previous=Subquery(raw.values('price')[1:2]),
+        snap_at=Subquery(raw.values('scraped_at')[:1]),
+        snap_low=Subquery(
+            ProductPrice.objects.filter(product=OuterRef('pk'))
+            .values('product').annotate(low=Min('price')).values('low')
+        ),
+    ))
+    for p in products:
+        p.last_price = p.snap_last
+        p.previous_price = p.snap_previous
+        p.last_scraped_at = p.snap_at
+        p.lowest_price = p.snap_low
+    TrackedProduct.objects.bulk_update(products, SNAPSHOT_FIELDS, batch_size=batch_size)
+    return len(products)
+
+class PriceWriter:
+    """Buffers new ProductPrice rows and TrackedProduct field changes during a scrape pass.
+
+    Everything is written with bulk_create / bulk_update once `batch_size` prices are pending or
+    `interval` seconds have passed, so a pass costs a handful of round-trips instead of ~3 per product.
+    Each flush also runs the alert rules (tracker/rules.py) over its prices and writes the Alert outbox
+    rows they fire. Safe to share between scraper threads.
+    """
+
+    def __init__(self, batch_size=None, interval=None):
+        self.batch_size = batch_size or int(os.getenv('SCRAPER_FLUSH_SIZE', 50))
+        self.interval = interval or float(os.getenv('SCRAPER_FLUSH_SECONDS', 30))
+        self.lock = threading.Lock()
+        self.prices = []
+        self.events = []
+        self.products = {}
+        self.fields = set()
+        self.last_flush = time.monotonic()
+        self.flushes = 0
+
+    def add_price(self, product, price):
+        """Queues a raw price row and rolls the product's snapshot forward with it."""
+        with self.lock:
+            self.prices.append(ProductPrice(product=product, price=price))
+            self.events.append(PriceEvent(product, price, product.last_price, product.lowest_price))
+            product.apply_price(price, timezone.now())
+            self.products[product.pk] = product
+            self.fields.update(SNAPSHOT_FIELDS)
+        self.maybe_flush()
+
+    def update_product(self, product, fields):
+        with self.lock:
+            self.products[product.pk] = product
+            self.fields.update(fields)
+
+    def maybe_flush(self):
+        with self.lock:
+            due = len(self.prices) >= self.batch_size or time.monotonic() - self.last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            prices, self.prices = self.prices, []
+            events, self.events = self.events, []
+            products, self.products = list(self.products.values()), {}
+            fields, self.fields = sorted(self.fields), set()
+            self.last_flush = time.monotonic()
+
+            if not prices and not products:
+                return
+            try:
+                alerts = self._write(prices, events, products, fields)
+            except Exception as e:
+                print(f"Failed to flush {len(prices)} prices / {len(products)} product updates: {e}")
+                # A product deleted mid-pass (bot /remove) fails the whole batch on its foreign key.
+                # Drop that product's rows and try once more; anything else goes back in the buffer.
+                live = self._live_ids(products, prices)
+                if live is None or (all(p.pk in live for p in products) and all(r.product_id in live for r in prices)):
+                    self._requeue(prices, events, products, fields)
+                    raise
+                prices = [r for r in prices if r.product_id in live]
+                events = [ev for ev in events if ev.product.pk in live]
+                products = [p for p in products if p.pk in live]
+                print(f"Dropped rows of deleted products, retrying with {len(prices)} prices.")
+                try:
+                    alerts = self._write(prices, events, products, fields)
+                except Exception:
+                    self._requeue(prices, events, products, fields)
+                    raise
+            self.flushes += 1
+            print(f"Flushed {len(prices)} prices, {len(products)} product updates and {len(alerts)} alerts.")
+
+    def _write(self, prices, events, products, fields):
+        """Writes one batch in a single transaction and returns the alerts it created."""
+        # Price rows, snapshots, rollups and the alerts they fired commit together
+        with transaction.atomic():
+            # Rules compare against the lows from before this batch, so evaluate before folding
+            alerts = evaluate(events)
+            if prices:
+                ProductPrice.objects.bulk_create(prices, batch_size=self.batch_size)
+                # bulk_create filled in scraped_at, use the stored value for the snapshot
+                for row in prices:
+                    row.product.last_scraped_at = row.scraped_at
+                fold_new_prices({row.product_id for row in prices})
+            if products and fields:
+                TrackedProduct.objects.bulk_update(products, fields, batch_size=self.batch_size)
+            if alerts:
+                Alert.objects.bulk_create(alerts, batch_size=self.batch_size)
+        return alerts
+
+    def _live_ids(self, products, prices):
+        """Ids of the batch's products that still exist, or None if the database can't be asked."""
+        ids = {p.pk for p in products} | {r.product_id for r in prices}
+        try:
+            return set(TrackedProduct.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        except Exception:
+            return None
+
+    def _requeue(self, prices, events, products, fields):
+        """Puts a failed batch back in front of whatever was buffered since, for the next flush."""
+        for row in prices:
+            # Postgres may have handed out ids inside the rolled-back transaction
+            row.pk = None
+        self.prices = prices + self.prices
+        self.events = events + self.events
+        pending = {p.pk: p for p in products}
+        pending.update(self.products)
+        self.products = pending
+        self.fields.update(fields)
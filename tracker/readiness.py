@@ -0,0 +1,114 @@
+"""Event-driven page readiness for the Selenium tier, failure-typed retry backoff, and page latency stats.
+
+wait_for_page() returns as soon as the spec's title / price nodes exist, or as soon as the page is
+recognisably a bot check or a "Continue shopping" interstitial, instead of waiting on `body`.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+READY = "ready"
+BOT_CHECK = "bot_check"
+INTERSTITIAL = "interstitial"
+TIMEOUT = "timeout"
+NOT_FOUND = "not_found"
+ERROR = "error"
+
+READY_TIMEOUT = float(os.getenv('DRIVER_READY_TIMEOUT', 20))
+POLL_INTERVAL = 0.25
+
+# Base retry delay per failure type, doubled per attempt. None means don't retry in this pass:
+# reloading a CAPTCHA page only burns the IP further.
+RETRY_BACKOFF = {
+    TIMEOUT: 1,
+    NOT_FOUND: 0.5,
+    ERROR: 3,
+    BOT_CHECK: None,
+}
+
+_PAGE_TEXT_JS = "return document.title + '\\n' + (document.body ? document.body.innerText.slice(0, 3000) : '');"
+
+def page_state(driver, spec):
+    """One poll: READY, INTERSTITIAL, BOT_CHECK, or None while the page is still loading."""
+    from selenium.webdriver.common.by import By
+    if driver.find_elements(By.CSS_SELECTOR, spec.wait_selector):
+        return READY
+    if spec.continue_xpath and driver.find_elements(By.XPATH, spec.continue_xpath):
+        return INTERSTITIAL
+    if spec.has_bot_check_marker(driver.execute_script(_PAGE_TEXT_JS) or ""):
+        return BOT_CHECK
+    return None
+
+def wait_for_page(driver, spec, timeout=None):
+    """Polls page_state() every POLL_INTERVAL until it settles; TIMEOUT after `timeout` seconds."""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    try:
+        return WebDriverWait(driver, timeout or READY_TIMEOUT, poll_frequency=POLL_INTERVAL).until(
+            lambda d: page_state(d, spec)
+        )
+    except TimeoutException:
+        return TIMEOUT
+
+def retry_delay(failure, attempt):
+    """Seconds to wait before retry number `attempt` (0-based) after `failure`; None to give up."""
+    base = RETRY_BACKOFF.get(failure, RETRY_BACKOFF[ERROR])
+    if base is None:
+        return None
+    return base * (2 ** attempt) * random.uniform(0.8, 1.2)
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class LatencyRecorder:
+    """Per-platform page timings and outcomes, for tuning DRIVER_READY_TIMEOUT from data.
+
+    With SCRAPER_LATENCY_LOG set, every page is also appended to that file as one JSON line.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path if log_path is not None else os.getenv('SCRAPER_LATENCY_LOG')
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.outcomes = {}
+
+    def record(self, platform, outcome, seconds, url=None):
+        with self.lock:
+            self.timings.setdefault(platform, []).append(seconds)
+            counts = self.outcomes.setdefault(platform, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps({"at": time.time(), "platform": platform, "outcome": outcome,
+                                        "seconds": round(seconds, 3), "url": url}) + "\n")
+
+    def summary(self):
+        """{platform: {"count", "p50", "p90", "p99", "max", "outcomes"}}"""
+        with self.lock:
+            result = {}
+            for platform, values in self.timings.items():
+                values = sorted(values)
+                result[platform] = {
+                    "count": len(values),
+                    "p50": _percentile(values, 50),
+                    "p90": _percentile(values, 90),
+                    "p99": _percentile(values, 99),
+                    "max": values[-1],
+                    "outcomes": dict(self.outcomes[platform]),
+                }
+            return result
+
+    def report(self):
+        for platform, stats in sorted(self.summary().items()):
+            outcomes = ", ".join(f"{k} {v}" for k, v in sorted(stats["outcomes"].items()))
+            print(f"{platform} page latency over {stats['count']} pages: p50 {stats['p50']:.1f}s, "
+                  f"p90 {stats['p90']:.1f}s, p99 {stats['p99']:.1f}s, max {stats['max']:.1f}s ({outcomes})")
+
+    def reset(self):
+        with self.lock:
+            self.timings, self.outcomes = {}, {}
+
+latency = LatencyRecorder()
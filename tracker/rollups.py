@@ -0,0 +1,156 @@
+"""Hourly / daily / weekly OHLC rollups of ProductPrice, so lows and charts never scan raw history."""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import F, Min
+
+from tracker.models import TrackedProduct, ProductPrice, PriceRollup
+
+RESOLUTIONS = ('hour', 'day', 'week')
+ROLLUP_FIELDS = ['high', 'low', 'close', 'count']
+
+def bucket_start(ts, resolution):
+    """Start of the UTC hour / day / week (Monday) that `ts` falls in."""
+    ts = ts.astimezone(dt_timezone.utc)
+    if resolution == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return day
+    return day - timedelta(days=day.weekday())
+
+def _fold(rollup, price):
+    # Prices are folded in time order, so the newest one is always the close
+    rollup.high = max(rollup.high, price)
+    rollup.low = min(rollup.low, price)
+    rollup.close = price
+    rollup.count += 1
+
+def _fold_into(buckets, product_id, price, scraped_at):
+    """Folds one price into `buckets` ({key: rollup}); returns the keys it touched."""
+    keys = []
+    for resolution in RESOLUTIONS:
+        key = (product_id, resolution, bucket_start(scraped_at, resolution))
+        rollup = buckets.get(key)
+        if rollup is None:
+            buckets[key] = PriceRollup(product_id=product_id, resolution=resolution, bucket_start=key[2],
+                                       open=price, high=price, low=price, close=price, count=1)
+        else:
+            _fold(rollup, price)
+        keys.append(key)
+    return keys
+
+def apply_prices(entries):
+    """Folds freshly written (product_id, price, scraped_at) entries into the rollups.
+
+    One SELECT for the touched buckets, then one bulk_create and one bulk_update. Call it in the
+    same transaction as the ProductPrice insert.
+    """
+    if not entries:
+        return
+    entries = sorted(entries, key=lambda e: e[2])
+    keys = {(pid, res, bucket_start(ts, res)) for pid, _, ts in entries for res in RESOLUTIONS}
+    existing = {
+        (r.product_id, r.resolution, r.bucket_start): r
+        for r in PriceRollup.objects.filter(
+            product_id__in={k[0] for k in keys}, bucket_start__in={k[2] for k in keys}
+        )
+    }
+    buckets = dict(existing)
+    touched = set()
+    for product_id, price, scraped_at in entries:
+        touched.update(_fold_into(buckets, product_id, price, scraped_at))
+
+    PriceRollup.objects.bulk_create([r for k, r in buckets.items() if k not in existing])
+    changed = [existing[k] for k in touched if k in existing]
+    if changed:
+        PriceRollup.objects.bulk_update(changed, ROLLUP_FIELDS)
+
+def fold_new_prices(product_ids=None, limit=None):
+    """Folds every ProductPrice row past its product's rollup_watermark into the rollups.
+
+    Rows are taken in id order, at most `limit` of them, and each product's watermark moves to the
+    last id folded, so calling it again picks up exactly where it stopped. Call it inside a
+    transaction so the rollups and the watermarks commit together. Returns the number of rows folded.
+
+    The scraper, the bot and aggregate_prices all fold, so the product rows are locked (in id order)
+    before their watermarks are read: a concurrent fold of the same product waits and then sees the
+    moved watermark, instead of folding the same rows twice or colliding on a bucket.
+    """
+    products = TrackedProduct.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    watermarks = list(products.select_for_update().order_by('pk').values_list('rollup_watermark', flat=True))
+    if not watermarks:
+        return 0
+    # The lowest watermark bounds the scan to a primary key range, so the cost follows new rows only
+    floor = min(watermarks)
+    rows = (ProductPrice.objects
+            .filter(id__gt=floor, product__in=products)
+            .filter(id__gt=F('product__rollup_watermark'))
+            .order_by('id').values_list('id', 'product_id', 'price', 'scraped_at'))
+    if limit:
+        rows = rows[:limit]
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    apply_prices([(product_id, price, scraped_at) for _, product_id, price, scraped_at in rows])
+    watermarks = {product_id: row_id for row_id, product_id, _, _ in rows}
+    TrackedProduct.objects.bulk_update(
+        [TrackedProduct(pk=product_id, rollup_watermark=row_id) for product_id, row_id in watermarks.items()],
+        ['rollup_watermark'], batch_size=1000,
+    )
+    return len(rows)
+
+def rewind_rollups(since):
+    """Rebuilds the rollups from the week containing `since` onwards from the raw rows still stored.
+
+    Pending rows are folded first, so afterwards every stored row is in the rollups exactly once and
+    the watermarks stay where they are. Rows are picked by scraped_at, not by id: legacy summary rows
+    have high ids but old timestamps. Call it inside a transaction.
+    """
+    start = bucket_start(since, 'week')
+    # Hold every product row so no scraper fold lands between the delete and the rebuild
+    list(TrackedProduct.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+    while fold_new_prices(limit=5000):
+        pass
+    PriceRollup.objects.filter(bucket_start__gte=start).delete()
+    rebuild_rollups(since=start)
+    return start
+
+def rebuild_rollups(product_ids=None, since=None, batch_size=1000):
+    """Recomputes rollups from the stored price history, one product at a time, for all of it or
+    from the week containing `since` onwards. Doesn't touch the watermarks.
+
+    Legacy is_summary rows count as a single observation at their average price.
+    """
+    start = bucket_start(since, 'week') if since else None
+    if product_ids is None:
+        product_ids = list(TrackedProduct.objects.values_list('id', flat=True))
+    total = 0
+    for product_id in product_ids:
+        buckets = {}
+        rows = ProductPrice.objects.filter(product_id=product_id)
+        stale = PriceRollup.objects.filter(product_id=product_id)
+        if start is not None:
+            rows = rows.filter(scraped_at__gte=start)
+            stale = stale.filter(bucket_start__gte=start)
+        for price, scraped_at in rows.order_by('scraped_at', 'id').values_list('price', 'scraped_at').iterator(chunk_size=5000):
+            _fold_into(buckets, product_id, price, scraped_at)
+        stale.delete()
+        PriceRollup.objects.bulk_create(buckets.values(), batch_size=batch_size)
+        total += len(buckets)
+    return total
+
+def lowest_since(product_ids, since):
+    """{product_id: lowest price since `since`} from daily rollups, one query for all products."""
+    rows = (PriceRollup.objects
+            .filter(product_id__in=product_ids, resolution='day', bucket_start__gte=bucket_start(since, 'day'))
+            .values('product_id').annotate(low=Min('low')))
+    return {r['product_id']: r['low'] for r in rows}
+
+def series(product_id, since, resolution='day'):
+    """A product's rollups from `since` onwards, oldest first."""
+    return list(PriceRollup.objects
+                .filter(product_id=product_id, resolution=resolution, bucket_start__gte=bucket_start(since, resolution))
+                .order_by('bucket_start'))
@@ -0,0 +1,91 @@
+"""Alert rules, evaluated once per PriceWriter batch instead of ad hoc per product.
+
+Every new price is checked against the lows and thresholds that held before the batch:
+
+    target        the subscriber's target_price is reached
+    percent_drop  the price fell at least ALERT_DROP_PERCENT below the previous one
+    all_time_low  lower than anything recorded for the product
+    n_day_low     lower than anything in the last ALERT_LOW_DAYS days (daily rollups)
+
+A subscriber with a target only hears about prices at or below it. Each subscriber gets one alert
+per new price, for the first rule in RULE_PRIORITY that fired and isn't suppressed. A rule is
+suppressed while the same (chat, product, rule) already alerted at this price or lower within
+ALERT_SUPPRESS_DAYS. The whole batch costs three queries, however many products it holds.
+"""
+import operator
+import os
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from tracker.models import Alert, Subscription
+from tracker.rollups import lowest_since
+
+DROP_PERCENT = Decimal(os.getenv('ALERT_DROP_PERCENT', '5'))
+LOW_DAYS = int(os.getenv('ALERT_LOW_DAYS', 30))
+SUPPRESS_DAYS = float(os.getenv('ALERT_SUPPRESS_DAYS', 7))
+RULE_PRIORITY = ('target', 'all_time_low', 'n_day_low', 'percent_drop')
+ENABLED_RULES = {r.strip() for r in os.getenv('ALERT_RULES', ','.join(RULE_PRIORITY)).split(',') if r.strip()}
+
+# One new price, with the product's previous price and all-time low from before it was applied
+PriceEvent = namedtuple('PriceEvent', ['product', 'price', 'previous_price', 'previous_low'])
+
+def fired_rules(event, n_day_low, target):
+    """Rules this price meets for one subscriber, in priority order."""
+    price, previous = event.price, event.previous_price
+    if target is not None and price > target:
+        return []
+    fired = {
+        'all_time_low': event.previous_low is not None and price < event.previous_low,
+        'n_day_low': n_day_low is not None and price < n_day_low,
+        'target': target is not None,
+        'percent_drop': bool(previous) and (previous - price) * 100 >= previous * DROP_PERCENT,
+    }
+    return [rule for rule in RULE_PRIORITY if rule in ENABLED_RULES and fired[rule]]
+
+def evaluate(events, now=None):
+    """Unsaved Alert rows for a batch of PriceEvents. Call before the batch's prices are folded
+    into the rollups, so the N-day lows don't already include them."""
+    events = [e for e in events if e.previous_price is not None]
+    if not events:
+        return []
+    now = now or timezone.now()
+    product_ids = {e.product.pk for e in events}
+
+    # Precomputed lows, subscribers and recent alerts for every product in the batch
+    n_day_lows = lowest_since(product_ids, now - timedelta(days=LOW_DAYS)) if 'n_day_low' in ENABLED_RULES else {}
+    # Only subscribers the batch's lowest price can reach, one (product, target_price) index range each
+    lowest = {}
+    for e in events:
+        lowest[e.product.pk] = min(e.price, lowest.get(e.product.pk, e.price))
+    reachable = reduce(operator.or_, (
+        Q(product_id=pid) & (Q(target_price__isnull=True) | Q(target_price__gte=price))
+        for pid, price in lowest.items()
+    ))
+    subscribers = {}
+    for chat_id, product_id, target in (Subscription.objects.filter(reachable)
+                                        .values_list('chat_id', 'product_id', 'target_price')):
+        subscribers.setdefault(product_id, []).append((chat_id, target))
+    last_alerted = {
+        (row['chat_id'], row['product_id'], row['rule']): row['low']
+        for row in (Alert.objects.filter(product_id__in=product_ids, created_at__gte=now - timedelta(days=SUPPRESS_DAYS))
+                    .values('chat_id', 'product_id', 'rule').annotate(low=Min('price')))
+    }
+
+    alerts = []
+    for event in events:
+        pid = event.product.pk
+        for chat_id, target in subscribers.get(pid, ()):
+            for rule in fired_rules(event, n_day_lows.get(pid), target):
+                key = (chat_id, pid, rule)
+                if key in last_alerted and last_alerted[key] <= event.price:
+                    continue
+                last_alerted[key] = event.price
+                alerts.append(Alert(product=event.product, chat_id=chat_id, price=event.price,
+                                    previous_price=event.previous_price, rule=rule))
+                break
+    return alerts
@@ -0,0 +1,93 @@
+"""Adaptive scrape scheduling: volatile products and products near their target are scraped every
+tick, stable ones back off towards SCHEDULE_MAX_HOURS."""
+import heapq
+import os
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils import timezone
+
+from tracker.models import TrackedProduct
+
+MIN_INTERVAL = timedelta(hours=float(os.getenv('SCHEDULE_MIN_HOURS', 2)))
+MAX_INTERVAL = timedelta(hours=float(os.getenv('SCHEDULE_MAX_HOURS', 48)))
+BACKOFF = float(os.getenv('SCHEDULE_BACKOFF', 2))
+# Within this fraction above target_price a product is always scraped at the minimum interval
+NEAR_TARGET = Decimal(os.getenv('SCHEDULE_NEAR_TARGET', '0.05'))
+# Products with an average relative move above this never back off past VOLATILE_CAP
+VOLATILE_THRESHOLD = float(os.getenv('SCHEDULE_VOLATILE', 0.01))
+VOLATILE_CAP = MIN_INTERVAL * 4
+# Weight of the newest observation in the volatility EWMA
+VOLATILITY_ALPHA = 0.3
+# Raw prices a never-scheduled product's volatility is seeded from
+VOLATILITY_SEED_PRICES = 50
+# Due times this close to now count as due, so a product isn't pushed a whole cron tick late
+LOOKAHEAD = timedelta(minutes=float(os.getenv('SCHEDULE_LOOKAHEAD_MINUTES', 15)))
+
+SCHEDULE_FIELDS = ['next_scrape_at', 'scrape_interval', 'volatility']
+
+def near_target(product, price=None):
+    price = price if price is not None else product.last_price
+    if not product.target_price or price is None:
+        return False
+    return price <= product.target_price * (1 + NEAR_TARGET)
+
+def history_volatility(prices):
+    """The volatility EWMA replayed over a list of prices, oldest first."""
+    volatility = 0.0
+    for previous, price in zip(prices, prices[1:]):
+        if previous:
+            volatility = VOLATILITY_ALPHA * abs(float(price - previous)) / float(previous) + (1 - VOLATILITY_ALPHA) * volatility
+    return volatility
+
+def seed_volatility(product):
+    """Starts a never-scheduled product's volatility from its recent raw prices instead of 0."""
+    prices = list(product.prices.filter(is_summary=False).order_by('-scraped_at', '-id')
+                  .values_list('price', flat=True)[:VOLATILITY_SEED_PRICES])
+    product.volatility = history_volatility(prices[::-1])
+
+def next_interval(product, price, last_price):
+    """Picks the next scrape interval from the price move and updates product.volatility in memory."""
+    current = timedelta(seconds=product.scrape_interval) if product.scrape_interval else MIN_INTERVAL
+    if price is None:
+        # Failed scrape: retry next tick without touching the volatility estimate
+        return MIN_INTERVAL
+    if not product.scrape_interval and not product.volatility and product.pk:
+        seed_volatility(product)
+    if last_price is None:
+        # First price: nothing to compare with yet, look again next tick
+        return MIN_INTERVAL
+    if last_price:
+        change = abs(float(price - last_price)) / float(last_price)
+        product.volatility = VOLATILITY_ALPHA * change + (1 - VOLATILITY_ALPHA) * product.volatility
+    if near_target(product, price) or (last_price and price != last_price):
+        return MIN_INTERVAL
+    interval = min(current * BACKOFF, MAX_INTERVAL)
+    if product.volatility > VOLATILE_THRESHOLD:
+        interval = min(interval, VOLATILE_CAP)
+    return max(interval, MIN_INTERVAL)
+
+def reschedule(product, price, last_price, now=None):
+    """Sets next_scrape_at / scrape_interval / volatility in memory. Caller saves SCHEDULE_FIELDS."""
+    interval = next_interval(product, price, last_price)
+    product.scrape_interval = int(interval.total_seconds())
+    product.next_scrape_at = (now or timezone.now()) + interval
+    return interval
+
+def priority(product):
+    """Heap key: never-scraped and near-target products first, then the most overdue."""
+    urgent = product.next_scrape_at is None or near_target(product)
+    due = product.next_scrape_at.timestamp() if product.next_scrape_at else 0
+    return (0 if urgent else 1, due, product.pk)
+
+def due_products(limit=None, now=None):
+    """Products due by now (+LOOKAHEAD), most urgent first, at most `limit` of them."""
+    cutoff = (now or timezone.now()) + LOOKAHEAD
+    products = TrackedProduct.objects.filter(Q(next_scrape_at__isnull=True) | Q(next_scrape_at__lte=cutoff))
+    heap = [(priority(p), p) for p in products]
+    heapq.heapify(heap)
+    due = []
+    while heap and (limit is None or len(due) < limit):
+        due.append(heapq.heappop(heap)[1])
+    return due
@@ -1,3 +1,1228 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.db.models import Sum, Value
+from django.db.models.functions import Concat
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+import track_prices
+from tracker import (analytics, bot_logic, canonical, charts, extraction, http_cache, readiness, rollups, scheduler,
+                     update_queue)
+from tracker.alerts import AlertDispatcher, RateLimiter, DIGEST_THRESHOLD
+from tracker.drivers import DriverPool
+from tracker.fetcher import AsyncFetcher
+from tracker.management.commands.aggregate_prices import Command as AggregatePricesCommand
+from tracker.management.commands.bench_alerts import start_fake_bot_api
+from tracker.models import (Alert, PriceRollup, ProductPrice, ResolvedLink, Subscription, TrackedProduct,
+                            WebhookUpdate)
+from tracker.price_writer import PriceWriter
+from tracker.rules import PriceEvent, SUPPRESS_DAYS, evaluate
+
+def start_stub_site(routes):
+    """Local HTTP server answering GET `path` with routes[path](handler) -> (status, headers, body).
+    Records every request and the highest number served at once."""
+    state = {'requests': [], 'active': 0, 'peak': 0, 'lock': threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with state['lock']:
+                state['requests'].append((self.path, dict(self.headers)))
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            try:
+                status, headers, body = routes[self.path](self)
+            finally:
+                with state['lock']:
+                    state['active'] -= 1
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    # Clients hang up early on purpose (capped bodies), that's not worth a traceback
+    server.handle_error = lambda request, client_address: None
+    server.state = state
+    server.base = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class AsyncFetcherTests(SimpleTestCase):
+    def setUp(self):
+        def page(handler):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, b''
+            return 200, {'Content-Type': 'text/html; charset=utf-8', 'ETag': '"v1"'}, "<h1>₹1,299</h1>".encode()
+
+        def slow(handler):
+            time.sleep(0.1)
+            return 200, {}, b'ok'
+
+        self.server = start_stub_site({
+            '/page': page,
+            '/moved': lambda h: (302, {'Location': '/page'}, b''),
+            '/big': lambda h: (200, {}, b'x' * 300_000),
+            '/slow': slow,
+            '/missing': lambda h: (404, {}, b'not found'),
+            '/badcharset': lambda h: (200, {'Content-Type': 'text/html; charset=utf8mb4'}, "<h1>₹999</h1>".encode()),
+        })
+        self.addCleanup(self.server.shutdown)
+
+    def run_fetcher(self, call, **kwargs):
+        async def go():
+            fetcher = AsyncFetcher(**kwargs)
+            try:
+                return await call(fetcher)
+            finally:
+                await fetcher.close()
+        return asyncio.run(go())
+
+    def test_fetch_returns_body_and_validators(self):
+        result = self.run_fetcher(lambda f: f.fetch(f"{self.server.base}/page"))
+        self.assertEqual(result.status, 200)
+        self.assertEqual(result.text, "<h1>₹1,299</h1>")
+        self.assertEqual(result.headers, {'ETag': '"v1"'})
+        self.assertIsNone(result.error)
+
+    def test_unknown_charset_falls_back_to_utf8(self):
+        result = self.run_fetcher(lambda f: f.fetch(f"{self.server.base}/badcharset"))
+        self.assertEqual((result.status, result.text, result.error), (200, "<h1>₹999</h1>", None))
+
+    def test_conditional_request_gets_304(self):
+        result = self.run_fetcher(lambda f: f.fetch(f"{self.server.base}/page", headers={'If-None-Match': '"v1"'}))
+        self.assertEqual(result.status, 304)
+        self.assertEqual(result.text, '')
+
+    def test_follows_redirects(self):
+        result = self.run_fetcher(lambda f: f.fetch(f"{self.server.base}/moved"))
+        self.assertEqual(result.status, 200)
+        self.assertEqual(result.final_url, f"{self.server.base}/page")
+
+    def test_body_is_capped(self):
+        result = self.run_fetcher(lambda f: f.fetch(f"{self.server.base}/big"), max_bytes=100_000)
+        self.assertGreaterEqual(len(result.text), 100_000)
+        self.assertLess(len(result.text), 300_000)
+
+    def test_http_errors_are_results(self):
+        result = self.run_fetcher(lambda f: f.fetch(f"{self.server.base}/missing"))
+        self.assertEqual((result.status, result.text, result.error), (404, 'not found', None))
+
+    def test_connection_errors_are_results(self):
+        port = self.server.server_address[1]
+        self.server.shutdown()
+        self.server.server_close()
+        result = self.run_fetcher(lambda f: f.fetch(f"http://127.0.0.1:{port}/page"), timeout=2)
+        self.assertIsNone(result.status)
+        self.assertTrue(result.error)
+
+    def test_fetch_many_keeps_order_and_caps_per_host(self):
+        urls = [f"{self.server.base}/slow"] * 6 + [f"{self.server.base}/page"]
+        results = self.run_fetcher(lambda f: f.fetch_many(urls), per_host_limit=2)
+        self.assertEqual([r.url for r in results], urls)
+        self.assertEqual([r.text for r in results[:6]], ['ok'] * 6)
+        self.assertEqual(self.server.state['peak'], 2)
+
+    def test_fetch_many_honours_delays_and_headers(self):
+        urls = [f"{self.server.base}/page"] * 2
+        started = time.monotonic()
+        results = self.run_fetcher(lambda f: f.fetch_many(urls, headers=[None, {'If-None-Match': '"v1"'}],
+                                                          delays=[0, 0.3]))
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual([r.status for r in results], [200, 304])
+
+class AlertDispatcherTests(TestCase):
+    def setUp(self):
+        self.products = [TrackedProduct.objects.create(name=f"Product {i}", url=f"https://www.amazon.in/dp/B0TEST000{i}",
+                                                       platform='Amazon') for i in range(DIGEST_THRESHOLD + 1)]
+
+    def start_api(self, chat_interval, retry_after=1):
+        server = start_fake_bot_api(chat_interval=chat_interval, latency=0, retry_after=retry_after)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def queue(self, chat_id, count):
+        return Alert.objects.bulk_create([
+            Alert(product=product, chat_id=chat_id, price=Decimal(900), previous_price=Decimal(1000), rule='percent_drop')
+            for product in self.products[:count]
+        ])
+
+    def dispatch(self, server, limiter):
+        dispatcher = AlertDispatcher(token="TOKEN", base=f"http://127.0.0.1:{server.server_address[1]}", limiter=limiter)
+        self.addCleanup(dispatcher.close)
+        return dispatcher, dispatcher.dispatch()
+
+    def test_429_waits_retry_after_and_resends(self):
+        # No pacing on our side, so the second message to the chat is rejected with retry_after=1
+        server = self.start_api(chat_interval=0.5)
+        self.queue('100', 2)
+        started = time.monotonic()
+        dispatcher, delivered = self.dispatch(server, RateLimiter(chat_interval=0))
+        self.assertEqual(delivered, 2)
+        self.assertGreaterEqual(server.state['rejected'], 1)
+        self.assertGreaterEqual(dispatcher.stats['rate_limited'], 1)
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+        self.assertEqual(len(server.state['messages']), 2)
+        self.assertFalse(Alert.objects.exclude(status='sent').exists())
+
+    def test_flood_wait_leaves_the_chat_for_the_next_run(self):
+        server = self.start_api(chat_interval=3600, retry_after=3600)
+        self.queue('100', 3)
+        self.queue('200', 1)
+        started = time.monotonic()
+        dispatcher, delivered = self.dispatch(server, RateLimiter(chat_interval=0))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(delivered, 2)
+        self.assertEqual(dispatcher.backed_off, {'100'})
+        # The rejected alert and the one queued behind it stay pending, with no attempt used up
+        pending = Alert.objects.filter(status='pending').order_by('id')
+        self.assertEqual([(a.chat_id, a.attempts) for a in pending], [('100', 0), ('100', 0)])
+        self.assertIn("retry after 3600", pending[0].error)
+
+    def test_repeated_429s_give_up_after_the_budget(self):
+        server = self.start_api(chat_interval=3600, retry_after=1)
+        self.queue('100', 2)
+        with mock.patch('tracker.alerts.RATE_LIMIT_RETRIES', 1):
+            dispatcher, delivered = self.dispatch(server, RateLimiter(chat_interval=0))
+        self.assertEqual(delivered, 1)
+        self.assertEqual(server.state['rejected'], 2)
+        self.assertEqual(Alert.objects.filter(status='pending').count(), 1)
+
+    def test_many_alerts_for_one_chat_become_a_digest(self):
+        server = self.start_api(chat_interval=0)
+        self.queue('100', DIGEST_THRESHOLD + 1)
+        self.queue('200', 1)
+        dispatcher, delivered = self.dispatch(server, RateLimiter(chat_interval=0))
+        self.assertEqual(delivered, DIGEST_THRESHOLD + 2)
+        texts = {m['chat_id']: m['text'] for m in server.state['messages']}
+        self.assertEqual(len(server.state['messages']), 2)
+        self.assertIn(f"{DIGEST_THRESHOLD + 1} PRICE DROPS", texts['100'])
+        self.assertTrue(all(f"Product {i}" in texts['100'] for i in range(DIGEST_THRESHOLD + 1)))
+        self.assertIn("PRICE DROP DETECTED", texts['200'])
+        self.assertEqual(dispatcher.stats['digests'], 1)
+
+    def test_per_chat_pacing_avoids_429(self):
+        server = self.start_api(chat_interval=0.3)
+        self.queue('100', 2)
+        self.queue('200', 2)
+        dispatcher, delivered = self.dispatch(server, RateLimiter(chat_interval=0.35))
+        self.assertEqual(delivered, 4)
+        self.assertEqual(server.state['rejected'], 0)
+        self.assertEqual(dispatcher.stats['rate_limited'], 0)
+        # Round-robin: the other chat's first message doesn't wait behind this chat's second
+        self.assertEqual([m['chat_id'] for m in server.state['messages']], ['100', '200', '100', '200'])
+
+    def test_failed_sends_stay_pending(self):
+        dispatcher = AlertDispatcher(token="TOKEN", base="http://127.0.0.1:9", limiter=RateLimiter(chat_interval=0))
+        self.addCleanup(dispatcher.close)
+        dispatcher.send_message = lambda chat_id, text: (False, False, 'Bad Gateway')
+        self.queue('100', 1)
+        self.assertEqual(dispatcher.dispatch(), 0)
+        alert = Alert.objects.get()
+        self.assertEqual((alert.status, alert.attempts, alert.error), ('pending', 1, 'Bad Gateway'))
+
+class RateLimiterTests(SimpleTestCase):
+    def test_spaces_messages_per_chat_only(self):
+        limiter = RateLimiter(global_rate=1000, chat_interval=0.2)
+        started = time.monotonic()
+        limiter.wait('a')
+        limiter.wait('b')
+        self.assertLess(time.monotonic() - started, 0.1)
+        limiter.wait('a')
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_defer_pushes_the_chat_back(self):
+        limiter = RateLimiter(global_rate=1000, chat_interval=0)
+        limiter.defer('a', 0.2)
+        started = time.monotonic()
+        limiter.wait('a')
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+class PriceWriterTests(TransactionTestCase):
+    # Transactional: SQLite only checks foreign keys when the outermost transaction commits
+
+    def setUp(self):
+        self.a = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon')
+        self.b = TrackedProduct.objects.create(name="B", url="https://www.amazon.in/dp/B0TEST0002", platform='Amazon')
+
+    def test_buffers_until_batch_size(self):
+        writer = PriceWriter(batch_size=3, interval=3600)
+        writer.add_price(self.a, Decimal(100))
+        writer.add_price(self.b, Decimal(200))
+        self.assertEqual(ProductPrice.objects.count(), 0)
+        writer.add_price(self.a, Decimal(90))
+        self.assertEqual(ProductPrice.objects.count(), 3)
+        self.assertEqual(writer.flushes, 1)
+
+    def test_flush_writes_snapshot_rollups_and_alerts(self):
+        Subscription.objects.create(chat_id='100', product=self.a)
+        writer = PriceWriter(batch_size=100, interval=3600)
+        writer.add_price(self.a, Decimal(100))
+        writer.flush()
+        writer.add_price(self.a, Decimal(80))
+        self.a.lite_misses = 2
+        writer.update_product(self.a, ['lite_misses'])
+        writer.flush()
+
+        a = TrackedProduct.objects.get(pk=self.a.pk)
+        self.assertEqual((a.last_price, a.previous_price, a.lowest_price, a.lite_misses), (80, 100, 80, 2))
+        self.assertEqual(a.last_scraped_at, ProductPrice.objects.filter(product=a).latest('scraped_at').scraped_at)
+        self.assertEqual(a.rollup_watermark, ProductPrice.objects.filter(product=a).latest('id').id)
+        day = PriceRollup.objects.get(product=a, resolution='day')
+        self.assertEqual((day.open, day.low, day.close, day.count), (100, 80, 80, 2))
+        self.assertEqual(list(Alert.objects.values_list('chat_id', 'price', 'rule')), [('100', 80, 'all_time_low')])
+
+    def test_failed_flush_keeps_the_batch(self):
+        writer = PriceWriter(batch_size=100, interval=3600)
+        writer.add_price(self.a, Decimal(100))
+        with mock.patch('tracker.price_writer.fold_new_prices', side_effect=RuntimeError("database went away")):
+            with self.assertRaises(RuntimeError):
+                writer.flush()
+        self.assertEqual(ProductPrice.objects.count(), 0)
+        writer.add_price(self.b, Decimal(200))
+        writer.flush()
+        self.assertEqual(sorted(ProductPrice.objects.values_list('product_id', 'price')),
+                         [(self.a.pk, 100), (self.b.pk, 200)])
+        self.assertEqual(TrackedProduct.objects.get(pk=self.a.pk).last_price, 100)
+
+    def test_deleted_product_is_dropped_from_the_batch(self):
+        writer = PriceWriter(batch_size=100, interval=3600)
+        writer.add_price(self.a, Decimal(100))
+        writer.add_price(self.b, Decimal(200))
+        TrackedProduct.objects.filter(pk=self.b.pk).delete()
+        writer.flush()
+        self.assertEqual(list(ProductPrice.objects.values_list('product_id', 'price')), [(self.a.pk, 100)])
+        self.assertEqual(writer.prices, [])
+
+class RuleEvaluationTests(TestCase):
+    def setUp(self):
+        self.product = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon')
+        Subscription.objects.create(chat_id='100', product=self.product)
+
+    def event(self, price, previous_price=86, previous_low=90):
+        # A new all-time low, but too small a move for percent_drop
+        return PriceEvent(self.product, Decimal(price), Decimal(previous_price), Decimal(previous_low))
+
+    def alerted(self, price, rule='all_time_low', days_ago=0):
+        alert = Alert.objects.create(product=self.product, chat_id='100', price=Decimal(price), rule=rule, status='sent')
+        Alert.objects.filter(pk=alert.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def fired(self, events):
+        return [(a.chat_id, a.price, a.rule) for a in evaluate(events)]
+
+    def test_new_low_fires(self):
+        self.assertEqual(self.fired([self.event(85)]), [('100', 85, 'all_time_low')])
+
+    def test_repeat_at_same_or_higher_price_is_suppressed(self):
+        self.alerted(85)
+        self.assertEqual(self.fired([self.event(85)]), [])
+        self.assertEqual(self.fired([self.event(87, previous_price=88, previous_low=89)]), [])
+
+    def test_lower_price_fires_again(self):
+        self.alerted(85)
+        self.assertEqual(self.fired([self.event(84)]), [('100', 84, 'all_time_low')])
+
+    def test_suppression_expires(self):
+        self.alerted(85, days_ago=SUPPRESS_DAYS + 1)
+        self.assertEqual(self.fired([self.event(85)]), [('100', 85, 'all_time_low')])
+
+    def test_suppression_is_per_rule(self):
+        self.alerted(70, rule='percent_drop')
+        self.assertEqual(self.fired([self.event(85)]), [('100', 85, 'all_time_low')])
+
+    def test_suppressed_rule_falls_through_to_the_next(self):
+        self.alerted(70)
+        # Also a 15% drop, the next rule in priority order
+        self.assertEqual(self.fired([self.event(85, previous_price=100)]), [('100', 85, 'percent_drop')])
+
+    def test_one_alert_per_price_within_a_batch(self):
+        self.assertEqual(self.fired([self.event(85), self.event(85, previous_price=85, previous_low=85)]),
+                         [('100', 85, 'all_time_low')])
+
+    def test_targets_gate_and_take_priority(self):
+        Subscription.objects.create(chat_id='200', product=self.product, target_price=Decimal(85))
+        Subscription.objects.create(chat_id='300', product=self.product, target_price=Decimal(80))
+        self.assertEqual(sorted(self.fired([self.event(85)])), [('100', 85, 'all_time_low'), ('200', 85, 'target')])
+
+    def test_first_price_never_alerts(self):
+        self.assertEqual(evaluate([PriceEvent(self.product, Decimal(50), None, None)]), [])
+
+class ProductKeyTests(SimpleTestCase):
+    def test_amazon_links_key_by_asin(self):
+        for url in [
+            "https://www.amazon.in/dp/B0C1234567",
+            "https://www.amazon.in/Some-Phone-128GB/dp/b0c1234567/ref=sr_1_3?keywords=phone&qid=1",
+            "https://www.amazon.in/gp/product/B0C1234567?psc=1",
+            "https://www.amazon.in/gp/aw/d/B0C1234567",
+            "  https://WWW.AMAZON.IN/dp/B0C1234567/  ",
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(canonical.product_key(url),
+                                 ("amazon:B0C1234567", "https://www.amazon.in/dp/B0C1234567"))
+
+    def test_flipkart_pid_wins_over_item_id(self):
+        url = "https://www.flipkart.com/some-phone/p/itmabc123?pid=mobgtagpaqnvfzzy&lid=LSTX&affid=me"
+        self.assertEqual(canonical.product_key(url),
+                         ("flipkart:MOBGTAGPAQNVFZZY", "https://www.flipkart.com/some-phone/p/itmabc123?pid=mobgtagpaqnvfzzy"))
+        self.assertEqual(canonical.product_key("https://www.flipkart.com/some-phone/p/ITMABC123?otracker=x")[0],
+                         "flipkart:itmabc123")
+
+    def test_links_without_an_id_keep_a_cleaned_url(self):
+        self.assertEqual(canonical.product_key("https://amzn.in/d/abc?tag=x"), (None, "https://amzn.in/d/abc"))
+        self.assertEqual(canonical.product_key("https://www.amazon.in/s?k=phone&ref=nb#top"),
+                         (None, "https://www.amazon.in/s?k=phone"))
+        self.assertEqual(canonical.product_key("https://dl.flipkart.com/s/abc")[0], None)
+
+class GetOrCreateProductTests(TestCase):
+    short = "https://amzn.in/d/abc"
+
+    def setUp(self):
+        # Resolved once already, so nothing goes to the network
+        ResolvedLink.objects.create(short_url=self.short, target_url="https://www.amazon.in/Phone/dp/B0C1234567?ref=x")
+
+    def test_variants_share_one_row(self):
+        product, created = canonical.get_or_create_product(self.short)
+        again, created_again = canonical.get_or_create_product("https://www.amazon.in/dp/B0C1234567?tag=y")
+        self.assertEqual((created, created_again, again.pk), (True, False, product.pk))
+        self.assertEqual((product.product_key, product.url), ("amazon:B0C1234567", "https://www.amazon.in/dp/B0C1234567"))
+
+    def test_url_keyed_row_is_upgraded(self):
+        legacy = TrackedProduct.objects.create(name="Legacy", url=self.short, product_key=f"url:{self.short}", platform='Amazon')
+        product, created = canonical.get_or_create_product(self.short)
+        self.assertEqual((product.pk, created, product.product_key), (legacy.pk, False, "amazon:B0C1234567"))
+        self.assertEqual(TrackedProduct.objects.count(), 1)
+
+    def test_twins_are_merged_into_the_oldest(self):
+        legacy = TrackedProduct.objects.create(name="Legacy", url=self.short, product_key=f"url:{self.short}", platform='Amazon')
+        twin = TrackedProduct.objects.create(name="Twin", url="https://www.amazon.in/dp/B0C1234567",
+                                             product_key="amazon:B0C1234567", platform='Amazon')
+        legacy.record_price(Decimal(100))
+        twin.record_price(Decimal(90))
+        Subscription.objects.create(chat_id='100', product=legacy)
+        Subscription.objects.create(chat_id='100', product=twin, target_price=Decimal(80))
+        Subscription.objects.create(chat_id='200', product=twin)
+
+        product, created = canonical.get_or_create_product(self.short)
+        product.refresh_from_db()
+        self.assertEqual((product.pk, created), (legacy.pk, False))
+        self.assertEqual((product.product_key, product.url), ("amazon:B0C1234567", "https://www.amazon.in/dp/B0C1234567"))
+        self.assertFalse(TrackedProduct.objects.filter(pk=twin.pk).exists())
+        self.assertEqual(sorted(product.subscriptions.values_list('chat_id', 'target_price')),
+                         [('100', 80), ('200', None)])
+        self.assertEqual((product.last_price, product.previous_price, product.lowest_price, product.target_price),
+                         (90, 100, 90, 80))
+        self.assertEqual(product.rollup_watermark, product.prices.latest('id').id)
+        self.assertEqual(PriceRollup.objects.get(product=product, resolution='week').count, 2)
+
+def telegram_update(update_id, text):
+    return json.dumps({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': text,
+        'chat': {'id': 100, 'type': 'private'}, 'from': {'id': 100, 'is_bot': False, 'first_name': 'T'},
+    }})
+
+class UpdateQueueTests(TestCase):
+    def test_redelivered_update_is_stored_once(self):
+        update_queue.enqueue(1, telegram_update(1, "https://amzn.in/d/a"))
+        update_queue.enqueue(1, telegram_update(1, "https://amzn.in/d/a"))
+        self.assertEqual(WebhookUpdate.objects.count(), 1)
+
+    def test_claimed_update_is_skipped_by_the_next_claim(self):
+        update_queue.enqueue(1, telegram_update(1, "a"))
+        update_queue.enqueue(2, telegram_update(2, "b"))
+        first = update_queue.claim(batch_size=1)
+        second = update_queue.claim(batch_size=10)
+        self.assertEqual([u.update_id for u in first], [1])
+        self.assertEqual([u.update_id for u in second], [2])
+        self.assertEqual(update_queue.claim(), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        update_queue.enqueue(1, telegram_update(1, "a"))
+        update_queue.claim()
+        WebhookUpdate.objects.update(claimed_at=timezone.now() - update_queue.CLAIM_LEASE - timedelta(seconds=1))
+        again = update_queue.claim()
+        self.assertEqual([(u.update_id, u.attempts) for u in again], [(1, 2)])
+
+    def test_failures_are_retried_then_marked_failed(self):
+        update_queue.enqueue(1, telegram_update(1, "a"))
+        with mock.patch('tracker.bot_logic.bot.process_new_updates', side_effect=RuntimeError("boom")):
+            for attempt in range(1, update_queue.MAX_ATTEMPTS + 1):
+                WebhookUpdate.objects.update(claimed_at=None)
+                [update] = update_queue.claim()
+                update_queue.process(update)
+                update.refresh_from_db()
+                expected = 'failed' if attempt == update_queue.MAX_ATTEMPTS else 'pending'
+                self.assertEqual((update.status, update.attempts), (expected, attempt))
+                self.assertIn("boom", update.error)
+        WebhookUpdate.objects.update(claimed_at=None)
+        self.assertEqual(update_queue.claim(), [])
+
+    def test_drain_marks_updates_done(self):
+        update_queue.enqueue(1, telegram_update(1, "a"))
+        with mock.patch('tracker.bot_logic.bot.process_new_updates') as handle:
+            self.assertEqual(update_queue.drain(), 1)
+        self.assertEqual(handle.call_count, 1)
+        self.assertEqual(WebhookUpdate.objects.get().status, 'done')
+
+    def test_prune_only_deletes_old_finished_updates(self):
+        for update_id, status in ((1, 'done'), (2, 'failed'), (3, 'pending'), (4, 'done')):
+            WebhookUpdate.objects.create(update_id=update_id, payload='{}', status=status)
+        WebhookUpdate.objects.exclude(update_id=4).update(received_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(update_queue.prune(days=7), 2)
+        self.assertEqual(sorted(WebhookUpdate.objects.values_list('update_id', flat=True)), [3, 4])
+
+    def test_only_links_need_a_worker(self):
+        self.assertTrue(update_queue.needs_worker(telegram_update(1, "track https://amzn.in/d/a 500")))
+        self.assertFalse(update_queue.needs_worker(telegram_update(2, "/list")))
+        self.assertFalse(update_queue.needs_worker(json.dumps({'update_id': 3, 'callback_query': {'data': 'list_n_0'}})))
+
+class WebhookViewTests(TestCase):
+    def post(self, body):
+        return Client().post('/webhook/', body, content_type='application/json')
+
+    def test_inline_by_default(self):
+        with mock.patch.dict(os.environ, {'WEBHOOK_QUEUE': ''}), \
+                mock.patch('tracker.views.bot.process_new_updates') as handle:
+            self.assertEqual(self.post(telegram_update(1, "https://amzn.in/d/a")).status_code, 200)
+        self.assertEqual(handle.call_count, 1)
+        self.assertFalse(WebhookUpdate.objects.exists())
+
+    def test_queue_mode_queues_links_only(self):
+        with mock.patch.dict(os.environ, {'WEBHOOK_QUEUE': '1'}), \
+                mock.patch('tracker.views.bot.process_new_updates') as handle:
+            self.post(telegram_update(1, "https://amzn.in/d/a"))
+            self.post(telegram_update(2, "/ping"))
+        self.assertEqual(handle.call_count, 1)
+        self.assertEqual(list(WebhookUpdate.objects.values_list('update_id', flat=True)), [1])
+
+    def test_rejects_non_updates(self):
+        self.assertEqual(self.post("not json").status_code, 400)
+
+    def test_metrics_need_the_token(self):
+        client = Client()
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': 's3cret'}):
+            self.assertEqual(client.get('/metrics/').status_code, 403)
+            self.assertEqual(client.get('/metrics/?token=wrong').status_code, 403)
+            response = client.get('/metrics/', HTTP_X_METRICS_TOKEN='s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['queue_depth'], 0)
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': '', 'TELEGRAM_WEBHOOK_SECRET': ''}):
+            self.assertEqual(client.get('/metrics/?token=').status_code, 403)
+
+class AnalyticsTests(TestCase):
+    DAY = analytics.DAY
+
+    def histories(self, rows):
+        product, ts, paise = (np.array(column, dtype=np.int64) for column in zip(*rows))
+        return analytics.Histories(product, ts, paise)
+
+    def test_stats_per_product(self):
+        h = self.histories([(1, 0, 1000), (1, 10, 800), (1, 20, 900), (2, 0, 500)])
+        result = analytics.stats(h)
+        self.assertEqual(result['product_id'].tolist(), [1, 2])
+        self.assertEqual(result['count'].tolist(), [3, 1])
+        self.assertEqual((result['low'].tolist(), result['high'].tolist()), ([800, 500], [1000, 500]))
+        self.assertEqual((result['first'].tolist(), result['last'].tolist()), ([1000, 500], [900, 500]))
+        self.assertEqual(result['drops'].tolist(), [1, 0])
+        self.assertEqual(result['max_drop'].tolist(), [200, 0])
+        self.assertAlmostEqual(result['drawdown'][0], 0.1)
+        self.assertAlmostEqual(result['change'][0], -0.1)
+        self.assertEqual(result['p50'].tolist(), [900, 500])
+        # Relative moves -20% then +12.5%
+        self.assertAlmostEqual(result['volatility'][0], np.std([-0.2, 0.125]))
+        self.assertEqual(result['volatility'][1], 0)
+
+    def test_stats_of_nothing(self):
+        self.assertEqual(len(analytics.stats(self.histories([(1, 0, 1)]).since(1))['low']), 0)
+
+    def test_daily_closes_carry_over_empty_days(self):
+        ts = np.array([0, 3600, 2 * self.DAY + 5, 4 * self.DAY], dtype=np.int64)
+        days, closes = analytics.daily_closes(ts, np.array([10, 11, 12, 13], dtype=np.int64))
+        self.assertEqual((days // self.DAY).tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(closes.tolist(), [11, 11, 12, 12, 13])
+
+    def test_rolling_windows(self):
+        ts = np.arange(5, dtype=np.int64) * self.DAY
+        paise = np.array([50, 40, 60, 30, 70], dtype=np.int64)
+        ends, lows = analytics.rolling(ts, paise, 3, 'min')
+        self.assertEqual((ends // self.DAY).tolist(), [2, 3, 4])
+        self.assertEqual(lows.tolist(), [40, 30, 30])
+        self.assertEqual(analytics.rolling(ts, paise, 3, 'p50')[1].tolist(), [50, 40, 60])
+        self.assertEqual(len(analytics.rolling(ts, paise, 6)[0]), 0)
+
+    def add_price(self, product, price, when):
+        row = ProductPrice.objects.create(product=product, price=Decimal(price))
+        ProductPrice.objects.filter(pk=row.pk).update(scraped_at=when)
+
+    def test_long_windows_use_rollup_extremes(self):
+        from tracker.rollups import rebuild_rollups
+        product = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon')
+        now = timezone.now()
+        # Day 60: dips to 500 intraday but closes at 950; the raw rows are then pruned
+        for hours, price in ((0, 1000), (2, 500), (4, 950)):
+            self.add_price(product, price, (now - timedelta(days=60)).replace(hour=6 + hours, minute=0))
+        self.add_price(product, 1200, now - timedelta(days=40))
+        self.add_price(product, 900, now - timedelta(days=1))
+        rebuild_rollups()
+        ProductPrice.objects.filter(scraped_at__lt=now - timedelta(days=analytics.RAW_RETENTION_DAYS)).delete()
+
+        recent, daily = analytics.load_window([product.pk], analytics.RAW_RETENTION_DAYS, now)
+        self.assertFalse(daily)
+        self.assertEqual(recent.paise.tolist(), [90000])
+
+        history, daily = analytics.load_window([product.pk], 90, now)
+        self.assertTrue(daily)
+        self.assertEqual(history.paise.tolist(), [95000, 120000, 90000])
+        s = analytics.product_stats([product.pk], days=90, now=now)[product.pk]
+        self.assertEqual((s['low'], s['high'], s['last'], s['count']), (500.0, 1200.0, 900.0, 3))
+        self.assertEqual(s['p50'], 950.0)
+
+class HttpCacheTests(SimpleTestCase):
+    url = "https://www.amazon.in/dp/B0TEST0001"
+
+    def make_cache(self, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = http_cache.HttpCache(path=os.path.join(directory.name, 'cache.sqlite3'), **kwargs)
+        self.addCleanup(cache.db.close)
+        return cache
+
+    def test_tracking_variants_share_an_entry(self):
+        cache = self.make_cache()
+        cache.put("https://www.amazon.in/Phone/dp/B0TEST0001/ref=sr_1?tag=x#reviews", {'ETag': '"v1"'}, "Phone", "1,299")
+        entry = cache.get(self.url + "?psc=1")
+        self.assertEqual((entry.url, entry.etag, entry.name, entry.price), (self.url, '"v1"', "Phone", "1,299"))
+        self.assertEqual(cache.conditional_headers(entry), {'If-None-Match': '"v1"'})
+
+    def test_ttl_expiry(self):
+        cache = self.make_cache(ttl=60)
+        cache.put(self.url, {'ETag': '"v1"'}, "Phone", "1,299")
+        cache.put("https://www.amazon.in/dp/B0TEST0002", {}, "Other", "10")
+        cache.db.execute("UPDATE pages SET fetched_at = fetched_at - 120 WHERE url = ?", (self.url,))
+        # Past the TTL the validators are still sent, until evict() retires the entry
+        self.assertIsNotNone(cache.get(self.url))
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get(self.url))
+        self.assertIsNotNone(cache.get("https://www.amazon.in/dp/B0TEST0002"))
+
+    def test_touch_keeps_a_confirmed_entry(self):
+        cache = self.make_cache(ttl=60)
+        cache.put(self.url, {'ETag': '"v1"'}, "Phone", "1,299")
+        cache.db.execute("UPDATE pages SET fetched_at = fetched_at - 120")
+        cache.touch(cache.get(self.url))
+        self.assertEqual(cache.evict(), 0)
+
+    def test_lru_eviction(self):
+        cache = self.make_cache(max_entries=2)
+        urls = [f"https://www.amazon.in/dp/B0TEST000{i}" for i in range(3)]
+        for i, url in enumerate(urls):
+            cache.put(url, {}, f"P{i}", "1")
+            cache.db.execute("UPDATE pages SET used_at = ? WHERE url = ?", (1000 + i, url))
+        # Confirming the oldest makes the middle one least recently used
+        cache.touch(cache.get(urls[0]))
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual([cache.get(u) is not None for u in urls], [True, False, True])
+
+class LiteRevalidationTests(SimpleTestCase):
+    def setUp(self):
+        from tracker.management.commands.bench_fetcher import STUB_PAGE
+
+        def page(handler):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, b''
+            return 200, {'Content-Type': 'text/html; charset=utf-8', 'ETag': '"v1"'}, STUB_PAGE
+
+        self.server = start_stub_site({'/dp/B0TEST0001': page})
+        self.addCleanup(self.server.shutdown)
+        self.url = f"{self.server.base}/dp/B0TEST0001"
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = http_cache.HttpCache(path=os.path.join(directory.name, 'cache.sqlite3'))
+        self.addCleanup(self.cache.db.close)
+        patcher = mock.patch.object(http_cache, '_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scrape(self):
+        return track_prices.scrape_lite_tier(self.url, 'Amazon')
+
+    def test_first_fetch_then_304(self):
+        self.assertEqual(self.scrape(), ("Stub Product", "₹1299", "ok"))
+        self.assertEqual(self.scrape(), ("Stub Product", "₹1299", "unchanged"))
+        self.assertEqual(self.cache.counters, {'not_modified': 1, 'unchanged': 0, 'miss': 1})
+        self.assertEqual(self.server.state['requests'][1][1].get('If-None-Match'), '"v1"')
+
+    def test_same_content_without_validators_is_unchanged(self):
+        self.scrape()
+        self.cache.db.execute("UPDATE pages SET etag = NULL")
+        self.assertEqual(self.scrape(), ("Stub Product", "₹1299", "unchanged"))
+        self.assertEqual(self.cache.counters['unchanged'], 1)
+
+    def test_304_for_an_evicted_entry_refetches(self):
+        self.scrape()
+        entry = self.cache.get(self.url)
+        headers = self.cache.conditional_headers(entry)
+        from tracker import fetcher
+        result = fetcher.fetch(self.url, headers)
+        self.assertEqual(result.status, 304)
+        self.cache.db.execute("DELETE FROM pages")
+        self.assertEqual(track_prices.parse_lite_result(result, 'Amazon', None), ("Stub Product", "₹1299", "ok"))
+        self.assertIsNone(self.server.state['requests'][-1][1].get('If-None-Match'))
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        self.product = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon',
+                                                     scrape_interval=int(scheduler.MIN_INTERVAL.total_seconds()))
+
+    def interval(self, price, last_price):
+        return scheduler.next_interval(self.product, Decimal(price) if price is not None else None,
+                                       Decimal(last_price) if last_price is not None else None)
+
+    def test_stable_price_backs_off_up_to_the_cap(self):
+        intervals = []
+        for _ in range(10):
+            interval = scheduler.reschedule(self.product, Decimal(100), Decimal(100))
+            intervals.append(interval)
+        self.assertEqual(intervals[:3], [scheduler.MIN_INTERVAL * 2, scheduler.MIN_INTERVAL * 4, scheduler.MIN_INTERVAL * 8])
+        self.assertEqual(intervals[-1], scheduler.MAX_INTERVAL)
+        self.assertEqual(self.product.scrape_interval, int(scheduler.MAX_INTERVAL.total_seconds()))
+
+    def test_price_move_resets_to_the_minimum(self):
+        self.product.scrape_interval = int(scheduler.MAX_INTERVAL.total_seconds())
+        self.assertEqual(self.interval(95, 100), scheduler.MIN_INTERVAL)
+        self.assertGreater(self.product.volatility, 0)
+
+    def test_near_target_stays_at_the_minimum(self):
+        self.product.scrape_interval = int(scheduler.MAX_INTERVAL.total_seconds())
+        self.product.target_price = Decimal(100)
+        self.assertEqual(self.interval(104, 104), scheduler.MIN_INTERVAL)
+        self.assertEqual(self.interval(110, 110), scheduler.MAX_INTERVAL)
+
+    def test_volatile_products_back_off_less(self):
+        self.product.scrape_interval = int(scheduler.MAX_INTERVAL.total_seconds())
+        self.product.volatility = scheduler.VOLATILE_THRESHOLD * 2
+        self.assertEqual(self.interval(100, 100), scheduler.VOLATILE_CAP)
+
+    def test_failure_and_first_price_use_the_minimum(self):
+        self.product.scrape_interval = int(scheduler.MAX_INTERVAL.total_seconds())
+        self.assertEqual(self.interval(None, 100), scheduler.MIN_INTERVAL)
+        self.assertEqual(self.interval(100, None), scheduler.MIN_INTERVAL)
+
+    def test_first_schedule_seeds_volatility_from_history(self):
+        for price in (100, 80, 100, 90):
+            ProductPrice.objects.create(product=self.product, price=Decimal(price))
+        self.product.scrape_interval = 0
+        self.interval(90, 90)
+        # Seeded from the history, then one unchanged observation folded in
+        seeded = scheduler.history_volatility([100, 80, 100, 90])
+        self.assertAlmostEqual(self.product.volatility, (1 - scheduler.VOLATILITY_ALPHA) * seeded)
+        self.assertGreater(self.product.volatility, scheduler.VOLATILE_THRESHOLD)
+
+    def test_due_products_order_and_limit(self):
+        now = timezone.now()
+        self.product.next_scrape_at = now - timedelta(hours=1)
+        self.product.save()
+        later = TrackedProduct.objects.create(name="Later", url="https://www.amazon.in/dp/B0TEST0002", platform='Amazon',
+                                              next_scrape_at=now + timedelta(hours=5))
+        new = TrackedProduct.objects.create(name="New", url="https://www.amazon.in/dp/B0TEST0003", platform='Amazon')
+        near = TrackedProduct.objects.create(name="Near", url="https://www.amazon.in/dp/B0TEST0004", platform='Amazon',
+                                             next_scrape_at=now, target_price=Decimal(100), last_price=Decimal(101))
+        soon = TrackedProduct.objects.create(name="Soon", url="https://www.amazon.in/dp/B0TEST0005", platform='Amazon',
+                                             next_scrape_at=now + scheduler.LOOKAHEAD / 2)
+        self.assertEqual([p.pk for p in scheduler.due_products(now=now)], [new.pk, near.pk, self.product.pk, soon.pk])
+        self.assertEqual([p.pk for p in scheduler.due_products(limit=2, now=now)], [new.pk, near.pk])
+        self.assertNotIn(later.pk, [p.pk for p in scheduler.due_products(now=now)])
+
+class DedupeProductsTests(TestCase):
+    def test_duplicates_are_merged_into_the_lowest_id(self):
+        keeper = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon')
+        other = TrackedProduct.objects.create(name="B", url="https://www.amazon.in/Phone/dp/B0TEST0001?tag=x", platform='Amazon')
+        single = TrackedProduct.objects.create(name="C", url="https://www.amazon.in/dp/B0TEST0002", platform='Amazon')
+        other.record_price(Decimal(100))
+        Subscription.objects.create(chat_id='100', product=other)
+
+        unique = track_prices.dedupe_products([other, single, keeper])
+        self.assertEqual([p.pk for p in unique], [keeper.pk, single.pk])
+        self.assertFalse(TrackedProduct.objects.filter(pk=other.pk).exists())
+        keeper.refresh_from_db()
+        self.assertEqual((keeper.product_key, keeper.last_price), ("amazon:B0TEST0001", 100))
+        self.assertEqual(list(keeper.subscriptions.values_list('chat_id', flat=True)), ['100'])
+        # Nothing left to skip on the next pass
+        self.assertEqual(len(track_prices.dedupe_products(list(TrackedProduct.objects.all()))), 2)
+
+
+class SubscribeChatCommandTests(TestCase):
+    def test_backfills_only_products_without_subscribers(self):
+        orphan = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon',
+                                               target_price=Decimal(500))
+        owned = TrackedProduct.objects.create(name="B", url="https://www.amazon.in/dp/B0TEST0002", platform='Amazon')
+        Subscription.objects.create(chat_id='200', product=owned)
+
+        call_command('subscribe_chat', '100', stdout=io.StringIO())
+        self.assertEqual(list(Subscription.objects.filter(chat_id='100').values_list('product_id', 'target_price')),
+                         [(orphan.pk, Decimal(500))])
+        # Re-running and --all skip the subscriptions that already exist
+        call_command('subscribe_chat', '100', '--all', stdout=io.StringIO())
+        self.assertEqual(Subscription.objects.filter(chat_id='100').count(), 2)
+
+
+class ScraperWorkersTests(SimpleTestCase):
+    def test_workers_default_to_and_are_capped_at_the_platform_count(self):
+        products = [TrackedProduct(platform='Amazon'), TrackedProduct(platform='Amazon'), TrackedProduct(platform='Flipkart')]
+        self.assertEqual(track_prices.max_useful_workers(products), 2)
+        self.assertEqual(track_prices.max_useful_workers(products[:2]), 1)
+        with mock.patch.dict(os.environ, {'SCRAPER_WORKERS': ''}), mock.patch('builtins.print'):
+            self.assertEqual(track_prices.resolve_workers(None, 2), 2)
+            self.assertEqual(track_prices.resolve_workers(3, 2), 2)
+            self.assertEqual(track_prices.resolve_workers(1, 2), 1)
+
+
+class ListPageTests(TestCase):
+    def setUp(self):
+        self.products = []
+        for i in range(23):
+            product = TrackedProduct.objects.create(name=f"Item {i}", url=f"https://www.amazon.in/dp/B0TEST{i:04d}",
+                                                    platform='Amazon')
+            Subscription.objects.create(chat_id='100', product=product, target_price=Decimal(50) if i == 0 else None)
+            self.products.append(product)
+        self.products[0].record_price(Decimal('100.00'))
+        # No snapshot yet: the price comes from the latest row
+        ProductPrice.objects.create(product=self.products[1], price=Decimal('200.00'))
+        other = TrackedProduct.objects.create(name="Other chat", url="https://www.amazon.in/dp/B0OTHER001", platform='Amazon')
+        Subscription.objects.create(chat_id='200', product=other)
+
+    def buttons(self, markup):
+        return [b.callback_data for row in markup.keyboard for b in row]
+
+    def test_each_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            text, markup = bot_logic.build_list_page('100')
+        # SQLite's COALESCE drops the decimal places Postgres keeps
+        self.assertRegex(text, r"Price: ₹100(\.00)? \(target ₹50\.00\)")
+        self.assertRegex(text, r"Price: ₹200(\.00)?\n")
+        self.assertEqual(text.count("•"), bot_logic.LIST_PAGE_SIZE)
+        self.assertNotIn("Other chat", text)
+        self.assertEqual(self.buttons(markup), [f"list_next_{self.products[9].pk}"])
+
+    def test_cursors_walk_forward_and_back(self):
+        with self.assertNumQueries(1):
+            text, markup = bot_logic.build_list_page('100', after_id=self.products[19].pk)
+        self.assertEqual(text.count("•"), 3)
+        self.assertEqual(self.buttons(markup), [f"list_prev_{self.products[20].pk}"])
+
+        text, markup = bot_logic.build_list_page('100', before_id=self.products[20].pk)
+        self.assertIn("Item 10.", text)
+        self.assertIn("Item 19.", text)
+        self.assertEqual(self.buttons(markup), [f"list_prev_{self.products[10].pk}", f"list_next_{self.products[19].pk}"])
+
+        text, markup = bot_logic.build_list_page('100', before_id=self.products[10].pk)
+        self.assertEqual(self.buttons(markup), [f"list_next_{self.products[9].pk}"])
+
+    def test_long_urls_cut_the_page_short(self):
+        TrackedProduct.objects.filter(pk__in=[p.pk for p in self.products]).update(
+            url=Concat('url', Value("?ref=" + "x" * 600)))
+        text, markup = bot_logic.build_list_page('100')
+        self.assertLess(len(text), 4096)
+        shown = text.count("•")
+        self.assertLess(shown, bot_logic.LIST_PAGE_SIZE)
+        self.assertEqual(self.buttons(markup), [f"list_next_{self.products[shown - 1].pk}"])
+
+    def test_no_subscriptions(self):
+        self.assertEqual(bot_logic.build_list_page('300'), (None, None))
+
+
+class RollupTests(TestCase):
+    # A Wednesday; its week starts on Monday 2026-03-02
+    base = datetime(2026, 3, 4, 10, 0, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.product = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon')
+
+    def add_price(self, price, when):
+        row = ProductPrice.objects.create(product=self.product, price=Decimal(price))
+        ProductPrice.objects.filter(pk=row.pk).update(scraped_at=when)
+        return row
+
+    def ohlc(self, resolution):
+        return [(r.bucket_start, r.open, r.high, r.low, r.close, r.count)
+                for r in PriceRollup.objects.filter(product=self.product, resolution=resolution).order_by('bucket_start')]
+
+    def add_day(self):
+        self.add_price(100, self.base)
+        self.add_price(80, self.base + timedelta(minutes=30))
+        self.add_price(120, self.base + timedelta(hours=2))
+        self.add_price(90, self.base + timedelta(days=1))
+
+    def test_fold_builds_ohlc_per_resolution(self):
+        self.add_day()
+        self.assertEqual(rollups.fold_new_prices(), 4)
+        day = self.base.replace(hour=0)
+        self.assertEqual(self.ohlc('hour'), [
+            (self.base, 100, 100, 80, 80, 2),
+            (self.base + timedelta(hours=2), 120, 120, 120, 120, 1),
+            (self.base + timedelta(days=1), 90, 90, 90, 90, 1),
+        ])
+        self.assertEqual(self.ohlc('day'), [(day, 100, 120, 80, 120, 3), (day + timedelta(days=1), 90, 90, 90, 90, 1)])
+        self.assertEqual(self.ohlc('week'), [(day - timedelta(days=2), 100, 120, 80, 90, 4)])
+
+    def test_incremental_folds_match_a_rebuild(self):
+        self.add_day()
+        rollups.fold_new_prices()
+        self.add_price(70, self.base + timedelta(days=1, hours=1))
+        self.assertEqual(rollups.fold_new_prices(), 1)
+        self.assertEqual(rollups.fold_new_prices(), 0)
+        folded = {res: self.ohlc(res) for res in rollups.RESOLUTIONS}
+        rollups.rebuild_rollups()
+        self.assertEqual({res: self.ohlc(res) for res in rollups.RESOLUTIONS}, folded)
+
+    def test_rewind_recomputes_from_the_week_of_since(self):
+        old = self.add_price(200, self.base - timedelta(days=14))
+        self.add_day()
+        rollups.fold_new_prices()
+        # Corrected in place, so no new rows past the watermark
+        ProductPrice.objects.filter(pk=old.pk).update(price=Decimal(150))
+        ProductPrice.objects.filter(price=80).update(price=Decimal(60))
+        watermark = TrackedProduct.objects.get(pk=self.product.pk).rollup_watermark
+
+        start = rollups.rewind_rollups(self.base + timedelta(days=1))
+        self.assertEqual(start, self.base.replace(hour=0) - timedelta(days=2))
+        self.assertEqual(self.ohlc('day')[1][3], 60)
+        # Buckets before the rewind week are left alone
+        self.assertEqual(self.ohlc('week')[0][1:], (200, 200, 200, 200, 1))
+        self.assertEqual(TrackedProduct.objects.get(pk=self.product.pk).rollup_watermark, watermark)
+
+    def test_lowest_since_and_series(self):
+        self.add_day()
+        rollups.fold_new_prices()
+        self.assertEqual(rollups.lowest_since([self.product.pk], self.base), {self.product.pk: 80})
+        self.assertEqual(rollups.lowest_since([self.product.pk], self.base + timedelta(days=1)), {self.product.pk: 90})
+        self.assertEqual([r.close for r in rollups.series(self.product.pk, self.base)], [120, 90])
+        self.assertEqual([r.close for r in rollups.series(self.product.pk, self.base, 'hour')], [80, 120, 90])
+
+
+class AggregatePricesTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.active = TrackedProduct.objects.create(name="A", url="https://www.amazon.in/dp/B0TEST0001", platform='Amazon')
+        self.stale = TrackedProduct.objects.create(name="B", url="https://www.amazon.in/dp/B0TEST0002", platform='Amazon')
+        for days in (50, 45, 40):
+            self.add_price(self.active, 100 + days, self.now - timedelta(days=days))
+            self.add_price(self.stale, 200 + days, self.now - timedelta(days=days))
+        self.add_price(self.active, 90, self.now - timedelta(days=1))
+
+    def add_price(self, product, price, when):
+        row = ProductPrice.objects.create(product=product, price=Decimal(price))
+        ProductPrice.objects.filter(pk=row.pk).update(scraped_at=when)
+        return row
+
+    def aggregate(self, *args):
+        call_command('aggregate_prices', '--retention-days', '30', *args, stdout=io.StringIO())
+
+    def test_folds_resume_from_the_watermark(self):
+        self.assertEqual(rollups.fold_new_prices(limit=4), 4)
+        first_ids = list(ProductPrice.objects.order_by('id').values_list('id', flat=True)[:4])
+        self.assertEqual(TrackedProduct.objects.get(pk=self.active.pk).rollup_watermark, first_ids[2])
+        self.assertEqual(rollups.fold_new_prices(limit=4), 3)
+        self.assertEqual(rollups.fold_new_prices(limit=4), 0)
+        self.assertEqual(PriceRollup.objects.filter(resolution='day').aggregate(n=Sum('count'))['n'], 7)
+
+    def test_prune_keeps_recent_and_newest_rows(self):
+        self.aggregate()
+        self.assertEqual(list(self.active.prices.values_list('price', flat=True)), [90])
+        # Nothing newer for this product, so its latest row stays even past retention
+        self.assertEqual(list(self.stale.prices.values_list('price', flat=True)), [240])
+        # The pruned rows live on in the rollups
+        self.assertEqual(rollups.lowest_since([self.active.pk], self.now - timedelta(days=60)), {self.active.pk: 90})
+        self.assertEqual(rollups.lowest_since([self.stale.pk], self.now - timedelta(days=60)), {self.stale.pk: 240})
+
+    def test_prune_skips_rows_past_the_watermark(self):
+        rollups.fold_new_prices([self.stale.pk])
+        # A dry run neither folds nor deletes
+        self.aggregate('--dry-run')
+        self.assertEqual(ProductPrice.objects.count(), 7)
+        self.assertEqual(PriceRollup.objects.filter(product=self.active).count(), 0)
+
+        # Rows past the active product's watermark aren't in the rollups yet, so they are never pruned
+        TrackedProduct.objects.filter(pk=self.active.pk).update(rollup_watermark=0)
+        AggregatePricesCommand(stdout=io.StringIO()).prune(30, dry_run=False)
+        self.assertEqual(self.active.prices.count(), 4)
+        self.assertEqual(self.stale.prices.count(), 1)
+
+
+class ChartTests(TestCase):
+    def setUp(self):
+        self.product = TrackedProduct.objects.create(name="Phone <5G>", url="https://www.amazon.in/dp/B0TEST0001",
+                                                     platform='Amazon')
+        for price in (1000, 800, 900):
+            self.product.record_price(Decimal(price))
+        patcher = mock.patch.object(charts, 'cache', charts.ChartCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_view_checks_range_and_token_before_the_product(self):
+        token = charts.chart_token(self.product.pk)
+        self.assertEqual(Client().get(f'/chart/{self.product.pk}/', {'range': '5y', 'token': token}).status_code, 400)
+        self.assertEqual(Client().get(f'/chart/{self.product.pk}/', {'format': 'gif', 'token': token}).status_code, 400)
+        self.assertEqual(Client().get(f'/chart/{self.product.pk}/').status_code, 403)
+        self.assertEqual(Client().get(f'/chart/{self.product.pk}/', {'token': charts.chart_token(999)}).status_code, 403)
+        # An unknown id only shows up as 404 with a token signed for it
+        self.assertEqual(Client().get('/chart/999/').status_code, 403)
+        self.assertEqual(Client().get('/chart/999/', {'token': charts.chart_token(999)}).status_code, 404)
+
+    def test_view_serves_svg_with_etag_until_the_next_scrape(self):
+        client = Client()
+        url = charts.chart_url(self.product.pk)
+        response = client.get(url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/svg+xml'))
+        self.assertIn(b"Phone &lt;5G&gt;", response.content)
+        self.assertIn("Low ₹800.00".encode(), response.content)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.product.record_price(Decimal(700))
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Low ₹700.00".encode(), response.content)
+
+    def test_png_is_a_valid_image(self):
+        data = charts.get_chart(self.product, '7d', 'png')
+        self.assertTrue(data.startswith(b'\x89PNG\r\n\x1a\n'))
+        width, height = struct.unpack('>II', data[16:24])
+        self.assertEqual((width, height), (charts.WIDTH, charts.HEIGHT))
+        idat_length = struct.unpack('>I', data[33:37])[0]
+        self.assertEqual(data[37:41], b'IDAT')
+        raw = zlib.decompress(data[41:41 + idat_length])
+        self.assertEqual(len(raw), height * (width * 3 + 1))
+        self.assertIn(bytes(charts.LINE), raw)
+
+    def test_renders_are_cached_per_scrape(self):
+        charts.get_chart(self.product, '30d', 'svg')
+        charts.get_chart(self.product, '30d', 'svg')
+        self.assertEqual((charts.cache.stats()['hits'], charts.cache.stats()['misses']), (1, 1))
+        self.product.record_price(Decimal(700))
+        charts.get_chart(self.product, '30d', 'svg')
+        # The re-render replaced the stale one instead of sitting next to it
+        self.assertEqual((charts.cache.stats()['misses'], charts.cache.stats()['entries']), (2, 1))
+
+    def test_empty_history(self):
+        empty = TrackedProduct.objects.create(name="New", url="https://www.amazon.in/dp/B0TEST0002", platform='Amazon')
+        self.assertIn(b"No prices yet", charts.get_chart(empty, '30d', 'svg'))
+        self.assertTrue(charts.get_chart(empty, '30d', 'png').startswith(b'\x89PNG'))
+
+
+class ChartCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used_past_max_bytes(self):
+        cache = charts.ChartCache(max_bytes=25)
+        cache.put((1, '30d', 'a', 'svg'), b'x' * 10)
+        cache.put((2, '30d', 'a', 'svg'), b'x' * 10)
+        cache.get((1, '30d', 'a', 'svg'))
+        cache.put((3, '30d', 'a', 'svg'), b'x' * 10)
+        self.assertIsNone(cache.get((2, '30d', 'a', 'svg')))
+        self.assertIsNotNone(cache.get((1, '30d', 'a', 'svg')))
+        self.assertEqual(cache.stats()['bytes'], 20)
+
+
+class ExtractionSpecTests(SimpleTestCase):
+    def test_spec_for_url(self):
+        self.assertIs(extraction.spec_for_url("https://amzn.in/d/abc"), extraction.AMAZON)
+        self.assertIs(extraction.spec_for_url("https://dl.flipkart.com/s/xyz"), extraction.FLIPKART)
+        self.assertIsNone(extraction.spec_for_url("https://example.com/item"))
+
+    def test_clean_price(self):
+        self.assertEqual(extraction.clean_price("₹1,299.00"), Decimal("1299.00"))
+        self.assertIsNone(extraction.clean_price("Currently unavailable"))
+        self.assertIsNone(extraction.clean_price(None))
+
+    def test_amazon_whole_price_drops_the_trailing_dot(self):
+        html = ('<span id="productTitle">  Phone\n  X  </span>'
+                '<span class="a-price"><span class="a-price-whole">1,299.</span><span class="a-price-fraction">65</span></span>')
+        self.assertEqual(extraction.extract_from_html(extraction.AMAZON, html), ("Phone X", "₹1299"))
+
+    def test_amazon_skips_unit_prices(self):
+        html = ('<span id="productTitle">Coffee</span><div id="corePrice_feature_div">'
+                '<span class="a-price a-size-small"><span class="a-offscreen">₹5.00</span></span>'
+                '<span class="a-price"><span class="a-offscreen">₹499.00</span></span></div>')
+        self.assertEqual(extraction.extract_from_html(extraction.AMAZON, html), ("Coffee", "₹499.00"))
+
+    def test_falls_back_to_title_and_page_text(self):
+        html = "<title>Widget - Flipkart.com</title><body><p>Deal</p><span>₹</span><span>2,499</span></body>"
+        name, price = extraction.extract_from_html(extraction.FLIPKART, html)
+        self.assertEqual((name, extraction.clean_price(price)), ("Widget", Decimal(2499)))
+
+    def test_title_to_name(self):
+        self.assertEqual(extraction.AMAZON.title_to_name("Amazon.in: Buy Phone X : Amazon.in"), "Phone X")
+        self.assertIsNone(extraction.AMAZON.title_to_name("Amazon.in"))
+        self.assertIsNone(extraction.AMAZON.title_to_name("Robot Check"))
+
+    def test_bot_checks_and_interstitials(self):
+        self.assertTrue(extraction.AMAZON.is_bot_check('<form action="/errors/validateCaptcha">'))
+        self.assertTrue(extraction.AMAZON.is_bot_check("<a>Continue shopping</a>"))
+        self.assertFalse(extraction.AMAZON.is_bot_check('<a>Continue shopping</a><span id="productTitle">X</span>'))
+        # A stray "captcha" in a script isn't a CAPTCHA page
+        self.assertFalse(extraction.FLIPKART.is_bot_check("<script>loadCaptchaLib()</script><h1>X</h1>"))
+
+
+class FakePage:
+    """Selenium driver stand-in: find_elements matches selectors in `present`, scripts return `text`."""
+
+    def __init__(self, present=(), text="", after=0.0):
+        self.present = set(present)
+        self.text = text
+        self.ready_at = time.monotonic() + after
+        self.loads = 0
+
+    def get(self, url):
+        self.loads += 1
+
+    def find_elements(self, by, selector):
+        if time.monotonic() < self.ready_at:
+            return []
+        return [object()] if selector in self.present else []
+
+    def execute_script(self, script):
+        return self.text
+
+
+class ReadinessTests(SimpleTestCase):
+    spec = extraction.AMAZON
+
+    def test_page_state(self):
+        self.assertEqual(readiness.page_state(FakePage([self.spec.wait_selector]), self.spec), readiness.READY)
+        self.assertEqual(readiness.page_state(FakePage([self.spec.continue_xpath]), self.spec), readiness.INTERSTITIAL)
+        self.assertEqual(readiness.page_state(FakePage(text="Robot Check\nType the characters"), self.spec),
+                         readiness.BOT_CHECK)
+        self.assertIsNone(readiness.page_state(FakePage(text="Loading"), self.spec))
+
+    def test_wait_returns_as_soon_as_the_page_settles(self):
+        started = time.monotonic()
+        page = FakePage([self.spec.wait_selector], after=0.3)
+        self.assertEqual(readiness.wait_for_page(page, self.spec, timeout=5), readiness.READY)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(readiness.wait_for_page(FakePage(), self.spec, timeout=0.5), readiness.TIMEOUT)
+
+    def test_retry_delay_by_failure_type(self):
+        self.assertIsNone(readiness.retry_delay(readiness.BOT_CHECK, 0))
+        with mock.patch('tracker.readiness.random.uniform', return_value=1.0):
+            self.assertEqual(readiness.retry_delay(readiness.TIMEOUT, 2), 4)
+            self.assertEqual(readiness.retry_delay(readiness.NOT_FOUND, 0), 0.5)
+            self.assertEqual(readiness.retry_delay("unknown", 0), readiness.RETRY_BACKOFF[readiness.ERROR])
+
+    def test_bot_check_is_not_retried(self):
+        page = FakePage(text="Enter the characters you see below")
+        recorder = readiness.LatencyRecorder(log_path='')
+        with mock.patch('tracker.readiness.latency', recorder), mock.patch('builtins.print'):
+            self.assertEqual(track_prices.scrape_with_spec(page, "https://www.amazon.in/dp/B0TEST0001", self.spec),
+                             (None, None))
+        self.assertEqual(page.loads, 1)
+        self.assertEqual(recorder.summary()["Amazon"]["outcomes"], {readiness.BOT_CHECK: 1})
+
+    def test_latency_recorder(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = os.path.join(directory, "latency.jsonl")
+            recorder = readiness.LatencyRecorder(log)
+            for seconds, outcome in ((1.0, readiness.READY), (3.0, readiness.READY), (20.0, readiness.TIMEOUT)):
+                recorder.record("Amazon", outcome, seconds, "https://www.amazon.in/dp/B0TEST0001")
+            stats = recorder.summary()["Amazon"]
+            self.assertEqual((stats["count"], stats["p50"], stats["max"]), (3, 3.0, 20.0))
+            self.assertEqual(stats["outcomes"], {readiness.READY: 2, readiness.TIMEOUT: 1})
+            with open(log) as f:
+                self.assertEqual([json.loads(line)["outcome"] for line in f], ["ready", "ready", "timeout"])
+
+
+class FakeChrome:
+    """Stand-in for a Selenium Chrome driver, without a chromedriver process."""
+
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.quit_calls = 0
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise RuntimeError("chrome not reachable")
+        return 1
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class DriverPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        started = []
+
+        def factory():
+            started.append(FakeChrome())
+            return started[-1]
+        pool = DriverPool(factory=factory, **kwargs)
+        self.addCleanup(pool.close)
+        return pool, started
+
+    def use(self, pool):
+        with pool.driver() as driver:
+            return driver
+
+    def test_reuses_warm_drivers(self):
+        pool, started = self.make_pool(size=1, max_pages=10, page_deadline=30)
+        self.assertIs(self.use(pool), self.use(pool))
+        self.assertEqual((len(started), pool.recycled), (1, 0))
+        self.assertEqual(started[0].page_load_timeout, 30)
+
+    def test_recycles_after_max_pages(self):
+        pool, started = self.make_pool(max_pages=2)
+        with mock.patch('builtins.print'):
+            drivers = [self.use(pool) for _ in range(3)]
+        self.assertIs(drivers[0], drivers[1])
+        self.assertIsNot(drivers[2], drivers[0])
+        self.assertEqual((started[0].quit_calls, pool.recycled), (1, 1))
+
+    def test_recycles_drivers_over_the_memory_cap(self):
+        pool, started = self.make_pool(max_rss_mb=500)
+        self.use(pool)
+        with mock.patch('tracker.drivers.ManagedDriver.rss_mb', return_value=800.0), mock.patch('builtins.print'):
+            self.assertIsNot(self.use(pool), started[0])
+        self.assertEqual(pool.recycled, 1)
+
+    def test_recycles_drivers_that_fail_the_health_check(self):
+        pool, started = self.make_pool()
+        self.use(pool).healthy = False
+        with mock.patch('builtins.print'):
+            self.assertIsNot(self.use(pool), started[0])
+        self.assertEqual(pool.recycled, 1)
+
+    def test_deadline_kills_a_wedged_page(self):
+        pool, started = self.make_pool(page_deadline=0.1)
+        with mock.patch('builtins.print'):
+            with pool.driver():
+                time.sleep(0.3)
+            self.assertIsNot(self.use(pool), started[0])
+        # Killed outright, not handed back to the idle queue or quit through chromedriver
+        self.assertEqual(started[0].quit_calls, 0)
+        self.assertEqual(len(started), 2)
+
+    def test_close_quits_idle_drivers(self):
+        pool, started = self.make_pool(size=2)
+        with pool.driver(), pool.driver():
+            pass
+        pool.close()
+        self.assertEqual([d.quit_calls for d in started], [1, 1])
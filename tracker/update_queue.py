@@ -0,0 +1,133 @@
+"""Durable queue of Telegram webhook updates.
+
+With WEBHOOK_QUEUE=1 the webhook still answers commands and button presses inline, but a message
+with a link may scrape, so it only validates and stores that update (one INSERT) and Telegram gets
+its 200 at once; `manage.py process_updates` or the scrape daemon runs the bot handlers from here.
+Only turn it on where such a worker is always running: otherwise links wait for the next cron run.
+"""
+import json
+import os
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from tracker.models import WebhookUpdate
+
+MAX_ATTEMPTS = int(os.getenv('UPDATE_MAX_ATTEMPTS', 3))
+# A claim older than this is assumed to belong to a crashed worker and is handed out again
+CLAIM_LEASE = timedelta(seconds=float(os.getenv('UPDATE_CLAIM_LEASE_SECONDS', 300)))
+POLL_SECONDS = float(os.getenv('UPDATE_POLL_SECONDS', 1))
+
+def parse_update(body):
+    """The update_id of a webhook body, or None if it isn't a Telegram update."""
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('update_id'), int):
+        return None
+    return data['update_id']
+
+def needs_worker(body):
+    """Whether an update may scrape: a message carrying a link. Commands and button presses only
+    read the database, so the webhook answers them itself instead of leaving them for a worker."""
+    from tracker.bot_logic import extract_url
+    data = json.loads(body)
+    message = data.get('message') or data.get('edited_message') or {}
+    return bool(extract_url(message.get('text') or ''))
+
+def enqueue(update_id, body):
+    # ignore_conflicts: a redelivered update_id is already queued
+    WebhookUpdate.objects.bulk_create([WebhookUpdate(update_id=update_id, payload=body)], ignore_conflicts=True)
+
+def claim(batch_size=10):
+    """Marks up to batch_size pending updates as claimed by this worker, oldest first."""
+    now = timezone.now()
+    with transaction.atomic():
+        updates = list(
+            WebhookUpdate.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .exclude(claimed_at__gte=now - CLAIM_LEASE)
+            .order_by('id')[:batch_size]
+        )
+        for update in updates:
+            update.claimed_at = now
+            update.attempts += 1
+        WebhookUpdate.objects.bulk_update(updates, ['claimed_at', 'attempts'])
+    return updates
+
+def process(update):
+    """Runs the bot handlers for one queued update and records the outcome."""
+    import telebot
+    from tracker.bot_logic import bot
+    try:
+        bot.process_new_updates([telebot.types.Update.de_json(update.payload)])
+        update.status, update.error = 'done', ''
+    except Exception as e:
+        update.error = traceback.format_exc()
+        print(f"Update {update.update_id} failed (attempt {update.attempts}): {e}")
+        # Leave it pending for a retry once the claim lease runs out
+        update.status = 'failed' if update.attempts >= MAX_ATTEMPTS else 'pending'
+    update.processed_at = timezone.now()
+    update.save(update_fields=['status', 'error', 'processed_at'])
+
+def drain(batch_size=10, limit=None):
+    """Processes pending updates until the queue is empty (or `limit` were handled). Returns the count."""
+    handled = 0
+    while limit is None or handled < limit:
+        updates = claim(batch_size if limit is None else min(batch_size, limit - handled))
+        if not updates:
+            break
+        for update in updates:
+            process(update)
+        handled += len(updates)
+    return handled
+
+def run_worker(stop, poll=None):
+    """Drains the queue until the `stop` event is set, sleeping `poll` seconds when it's empty."""
+    from django.db import close_old_connections
+    poll = poll or POLL_SECONDS
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                handled = drain()
+            except Exception as e:
+                print(f"Update worker error: {e}")
+                handled = 0
+            if not handled:
+                stop.wait(poll)
+    finally:
+        from django.db import connection
+        connection.close()
+
+def prune(days=7):
+    """Deletes finished updates older than `days`."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return WebhookUpdate.objects.exclude(status='pending').filter(received_at__lt=cutoff).delete()[0]
+
+def _percentile(values, pct):
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))] if values else None
+
+def metrics(window=timedelta(hours=1)):
+    """Queue depth and processing latency (received -> processed, seconds) over the last `window`."""
+    now = timezone.now()
+    pending = WebhookUpdate.objects.filter(status='pending').aggregate(depth=Count('id'), oldest=Min('received_at'))
+    recent = WebhookUpdate.objects.filter(processed_at__gte=now - window).exclude(status='pending')
+    latencies = sorted((processed - received).total_seconds()
+                       for received, processed in recent.values_list('received_at', 'processed_at'))
+    by_status = dict(recent.values_list('status').annotate(n=Count('id')).values_list('status', 'n'))
+    return {
+        'queue_depth': pending['depth'],
+        'oldest_pending_seconds': (now - pending['oldest']).total_seconds() if pending['oldest'] else 0,
+        'window_seconds': window.total_seconds(),
+        'processed': by_status.get('done', 0),
+        'failed': by_status.get('failed', 0),
+        'latency_p50_seconds': _percentile(latencies, 50),
+        'latency_p95_seconds': _percentile(latencies, 95),
+        'latency_max_seconds': latencies[-1] if latencies else None,
+    }
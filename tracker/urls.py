@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('webhook/', views.telegram_webhook, name='telegram_webhook'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('chart/<int:product_id>/', views.chart, name='chart'),
 ]
@@ -1,31 +1,30 @@
-import json
+import os
 import telebot
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from . import update_queue
 from .bot_logic import bot
 
 @csrf_exempt
 def telegram_webhook(request):
     if request.method == "POST":
         try:
-            # Print basic info for logs
-            print(f"DEBUG: Received webhook POST. Token present: {bool(bot.token)}")
-            
-            json_str = request.body.decode('UTF-8')
-            if not json_str:
-                return HttpResponse("DEBUG FAIL: Empty body", status=400)
-
-            # Manually parse JSON to check for common issues
-            try:
-                data = json.loads(json_str)
-            except Exception as je:
-                return HttpResponse(f"DEBUG FAIL: JSON Parse Error: {str(je)}", status=400)
+            # Optional shared secret, set with set_webhook(secret_token=...)
+            secret = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+            if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+                return HttpResponse("Forbidden", status=403)
 
-            print(f"DEBUG: Body parsed successfully. Update ID: {data.get('update_id')}")
+            json_str = request.body.decode('UTF-8')
+            update_id = update_queue.parse_update(json_str)
+            if update_id is None:
+                return HttpResponse("Not a Telegram update", status=400)
 
-            update = telebot.types.Update.de_json(json_str)
-            bot.process_new_updates([update])
-            
+            if os.getenv('WEBHOOK_QUEUE') == '1' and update_queue.needs_worker(json_str):
+                # Opt-in for deployments with an always-on worker (process_updates / the scrape daemon):
+                # links, which may scrape, run there. Commands and buttons are always answered here.
+                update_queue.enqueue(update_id, json_str)
+            else:
+                bot.process_new_updates([telebot.types.Update.de_json(json_str)])
             return HttpResponse("OK", status=200)
         except Exception as e:
             import traceback
@@ -35,6 +34,44 @@ def telegram_webhook(request):
     else:
         return HttpResponse("This endpoint is for Telegram Webhooks.")
 
+def metrics(request):
+    """Webhook queue depth and processing latency, plus chart cache usage, as JSON.
+
+    Needs ?token= (or an X-Metrics-Token header) equal to METRICS_TOKEN, or else TELEGRAM_WEBHOOK_SECRET;
+    with neither set the endpoint stays closed.
+    """
+    from django.utils.crypto import constant_time_compare
+    from . import charts
+    expected = os.getenv('METRICS_TOKEN') or os.getenv('TELEGRAM_WEBHOOK_SECRET')
+    token = request.headers.get('X-Metrics-Token') or request.GET.get('token')
+    if not expected or not token or not constant_time_compare(token, expected):
+        return HttpResponse("Forbidden", status=403)
+    return JsonResponse({**update_queue.metrics(), 'chart_cache': charts.cache.stats()})
+
+def chart(request, product_id):
+    """Price chart of one product: ?range=7d|30d|90d|1y&format=png|svg&token=<charts.chart_token>."""
+    from django.shortcuts import get_object_or_404
+    from tracker.models import TrackedProduct
+    from . import charts
+    chart_range = request.GET.get('range', charts.DEFAULT_RANGE)
+    fmt = request.GET.get('format', 'svg')
+    try:
+        charts.validate(chart_range, fmt)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+    # Checked before the lookup, so the response doesn't reveal which product ids exist
+    if not charts.valid_token(product_id, request.GET.get('token')):
+        return HttpResponse("Forbidden", status=403)
+    product = get_object_or_404(TrackedProduct, pk=product_id)
+    etag = f'"{product.pk}-{chart_range}-{product.last_scraped_at.timestamp() if product.last_scraped_at else 0}-{fmt}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304)
+    data = charts.get_chart(product, chart_range, fmt)
+    response = HttpResponse(data, content_type=charts.FORMATS[fmt])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=300'
+    return response
+
 def home(request):
     from tracker.models import TrackedProduct
     count = TrackedProduct.objects.count()
@@ -71,7 +108,7 @@ def home(request):
                 <div class="debug">
                     Token: {masked_token}<br>
                     DB: Neon Cloud<br>
-                    Mode: Serverless (Sync)
+                    Mode: Serverless ({'Links queued' if os.getenv('WEBHOOK_QUEUE') == '1' else 'Sync'})
                 </div>
                 
                 <hr style="border: 0; border-top: 1px solid #334155; margin: 1.5rem 0;">